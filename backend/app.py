@@ -1,8 +1,8 @@
 from contextlib import asynccontextmanager
+import asyncio
 import os
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import uvicorn
 
 from routes.StoryRoute import story_router
@@ -11,19 +11,39 @@ from routes.ImagesRouter import images_router
 from routes.ChapterRouter import chapter_router
 from routes.Neo4jRouter import neo4j_router
 from services.postgres_service import PostgresService
+from services.agent_service import TaleMachineAgentService
+from services.image_store import IMAGE_DIR, ImmutableImageFiles
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     database_instance = PostgresService()
+    await database_instance.start()
     app.state.db = database_instance
+    # Picks up graph extraction jobs left over from a previous run, or enqueued by the MCP server
+    database_instance.graph_extraction_workers.start()
+    if os.getenv("PREWARM_CLIENTS", "false").lower() == "true":
+        # Connect to Neo4j and load the image model in the background, startup doesn't wait for it
+        loop = asyncio.get_running_loop()
+        prewarms = [loop.run_in_executor(None, prewarm) for prewarm in (database_instance.prewarm, TaleMachineAgentService.prewarm)]
+    else:
+        prewarms = []
     yield
-    # Cleanup on shutdown
-    database_instance.close()
+    # Cleanup on shutdown. A prewarm still connecting would create a client after it was closed, let it finish first
+    await asyncio.gather(*prewarms, return_exceptions=True)
+    await TaleMachineAgentService.close()
+    await database_instance.close()
 
 
-app = FastAPI(lifespan=lifespan)
+async def database_unit_of_work(request: Request):
+    # Every request gets its own Postgres session, see PostgresService.unit_of_work.
+    # Function scope: it is closed when the endpoint returns, not held while a response streams
+    async with request.app.state.db.unit_of_work():
+        yield
 
-UPLOAD_DIR = "generated_images"
+
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(database_unit_of_work, scope="function")])
+
+UPLOAD_DIR = IMAGE_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 app.add_middleware(
@@ -38,6 +58,15 @@ app.add_middleware(
 async def root():
     return {"message": "Tale Machine Backend is running."}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        **TaleMachineAgentService.get_metrics(),
+        "chapter_summary_cache": PostgresService.chapter_summary_cache.metrics(),
+        "graph_response_cache": PostgresService.graph_response_cache.metrics(),
+        "graph_extraction": app.state.db.graph_extraction_workers.metrics(),
+    }
+
 # Include routers
 app.include_router(story_router)
 app.include_router(messages_router)
@@ -45,8 +74,8 @@ app.include_router(images_router)
 app.include_router(chapter_router)
 app.include_router(neo4j_router)
 
-# Mount images folder
-app.mount("/generated_images", StaticFiles(directory=UPLOAD_DIR), name="generated_images")
+# Mount images folder (content-addressed files are served with immutable cache headers)
+app.mount("/generated_images", ImmutableImageFiles(directory=UPLOAD_DIR), name="generated_images")
 
 if __name__ == "__main__":
     uvicorn.run(app, port=7890)
\ No newline at end of file
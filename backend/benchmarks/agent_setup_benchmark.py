@@ -0,0 +1,127 @@
+"""
+Measures the per-turn agent setup overhead: compiling a new agent with a story-bound generate_image tool and
+the story's prompt on every chat turn (the old behaviour) versus TaleMachineAgentService._get_agent, which
+returns the cached agent, plus the StoryContext the turn passes to it.
+
+Runs offline: the service's chat model is replaced by a fake one, the MCP tools by stand-ins on a fake pooled
+session, and the checkpointer is the in-memory one.
+
+Usage: python benchmarks/agent_setup_benchmark.py [turns]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Before the service is imported: its clients are created at class definition, none of them is called here
+os.environ["CHECKPOINTER_BACKEND"] = "memory"
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from langchain.agents import create_agent
+from langchain.tools import tool
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from services.agent_service import StoryContext, TaleMachineAgentService
+
+
+@tool
+def save_chapter(content: str, story_id: int, title: str, previous_chapter_id: int | None = None,
+                 insert_at_start: bool = False, summary: str | None = None) -> dict:
+    """Saves a new chapter to the database."""
+    return {}
+
+@tool
+def get_chapter_by_id(chapter_id: int) -> dict | None:
+    """Get chapter with all details by its ID."""
+    return None
+
+@tool
+def get_chapter_by_chapter_title(story_id: int, title: str) -> dict | None:
+    """Get chapter by its title within a story."""
+    return None
+
+@tool
+def get_all_chapters_by_story_id(story_id: int) -> list[dict]:
+    """Get all chapters for a given story ID."""
+    return []
+
+@tool
+def delete_chapter_by_id(chapter_id: int) -> bool:
+    """Delete chapter by its ID."""
+    return False
+
+MCP_TOOLS = [save_chapter, get_chapter_by_id, get_chapter_by_chapter_title,
+             get_all_chapters_by_story_id, delete_chapter_by_id]
+
+STORIES = 10
+
+
+def system_prompt(story_id: int) -> str:
+    return TaleMachineAgentService._prompt.format(
+        story_name=f"Story {story_id}", story_id=story_id, story_length="long", chapter_length="medium",
+        genre="fantasy", additional_notes=None, main_characters="Alice", plot_ideas=None,
+        chapter_summaries="No chapters saved yet.",
+    )
+
+
+def create_story_bound_generate_image_tool(story_id: int, db_instance):
+    """The old generate_image: story id and database baked into a new tool on every turn."""
+    @tool(return_direct=True)
+    async def generate_image(description: str) -> str:
+        """Generate an image based on the provided description."""
+        return f"{story_id} {db_instance}"
+    return generate_image
+
+
+async def compile_every_turn(pooled_session, story_id: int, db_instance, checkpointer):
+    """The old per-turn setup: tools and prompt bound to the story, then create_agent."""
+    tools = list(pooled_session.tools) + [create_story_bound_generate_image_tool(story_id, db_instance)]
+    return create_agent(model=TaleMachineAgentService._llm, tools=tools,
+                        system_prompt=system_prompt(story_id), checkpointer=checkpointer)
+
+
+async def cached_agent(pooled_session, story_id: int, db_instance):
+    """The current per-turn setup, as in TaleMachineAgentService.run."""
+    agent = await TaleMachineAgentService._get_agent(pooled_session)
+    context = StoryContext(story_id=story_id, db_instance=db_instance, system_prompt=system_prompt(story_id))
+    return agent, context
+
+
+async def time_turns(turns: int, setup) -> list[float]:
+    timings = []
+    for turn in range(turns):
+        started = time.perf_counter()
+        await setup(turn)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    print(f"{name:<28} mean {statistics.mean(timings):8.3f} ms   "
+          f"median {statistics.median(timings):8.3f} ms   max {max(timings):8.3f} ms")
+
+
+async def main(turns: int):
+    TaleMachineAgentService._llm = GenericFakeChatModel(messages=iter([AIMessage(content="ok")]))
+    pooled_session = SimpleNamespace(key=1, tools=MCP_TOOLS)
+    db_instance = object()
+    checkpointer = await TaleMachineAgentService._checkpointer_provider.get()
+
+    before = await time_turns(turns, lambda turn: compile_every_turn(pooled_session, turn % STORIES, db_instance, checkpointer))
+    after = await time_turns(turns, lambda turn: cached_agent(pooled_session, turn % STORIES, db_instance))
+
+    print(f"Per-turn agent setup over {turns} turns, {STORIES} stories")
+    report("create_agent every turn", before)
+    report("_get_agent + StoryContext", after)
+    print(f"Speedup: {statistics.mean(before) / statistics.mean(after):.0f}x")
+    print(f"Cache: {TaleMachineAgentService._agent_cache.metrics()}")
+    await TaleMachineAgentService.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,117 @@
+"""
+Hammers the Postgres-backed routes of the app in parallel, to check that concurrent requests are isolated
+(every request runs in its own unit of work, see PostgresService.unit_of_work) and that their I/O overlaps.
+
+The same mix of requests is sent once serially and once with N requests in flight:
+- every response must have the expected status, and the same body as in the serial run,
+- requests that fail inside a transaction (a NUL byte in a node name) must not affect the others,
+- the concurrent run should finish well ahead of the serial one.
+
+Runs the app in-process (httpx ASGITransport, with the lifespan), against the Postgres database from .env.
+Needs at least one story. Routes that touch Neo4j are left out.
+
+Usage: python benchmarks/concurrency_benchmark.py [requests] [concurrency]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+import app
+from postgres_database import engine
+
+
+def build_requests(story_ids: list[int], chapter_ids: list[int], count: int) -> list[tuple[str, str, dict | None, int]]:
+    """(method, url, json body, expected status), cycling through the stories and routes."""
+    requests = []
+    for i in range(count):
+        story_id = story_ids[i % len(story_ids)]
+        chapter_id = chapter_ids[i % len(chapter_ids)] if chapter_ids else None
+        mix = [
+            ("GET", "/story/all", None, 200),
+            ("GET", f"/chapter/indexing/story/{story_id}", None, 200),
+            ("GET", f"/images/gallery/{story_id}?limit=24", None, 200),
+            ("GET", f"/images/all/{story_id}", None, 200),
+            ("POST", "/neo4j/get_chapter_node_mapping",
+             {"node_label": "Person", "node_name": f"Nobody {i}", "story_id": story_id, "summary_only": True}, 200),
+            ("GET", "/chapter/indexing/-1", None, 404),
+            # Text can't contain NUL bytes, so the query fails inside the request's transaction
+            ("POST", "/neo4j/get_chapter_node_mapping", {"node_label": "Person", "node_name": "Nobody\x00"}, 500),
+        ]
+        if chapter_id is not None:
+            mix.append(("GET", f"/chapter/indexing/{chapter_id}", None, None)) # 404 for chapters saved before the outbox
+        requests.append(mix[i % len(mix)])
+    return requests
+
+
+async def send_all(client: httpx.AsyncClient, requests: list, concurrency: int) -> tuple[float, list]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(method: str, url: str, body: dict | None):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            return response, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(send(method, url, body) for method, url, body, *_ in requests))
+    return time.perf_counter() - started, results
+
+
+def check(requests: list, results: list, baseline: list | None) -> list[str]:
+    errors = []
+    for i, ((method, url, _, expected), (response, _)) in enumerate(zip(requests, results)):
+        if expected is not None and response.status_code != expected:
+            errors.append(f"{method} {url}: {response.status_code}, expected {expected}: {response.text[:200]}")
+        elif baseline is not None and response.status_code == 200 and response.json() != baseline[i][0].json():
+            errors.append(f"{method} {url}: body differs from the serial run")
+    return errors
+
+
+def report(name: str, elapsed: float, results: list):
+    latencies = sorted(latency for _, latency in results)
+    print(f"{name:<12} {len(results) / elapsed:8.1f} req/s   total {elapsed:6.2f} s   "
+          f"p50 {statistics.median(latencies):7.1f} ms   p95 {latencies[int(len(latencies) * 0.95) - 1]:7.1f} ms")
+
+
+async def main(count: int, concurrency: int) -> int:
+    async with app.app.router.lifespan_context(app.app):
+        pg = app.app.state.db
+        stories = await pg.get_all_stories()
+        if not stories:
+            print("[ERROR] No stories in the database, create one first")
+            return 1
+        story_ids = [story.id for story in stories]
+        chapter_ids = [chapter.id for chapter in await pg.get_all_chapters()][:50]
+        requests = build_requests(story_ids, chapter_ids, count)
+
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            serial_elapsed, serial = await send_all(client, requests, 1)
+            parallel_elapsed, parallel = await send_all(client, requests, concurrency)
+
+        print(f"{count} requests over {len(story_ids)} stories, {concurrency} in flight")
+        report("serial", serial_elapsed, serial)
+        report("concurrent", parallel_elapsed, parallel)
+        print(f"Speedup: {serial_elapsed / parallel_elapsed:.1f}x")
+        print(f"Pool: {engine.pool.status()}")
+
+        errors = check(requests, serial, None) + check(requests, parallel, serial)
+        for error in errors[:20]:
+            print(f"[ERROR] {error}")
+        if errors:
+            print(f"[ERROR] {len(errors)} unexpected responses")
+            return 1
+        print("[INFO] All responses as expected")
+        return 0
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    sys.exit(asyncio.run(main(count, concurrency)))
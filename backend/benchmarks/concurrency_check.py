@@ -0,0 +1,132 @@
+"""
+Automated isolation check of the Postgres-backed routes under concurrency, for CI.
+
+Unlike concurrency_benchmark.py it needs no existing data: it seeds two stories of its own (chapters and
+chapter-node mappings, written directly to Postgres, so neither Neo4j nor the extraction LLM is involved),
+sends the same mix of requests serially and then with N in flight, and deletes the stories again. It fails if:
+- a response doesn't have its expected status, or a body isn't the expected one (every story sees its own chapters),
+- a concurrent response differs from the serial one, although requests whose transaction fails
+  (a NUL byte in a node name) are interleaved with the others,
+- a connection is still checked out of the pool afterwards.
+
+Point POSTGRES_DB at a test database. Runs the app in-process (httpx ASGITransport, with the lifespan).
+
+Usage: python benchmarks/concurrency_check.py [requests] [concurrency]
+Exit code 0 when every check passes, 1 otherwise.
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import httpx
+from sqlalchemy import delete
+
+import app
+from concurrency_benchmark import send_all
+from postgres_database import SessionLocal, engine
+from models.postgres.Chapter import ChapterBase
+from models.postgres.Story import Story
+from repositories.postgres.ChapterNodeMappingRepository import ChapterNodeMappingRepository
+from repositories.postgres.ChapterRepository import ChapterRepository
+from repositories.postgres.StoryRepository import StoryRepository
+from tables.postgres.StoryTable import StoryTable
+
+CHAPTERS_PER_STORY = 3
+
+
+async def seed() -> dict[int, list[dict]]:
+    """Two stories with chapters that all mention the same node. Returns each story's chapters, as summaries."""
+    stories = {}
+    async with SessionLocal() as db:
+        for _ in range(2):
+            suffix = uuid.uuid4().hex[:12]
+            story = await StoryRepository.insert(db, Story(title=f"Concurrency check {suffix}",
+                                                           neo_database_name=f"concurrencycheck{suffix}"))
+            chapters = []
+            for i in range(CHAPTERS_PER_STORY):
+                chapter = await ChapterRepository.insert(db, ChapterBase(
+                    title=f"Chapter {i}", content=f"Alice in story {story.id}, chapter {i}.", story_id=story.id,
+                    sort_order=float(i + 1), summary=f"Summary {i}", timestamp=int(time.time()),
+                ))
+                await ChapterNodeMappingRepository.insert_many(db, chapter.id, [("Person", "Alice")])
+                chapters.append({"id": chapter.id, "title": chapter.title, "summary": chapter.summary,
+                                 "sort_order": chapter.sort_order})
+            stories[story.id] = chapters
+    return stories
+
+
+async def remove(story_ids: list[int]):
+    async with SessionLocal() as db:
+        # Chapters and their mappings cascade
+        await db.execute(delete(StoryTable).where(StoryTable.id.in_(story_ids)))
+        await db.commit()
+
+
+def build_requests(stories: dict[int, list[dict]], count: int) -> list[tuple[str, str, dict | None, int, object]]:
+    """(method, url, json body, expected status, expected body or None), cycling through the stories and routes."""
+    story_ids = list(stories)
+    requests = []
+    for i in range(count):
+        story_id = story_ids[i % len(story_ids)]
+        chapters = stories[story_id]
+        mix = [
+            ("POST", "/neo4j/get_chapter_node_mapping",
+             {"node_label": "Person", "node_name": "Alice", "story_id": story_id, "summary_only": True}, 200, chapters),
+            # Text can't contain NUL bytes, so the query fails inside the request's transaction
+            ("POST", "/neo4j/get_chapter_node_mapping", {"node_label": "Person", "node_name": f"Alice\x00{i}"}, 500, None),
+            ("GET", f"/chapter/indexing/story/{story_id}", None, 200, []), # Seeded without extraction jobs
+            ("POST", "/neo4j/get_chapter_node_mapping",
+             {"node_label": "Person", "node_name": f"Nobody {i}", "story_id": story_id, "summary_only": True}, 200, []),
+            ("GET", f"/images/all/{story_id}", None, 200, []),
+            ("GET", "/chapter/indexing/-1", None, 404, None),
+        ]
+        requests.append(mix[i % len(mix)])
+    return requests
+
+
+def check(requests: list, results: list, baseline: list | None) -> list[str]:
+    errors = []
+    for i, ((method, url, _, status, body), (response, _)) in enumerate(zip(requests, results)):
+        if response.status_code != status:
+            errors.append(f"{method} {url}: {response.status_code}, expected {status}: {response.text[:200]}")
+        elif body is not None and response.json() != body:
+            errors.append(f"{method} {url}: unexpected body {response.text[:200]}")
+        elif baseline is not None and status == 200 and response.json() != baseline[i][0].json():
+            errors.append(f"{method} {url}: body differs from the serial run")
+    return errors
+
+
+async def main(count: int, concurrency: int) -> int:
+    async with app.app.router.lifespan_context(app.app):
+        stories = await seed()
+        try:
+            requests = build_requests(stories, count)
+            transport = httpx.ASGITransport(app=app.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+                _, serial = await send_all(client, requests, 1)
+                _, parallel = await send_all(client, requests, concurrency)
+        finally:
+            await remove(list(stories))
+
+        errors = check(requests, serial, None) + check(requests, parallel, serial)
+        if engine.pool.checkedout():
+            errors.append(f"{engine.pool.checkedout()} connections still checked out: {engine.pool.status()}")
+
+    for error in errors[:20]:
+        print(f"[ERROR] {error}")
+    if errors:
+        print(f"[ERROR] {len(errors)} failed checks")
+        return 1
+    print(f"[INFO] {count} requests, {concurrency} in flight: all responses isolated and as expected")
+    return 0
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    sys.exit(asyncio.run(main(count, concurrency)))
@@ -0,0 +1,86 @@
+"""
+Measures the startup time of the two entry points, each in a fresh interpreter:
+- app: importing app.py, then running the FastAPI lifespan startup (what uvicorn waits for before serving).
+- mcp_server: importing mcp_server.py, which also creates its PostgresService.
+
+Also lists the slowest imports (from `python -X importtime`), to see what a change moved off the startup path.
+Needs the Postgres database to be reachable, like the servers themselves. Neo4j and Vertex AI are not
+touched at startup, unless PREWARM_CLIENTS is set.
+
+Usage: python benchmarks/startup_benchmark.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+_APP_BOOT = """
+import asyncio, json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+async def boot():
+    async with app.app.router.lifespan_context(app.app):
+        return time.perf_counter()
+booted = asyncio.run(boot())
+print(json.dumps({"import": imported - started, "boot": booted - started}))
+"""
+
+_MCP_BOOT = """
+import asyncio, json, time
+started = time.perf_counter()
+import mcp_server
+imported = time.perf_counter()
+async def boot():
+    async with mcp_server.server_lifespan(mcp_server.mcp):
+        return time.perf_counter()
+booted = asyncio.run(boot())
+print(json.dumps({"import": imported - started, "boot": booted - started}))
+"""
+
+ENTRY_POINTS = {"app": ("app", _APP_BOOT), "mcp_server": ("mcp_server", _MCP_BOOT)}
+
+
+def run_once(script: str) -> dict:
+    result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"[ERROR] Startup failed:\n{result.stderr[-2000:]}")
+    # The servers print to stdout too, the timings are on the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int = 10) -> list[tuple[float, str]]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=BACKEND_DIR, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only top level packages, nested ones are part of their parent's cumulative time
+        if not name.startswith("  "):
+            imports.append((int(cumulative) / 1000, name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for name, (module, script) in ENTRY_POINTS.items():
+        try:
+            timings = [run_once(script) for _ in range(runs)]
+        except Exception as e:
+            print(f"{name}: {e}")
+            continue
+        imports = [t["import"] * 1000 for t in timings]
+        boots = [t["boot"] * 1000 for t in timings]
+        print(f"{name} over {runs} runs")
+        print(f"  import   median {statistics.median(imports):8.1f} ms   max {max(imports):8.1f} ms")
+        print(f"  boot     median {statistics.median(boots):8.1f} ms   max {max(boots):8.1f} ms")
+        print("  slowest imports:")
+        for cumulative_ms, package in slowest_imports(module):
+            print(f"    {cumulative_ms:8.1f} ms  {package}")
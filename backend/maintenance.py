@@ -0,0 +1,164 @@
+"""
+Maintenance commands for the story graphs.
+
+    python maintenance.py reindex 3 7            # Re-extract all chapters of stories 3 and 7
+    python maintenance.py reindex --all --requests-per-minute 60
+    python maintenance.py reindex 3 --resume     # Continue an interrupted re-index without resetting again
+    python maintenance.py purge                  # List orphaned Neo4j databases and image files
+    python maintenance.py purge --apply          # ... and delete them
+
+Re-indexing goes through the graph extraction outbox (see services/graph_extraction_queue.py): the story's graph
+and chapter-node mappings are emptied, every chapter is queued, and a local worker pool drains the queue while
+progress is printed. The local pool only claims the jobs of the stories being re-indexed; the worker pools of a
+running backend and MCP server claim some of them too. --requests-per-minute is therefore a limit shared by all
+processes (stored in Postgres), held while the re-index runs and lapsing on its own if the command dies.
+Job state lives in Postgres, so an interrupted run can be continued with --resume. Jobs that
+were in flight when it was interrupted are picked up again once their lease (GRAPH_EXTRACTION_LEASE_SECONDS) expires.
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from models.postgres.GraphExtractionJob import PENDING, PROCESSING, DONE, FAILED
+from services.image_store import IMAGE_DIR
+from services.postgres_service import PostgresService
+from services.rate_limiter import SharedRateLimiter
+
+_DERIVATIVE_NAME = re.compile(r"^([0-9a-f]{64})_w\d+\.webp$")
+# Leftovers of interrupted atomic writes, only removed once no write can still be in progress
+_TMP_FILE_MIN_AGE_SECONDS = 3600
+# The shared rate limit is renewed with every progress report, and lapses this long after the last one
+_RATE_LIMIT_LEASE_SECONDS = 300
+
+
+async def reindex(pg: PostgresService, story_ids: list[int], resume: bool, progress_interval: float,
+                  requests_per_minute: float | None = None):
+    rate_limiter = (await pg.get_neo4j_service()).shared_extraction_rate_limiter
+    pg.graph_extraction_workers.story_ids = story_ids
+    started = time.monotonic()
+    try:
+        # Set before the chapters are queued, the running servers' workers start claiming them right away
+        if requests_per_minute:
+            await rate_limiter.set_limit(requests_per_minute, int(time.time()) + _RATE_LIMIT_LEASE_SECONDS)
+        if not resume:
+            for story_id in story_ids:
+                await pg.reset_story_index(story_id)
+                print(f"[INFO] Story {story_id}: graph and mappings cleared, chapters queued")
+
+        pg.graph_extraction_workers.start()
+        while True:
+            if requests_per_minute:
+                await rate_limiter.set_limit(requests_per_minute, int(time.time()) + _RATE_LIMIT_LEASE_SECONDS)
+            progress = {story_id: await pg.get_indexing_progress_by_story_id(story_id) for story_id in story_ids}
+            elapsed = int(time.monotonic() - started)
+            for story_id, counts in progress.items():
+                total = sum(counts.values())
+                print(f"[{elapsed:>5}s] story {story_id}: {counts[DONE]}/{total} done, "
+                      f"{counts[PROCESSING]} processing, {counts[PENDING]} pending, {counts[FAILED]} failed")
+            if all(counts[PENDING] + counts[PROCESSING] == 0 for counts in progress.values()):
+                break
+            await asyncio.sleep(progress_interval)
+    finally:
+        await pg.graph_extraction_workers.close()
+        if requests_per_minute:
+            await rate_limiter.set_limit(None)
+
+    failed = sum(counts[FAILED] for counts in progress.values())
+    if failed:
+        print(f"[ERROR] {failed} chapters failed, see GET /chapter/indexing/story/<story_id> for the errors. "
+              f"Run reindex again with --resume after fixing the cause.")
+
+
+def find_orphaned_images(referenced_paths: set[str], image_dir: str = IMAGE_DIR) -> list[str]:
+    if not os.path.isdir(image_dir):
+        return []
+    referenced_names = {os.path.basename(path) for path in referenced_paths}
+    referenced_stems = {os.path.splitext(name)[0] for name in referenced_names}
+
+    orphans = []
+    for name in sorted(os.listdir(image_dir)):
+        path = os.path.join(image_dir, name)
+        if not os.path.isfile(path):
+            continue
+        if name.endswith(".tmp"):
+            if time.time() - os.path.getmtime(path) > _TMP_FILE_MIN_AGE_SECONDS:
+                orphans.append(path)
+            continue
+        derivative = _DERIVATIVE_NAME.match(name)
+        if derivative:
+            # A derivative lives as long as its original is referenced
+            if derivative.group(1) not in referenced_stems:
+                orphans.append(path)
+        elif name not in referenced_names:
+            orphans.append(path)
+    return orphans
+
+
+async def purge(pg: PostgresService, apply: bool):
+    story_databases = {story.neo_database_name for story in await pg.get_all_stories()}
+    neo4j_service = await pg.get_neo4j_service()
+    orphaned_databases = [name for name in await neo4j_service.get_database_names() if name not in story_databases]
+    orphaned_images = find_orphaned_images(await pg.get_all_image_paths())
+
+    print(f"[INFO] {len(orphaned_databases)} orphaned Neo4j databases")
+    for name in orphaned_databases:
+        print(f"  {name}")
+        if apply:
+            await neo4j_service.delete_database(name)
+
+    print(f"[INFO] {len(orphaned_images)} orphaned image files")
+    for path in orphaned_images:
+        print(f"  {path}")
+        if apply:
+            os.remove(path)
+
+    if not apply and (orphaned_databases or orphaned_images):
+        print("[INFO] Dry run, nothing was deleted. Run with --apply to delete.")
+
+
+async def main(args):
+    pg = PostgresService()
+    await pg.start()
+    try:
+        if args.command == "reindex":
+            story_ids = args.story_ids
+            if args.all:
+                story_ids = [story.id for story in await pg.get_all_stories()]
+            if not story_ids:
+                raise SystemExit("Pass story ids or --all")
+
+            workers = pg.graph_extraction_workers
+            workers.concurrency = args.concurrency
+            workers.max_attempts = args.max_attempts
+            await reindex(pg, story_ids, args.resume, args.progress_interval, args.requests_per_minute)
+        elif args.command == "purge":
+            await purge(pg, args.apply)
+    finally:
+        await pg.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tale Machine maintenance commands")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    reindex_parser = subcommands.add_parser("reindex", help="Rebuild the graph and chapter-node mappings of stories")
+    reindex_parser.add_argument("story_ids", nargs="*", type=int)
+    reindex_parser.add_argument("--all", action="store_true", help="Re-index every story")
+    reindex_parser.add_argument("--resume", action="store_true",
+                                help="Don't reset, only finish the chapters that are still queued")
+    reindex_parser.add_argument("--concurrency", type=int, default=2, help="Chapters extracted at the same time")
+    reindex_parser.add_argument("--requests-per-minute", type=float, default=None,
+                                help="Throttle extraction LLM calls of all processes while it runs, e.g. to stay within the Gemini quota")
+    reindex_parser.add_argument("--max-attempts", type=int, default=3)
+    reindex_parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress reports")
+
+    purge_parser = subcommands.add_parser("purge", help="Find Neo4j databases and image files no story references")
+    purge_parser.add_argument("--apply", action="store_true", help="Delete them, instead of only listing them")
+
+    asyncio.run(main(parser.parse_args()))
@@ -1,22 +1,45 @@
 from fastmcp import FastMCP, Context
+from fastmcp.server.middleware import Middleware, MiddlewareContext
 from dotenv import load_dotenv
 import os
 import datetime
+import threading
+from contextlib import asynccontextmanager
 
 from models.postgres.Chapter import ChapterBase
 from services.postgres_service import PostgresService
 
 load_dotenv()
 
+pg_database_service = PostgresService()
+
+@asynccontextmanager
+async def server_lifespan(server: FastMCP):
+    await pg_database_service.start()
+    if os.getenv("PREWARM_CLIENTS", "false").lower() == "true":
+        # Connect to Neo4j in the background, the server starts accepting requests right away
+        threading.Thread(target=pg_database_service.prewarm, name="prewarm", daemon=True).start()
+    try:
+        yield
+    finally:
+        await pg_database_service.close()
+
+class UnitOfWorkMiddleware(Middleware):
+    """Every tool call gets its own Postgres session, see PostgresService.unit_of_work."""
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        async with pg_database_service.unit_of_work():
+            return await call_next(context)
+
 mcp = FastMCP(
     name = "tale-machine-server",
+    lifespan=server_lifespan,
+    middleware=[UnitOfWorkMiddleware()],
 )
 
 transport = os.getenv("TRANSPORT", "streamable-http")
 print(f"Starting MCP server with transport: {transport}")
 
 #region Postgres Database Tools
-pg_database_service = PostgresService()
 
 @mcp.tool()
 async def save_chapter(
@@ -111,17 +134,62 @@ async def delete_chapter_by_id(chapter_id: int) -> bool:
     return await pg_database_service.delete_chapter_by_id(chapter_id)
 #endregion
 
+#region Story Graph Tools
+
+@mcp.tool()
+async def get_story_graph_neighborhood(
+    story_id: int,
+    label: str,
+    name: str,
+    hops: int = 1,
+    max_neighbors: int = 25,
+    max_nodes: int = 100
+) -> dict:
+    """
+    Get what the story's knowledge graph knows around one entity: the entity, the entities connected to it
+    (and to those, with hops > 1), and the relationships between them.
+    Use it to check facts about a character, place or item (relationships, status, traits) before writing about it.
+
+    Args:
+        story_id: The ID of the story.
+        label: The entity's type, e.g. "Person", "Location", "Item".
+        name: The entity's name, as it appears in the story, e.g. "Alice".
+        hops: How far to look, 1 to 3. 1 = only direct connections.
+        max_neighbors: At most this many connections are followed per entity, the most important first, up to 100.
+        max_nodes: At most this many entities are returned, up to 500.
+
+    Returns:
+        {"entities": [...], "relationships": [{"source", "type", "target", ...}]}, or {"error": ...}
+        if the entity is not in the graph.
+    """
+    try:
+        neighborhood = await pg_database_service.get_story_neighborhood(
+            story_id, label, name, hops=hops, max_neighbors=max_neighbors, max_nodes=max_nodes
+        )
+    except Exception as e:
+        return {"error": str(e)}
+    if neighborhood is None:
+        return {"error": f"No {label} named '{name}' in the story's graph"}
+    # Entities by name instead of element ids, which mean nothing to the model
+    names = {node["id"]: node["properties"].get("id") for node in neighborhood["nodes"]}
+    return {
+        "entities": [{"labels": node["labels"], **node["properties"]} for node in neighborhood["nodes"]],
+        "relationships": [
+            {"source": names[edge["source"]], "type": edge["type"], "target": names[edge["target"]], **edge["properties"]}
+            for edge in neighborhood["edges"]
+        ],
+    }
+#endregion
+
 if __name__ == "__main__":
     print(f"Starting MCP server with transport: {transport}")
-    try:
-        # if transport == "stdio":
-        #     print("Running server with stdio transport")
-        #     mcp.run(transport="stdio")
-        # elif transport == "streamable-http":
-        #     print("Running server with Streamable HTTP transport")
-        #     mcp.run(transport="streamable-http", host="0.0.0.0")
-        # else:
-        #     raise ValueError(f"Unknown transport: {transport}")
-        mcp.run(transport="http", host="0.0.0.0", port=8000)
-    finally:
-        pg_database_service.close()
\ No newline at end of file
+    # The Postgres pool and Neo4j connection are opened and closed by server_lifespan
+    # if transport == "stdio":
+    #     print("Running server with stdio transport")
+    #     mcp.run(transport="stdio")
+    # elif transport == "streamable-http":
+    #     print("Running server with Streamable HTTP transport")
+    #     mcp.run(transport="streamable-http", host="0.0.0.0")
+    # else:
+    #     raise ValueError(f"Unknown transport: {transport}")
+    mcp.run(transport="http", host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -3,4 +3,6 @@ from pydantic import BaseModel
 class Neo4jGetChapterNodeMapping(BaseModel):
     """Represents a mapping of a chapter node from Neo4j."""
     node_label: str  # e.g. "Person", "Location"
-    node_name: str  # e.g. "Alice", "Wonderland"
\ No newline at end of file
+    node_name: str  # e.g. "Alice", "Wonderland"
+    story_id: int | None = None  # Only chapters of this story. Node names are only unique within a story's graph
+    summary_only: bool = False  # Only return id, title, summary and sort_order, not the content
\ No newline at end of file
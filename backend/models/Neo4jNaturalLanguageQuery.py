@@ -3,4 +3,5 @@ from pydantic import BaseModel
 
 class MessageRequest(BaseModel):
     """Represents a natural language query request to the Neo4j database."""
-    query: str
\ No newline at end of file
+    query: str
+    database_name: str  # The story's Neo4j database to query
\ No newline at end of file
@@ -0,0 +1,14 @@
+# Maps a relationship of the Neo4j graph to a chapter it was extracted from
+from pydantic import BaseModel, ConfigDict
+
+class ChapterRelationshipMappingBase(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    chapter_id: int
+    source_label: str # e.g. "Person"
+    source_name: str # e.g. "Alice"
+    relationship_type: str # e.g. "LOVES"
+    target_label: str # e.g. "Person"
+    target_name: str # e.g. "Bob"
+
+    def key(self) -> tuple[str, str, str, str, str]:
+        return (self.source_label, self.source_name, self.relationship_type, self.target_label, self.target_name)
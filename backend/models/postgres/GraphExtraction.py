@@ -0,0 +1,9 @@
+# A cached graph extraction: the serialized GraphDocuments extracted from one chapter's content
+
+from pydantic import BaseModel, ConfigDict
+
+class GraphExtractionBase(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    cache_key: str # SHA-256 of the chapter content + extraction schema
+    graph_documents: str # JSON
+    created_at: int # Unix timestamp
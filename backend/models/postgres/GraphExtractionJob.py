@@ -0,0 +1,21 @@
+# Outbox entry for a chapter whose nodes and relationships still have to be extracted into Neo4j
+
+from pydantic import BaseModel, ConfigDict
+
+# Job statuses
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed" # Gave up after the maximum number of attempts
+
+class GraphExtractionJobBase(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int | None = None
+    chapter_id: int
+    status: str = PENDING
+    attempts: int = 0
+    last_error: str | None = None
+    available_at: int # Unix timestamp, the job is not picked up before this (retry backoff)
+    locked_at: int | None = None # Unix timestamp of the last claim by a worker
+    created_at: int
+    updated_at: int
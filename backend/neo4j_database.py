@@ -0,0 +1,41 @@
+import os
+from langchain_neo4j import Neo4jGraph
+from neo4j import AsyncDriver, AsyncGraphDatabase
+
+# Read when the connection is created, not on import, so a .env loaded after importing this module still applies
+
+def _credentials() -> tuple[str, str, str]:
+    return (
+        os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+        os.getenv("NEO4J_USER", "neo4j"),
+        os.getenv("NEO4J_PASSWORD", "qwertyui"),
+    )
+
+def driver_config() -> dict:
+    """Pool settings. One pool per driver, shared by every story's database (the database is chosen per session)."""
+    return {
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "50")),
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "30")), # Seconds to wait for a free connection
+        "connection_timeout": float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "10")),
+        "max_connection_lifetime": int(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+        "liveness_check_timeout": float(os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT", "60")), # Idle connections older than this are pinged before reuse
+        "keep_alive": True,
+    }
+
+def create_graph() -> Neo4jGraph:
+    """The LangChain graph (sync driver), for extraction writes and natural language queries."""
+    uri, user, password = _credentials()
+    return Neo4jGraph(
+        url=uri,
+        username=user,
+        password=password,
+        enhanced_schema=True,
+        # We inject our own schema, the database is only introspected for natural language queries
+        refresh_schema=False,
+        driver_config=driver_config(),
+    )
+
+def create_async_driver() -> AsyncDriver:
+    """The async driver, for database lifecycle and maintenance operations. Connects on first use."""
+    uri, user, password = _credentials()
+    return AsyncGraphDatabase.driver(uri, auth=(user, password), **driver_config())
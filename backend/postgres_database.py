@@ -1,7 +1,6 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 
 POSTGRES_USER = os.getenv("POSTGRES_USER", "AtvarsViola")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "AtvarsViola")
@@ -9,19 +8,33 @@ POSTGRES_HOST = os.getenv("POSTGRES_HOST", "127.0.0.1")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "TaleMachine")
 
+# psycopg 3 with an async engine, so queries don't block the event loop
 DATABASE_URL = f"postgresql+psycopg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
-engine = create_engine(DATABASE_URL)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=int(os.getenv("POSTGRES_POOL_SIZE", "10")),
+    max_overflow=int(os.getenv("POSTGRES_MAX_OVERFLOW", "20")),
+    pool_timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "30")), # Seconds to wait for a free connection
+    pool_recycle=int(os.getenv("POSTGRES_POOL_RECYCLE", "1800")),
+    pool_pre_ping=True,
+    connect_args={
+        "connect_timeout": int(os.getenv("POSTGRES_CONNECT_TIMEOUT", "10")),
+        "options": f"-c statement_timeout={int(os.getenv('POSTGRES_STATEMENT_TIMEOUT_MS', '30000'))}",
+    },
+)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: objects stay readable after commit, without an implicit (blocking) reload
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def start_db():
-    Base.metadata.create_all(engine)
\ No newline at end of file
+async def start_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def stop_db():
+    await engine.dispose()
@@ -0,0 +1,70 @@
+from sqlalchemy import delete, exists, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from tables.postgres.ChapterIndexVersionTable import ChapterIndexVersionTable, CHAPTER_INDEX_VERSION
+from tables.postgres.ChapterNodeMappingTable import ChapterNodeMappingTable
+from tables.postgres.ChapterTable import ChapterTable
+
+
+class ChapterIndexVersionRepository:
+    @staticmethod
+    async def set_current(db: AsyncSession, chapter_id: int, commit: bool = True) -> None:
+        """
+        Records that the chapter was indexed at CHAPTER_INDEX_VERSION.
+        With `commit=False` the upsert joins the caller's transaction, i.e. the one writing the chapter's mappings.
+        """
+        now = int(time.time())
+        statement = insert(ChapterIndexVersionTable).values(chapter_id=chapter_id, version=CHAPTER_INDEX_VERSION, indexed_at=now)
+        try:
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[ChapterIndexVersionTable.chapter_id],
+                set_={"version": CHAPTER_INDEX_VERSION, "indexed_at": now},
+            ))
+            if commit:
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error recording the index version of chapter {chapter_id}: {e}")
+
+    @staticmethod
+    async def story_has_chapters_without_relationship_mappings(db: AsyncSession, story_id: int) -> bool:
+        """
+        Whether a chapter of the story has node mappings but was not indexed with relationship mappings,
+        i.e. it was indexed before those existed and has not been re-indexed since.
+        A chapter whose extraction found no relationships at all still has its version row, so it doesn't count.
+        """
+        chapter_id = await db.scalar(
+            select(ChapterNodeMappingTable.chapter_id).join(
+                ChapterTable, ChapterTable.id == ChapterNodeMappingTable.chapter_id
+            ).where(
+                ChapterTable.story_id == story_id,
+                ~exists().where(
+                    ChapterIndexVersionTable.chapter_id == ChapterNodeMappingTable.chapter_id,
+                    ChapterIndexVersionTable.version >= CHAPTER_INDEX_VERSION,
+                ),
+            ).limit(1)
+        )
+        return chapter_id is not None
+
+    @staticmethod
+    async def delete_by_story_id(db: AsyncSession, story_id: int, commit: bool = True) -> int:
+        """
+        Deletes the index versions of all chapters of a story, returns how many were deleted.
+        With `commit=False` the delete joins the caller's transaction.
+        """
+        try:
+            chapter_ids = select(ChapterTable.id).where(ChapterTable.story_id == story_id)
+            result = await db.execute(
+                delete(ChapterIndexVersionTable).where(ChapterIndexVersionTable.chapter_id.in_(chapter_ids))
+            )
+            if commit:
+                await db.commit()
+            return result.rowcount
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error deleting chapter index versions: {e}")
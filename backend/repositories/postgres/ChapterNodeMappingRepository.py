@@ -1,37 +1,107 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
 from models.postgres.ChapterNodeMapping import ChapterNodeMapping, ChapterNodeMappingBase
 from tables.postgres.ChapterNodeMappingTable import ChapterNodeMappingTable
+from tables.postgres.ChapterTable import ChapterTable
+
+
+def _select_mappings():
+    # ChapterNodeMapping includes the chapter and its story. Async sessions can't lazy load them, so they are joined
+    return select(ChapterNodeMappingTable).options(
+        joinedload(ChapterNodeMappingTable.chapter).joinedload(ChapterTable.story)
+    )
 
 
 class ChapterNodeMappingRepository:
     @staticmethod
-    async def insert(db: Session, new_mapping: ChapterNodeMappingBase) -> ChapterNodeMapping:
+    async def insert(db: AsyncSession, new_mapping: ChapterNodeMappingBase) -> ChapterNodeMapping:
         try:
             db_object = ChapterNodeMappingTable(**new_mapping.model_dump())
             db.add(db_object)
-            db.commit()
-            db.refresh(db_object)
+            await db.commit()
+            db_object = (await db.execute(_select_mappings().where(
+                ChapterNodeMappingTable.chapter_id == new_mapping.chapter_id,
+                ChapterNodeMappingTable.node_label == new_mapping.node_label,
+                ChapterNodeMappingTable.node_name == new_mapping.node_name,
+            ).execution_options(populate_existing=True))).scalars().one()
             return ChapterNodeMapping.model_validate(db_object)
         except Exception as e:  
-            db.rollback()
+            await db.rollback()
             raise Exception(f"[ERROR] Error inserting chapter-node mapping: {e}")
     
     @staticmethod
-    async def get_by_chapter_id(db: Session, chapter_id: int) -> list[ChapterNodeMapping]:
-        db_objects = db.query(ChapterNodeMappingTable).filter(ChapterNodeMappingTable.chapter_id == chapter_id).all()
+    async def insert_many(db: AsyncSession, chapter_id: int, pairs: list[tuple[str, str]], commit: bool = True) -> None:
+        """
+        Inserts the chapter's (node_label, node_name) pairs with one multi-row INSERT ... ON CONFLICT DO NOTHING.
+        Duplicate pairs (the extractor repeats nodes) and mappings that already exist are skipped.
+        With `commit=False` the insert joins the caller's transaction.
+        """
+        rows = [
+            {"chapter_id": chapter_id, "node_label": node_label, "node_name": node_name}
+            for node_label, node_name in dict.fromkeys(pairs)
+        ]
+        if not rows:
+            return
+        try:
+            await db.execute(insert(ChapterNodeMappingTable).values(rows).on_conflict_do_nothing())
+            if commit:
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error inserting chapter-node mappings: {e}")
+
+    @staticmethod
+    async def delete_by_story_id(db: AsyncSession, story_id: int, commit: bool = True) -> int:
+        """
+        Deletes the mappings of all chapters of a story, returns how many were deleted.
+        With `commit=False` the delete joins the caller's transaction.
+        """
+        try:
+            chapter_ids = select(ChapterTable.id).where(ChapterTable.story_id == story_id)
+            result = await db.execute(
+                delete(ChapterNodeMappingTable).where(ChapterNodeMappingTable.chapter_id.in_(chapter_ids))
+            )
+            if commit:
+                await db.commit()
+            return result.rowcount
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error deleting chapter-node mappings: {e}")
+
+    @staticmethod
+    async def get_by_chapter_id(db: AsyncSession, chapter_id: int) -> list[ChapterNodeMapping]:
+        db_objects = (await db.execute(
+            _select_mappings().where(ChapterNodeMappingTable.chapter_id == chapter_id)
+        )).scalars().all()
         return [ChapterNodeMapping.model_validate(obj) for obj in db_objects]
     
     @staticmethod
-    async def get_by_node_label_and_name(db: Session, node_label: str, node_name: str) -> list[ChapterNodeMapping] | None:
-        db_object = db.query(ChapterNodeMappingTable).filter(
+    async def get_referenced_in_story(db: AsyncSession, story_id: int, pairs: list[tuple[str, str]]) -> set[tuple[str, str]]:
+        """Which of the (node_label, node_name) pairs are still mapped to a chapter of the story."""
+        if not pairs:
+            return set()
+        rows = (await db.execute(
+            select(ChapterNodeMappingTable.node_label, ChapterNodeMappingTable.node_name).join(
+                ChapterTable, ChapterTable.id == ChapterNodeMappingTable.chapter_id
+            ).where(
+                ChapterTable.story_id == story_id,
+                tuple_(ChapterNodeMappingTable.node_label, ChapterNodeMappingTable.node_name).in_(pairs),
+            ).distinct()
+        )).all()
+        return {tuple(row) for row in rows}
+
+    @staticmethod
+    async def get_by_node_label_and_name(db: AsyncSession, node_label: str, node_name: str) -> list[ChapterNodeMapping] | None:
+        db_objects = (await db.execute(_select_mappings().where(
             ChapterNodeMappingTable.node_label == node_label,
             ChapterNodeMappingTable.node_name == node_name
-        )
-        if db_object:
-            return [ChapterNodeMapping.model_validate(obj) for obj in db_object]
+        ))).scalars().all()
+        if db_objects:
+            return [ChapterNodeMapping.model_validate(obj) for obj in db_objects]
         return None
-    
\ No newline at end of file
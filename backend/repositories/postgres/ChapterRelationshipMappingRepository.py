@@ -0,0 +1,89 @@
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from models.postgres.ChapterRelationshipMapping import ChapterRelationshipMappingBase
+from tables.postgres.ChapterRelationshipMappingTable import ChapterRelationshipMappingTable
+from tables.postgres.ChapterTable import ChapterTable
+
+_KEY_COLUMNS = (
+    ChapterRelationshipMappingTable.source_label,
+    ChapterRelationshipMappingTable.source_name,
+    ChapterRelationshipMappingTable.relationship_type,
+    ChapterRelationshipMappingTable.target_label,
+    ChapterRelationshipMappingTable.target_name,
+)
+
+
+class ChapterRelationshipMappingRepository:
+    @staticmethod
+    async def insert_many(db: AsyncSession, chapter_id: int, keys: list[tuple[str, str, str, str, str]], commit: bool = True) -> None:
+        """
+        Inserts the chapter's relationship keys with one multi-row INSERT ... ON CONFLICT DO NOTHING.
+        Duplicate keys and mappings that already exist are skipped.
+        With `commit=False` the insert joins the caller's transaction.
+        """
+        rows = [
+            ChapterRelationshipMappingBase(
+                chapter_id=chapter_id,
+                source_label=source_label,
+                source_name=source_name,
+                relationship_type=relationship_type,
+                target_label=target_label,
+                target_name=target_name,
+            ).model_dump()
+            for source_label, source_name, relationship_type, target_label, target_name in dict.fromkeys(keys)
+        ]
+        if not rows:
+            return
+        try:
+            await db.execute(insert(ChapterRelationshipMappingTable).values(rows).on_conflict_do_nothing())
+            if commit:
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error inserting chapter-relationship mappings: {e}")
+
+    @staticmethod
+    async def get_by_chapter_id(db: AsyncSession, chapter_id: int) -> list[ChapterRelationshipMappingBase]:
+        db_objects = (await db.execute(
+            select(ChapterRelationshipMappingTable).where(ChapterRelationshipMappingTable.chapter_id == chapter_id)
+        )).scalars().all()
+        return [ChapterRelationshipMappingBase.model_validate(obj) for obj in db_objects]
+
+    @staticmethod
+    async def get_referenced_in_story(db: AsyncSession, story_id: int,
+                                      keys: list[tuple[str, str, str, str, str]]) -> set[tuple[str, str, str, str, str]]:
+        """Which of the relationship keys are still mapped to a chapter of the story."""
+        if not keys:
+            return set()
+        rows = (await db.execute(
+            select(*_KEY_COLUMNS).join(
+                ChapterTable, ChapterTable.id == ChapterRelationshipMappingTable.chapter_id
+            ).where(
+                ChapterTable.story_id == story_id,
+                tuple_(*_KEY_COLUMNS).in_(keys),
+            ).distinct()
+        )).all()
+        return {tuple(row) for row in rows}
+
+    @staticmethod
+    async def delete_by_story_id(db: AsyncSession, story_id: int, commit: bool = True) -> int:
+        """
+        Deletes the mappings of all chapters of a story, returns how many were deleted.
+        With `commit=False` the delete joins the caller's transaction.
+        """
+        try:
+            chapter_ids = select(ChapterTable.id).where(ChapterTable.story_id == story_id)
+            result = await db.execute(
+                delete(ChapterRelationshipMappingTable).where(ChapterRelationshipMappingTable.chapter_id.in_(chapter_ids))
+            )
+            if commit:
+                await db.commit()
+            return result.rowcount
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error deleting chapter-relationship mappings: {e}")
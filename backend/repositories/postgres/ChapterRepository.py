@@ -1,5 +1,6 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 import sys
 import os
 
@@ -7,103 +8,170 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.
 from tables.postgres.ChapterTable import ChapterTable
 from models.postgres.Chapter import Chapter, ChapterBase
 from tables.postgres.StoryTable import StoryTable
+from tables.postgres.ChapterNodeMappingTable import ChapterNodeMappingTable
+from repositories.postgres.GraphExtractionJobRepository import GraphExtractionJobRepository
 
 
+def _select_chapters():
+    # Chapter includes its story. Async sessions can't lazy load it, so it is joined in the same query
+    return select(ChapterTable).options(joinedload(ChapterTable.story))
+
 
 class ChapterRepository:
     @staticmethod
-    async def insert(db: Session, new_chapter: ChapterBase) -> Chapter:
+    async def _get_with_story(db: AsyncSession, chapter_id: int) -> Chapter:
+        db_object = (await db.execute(_select_chapters().where(ChapterTable.id == chapter_id))).scalars().one()
+        return Chapter.model_validate(db_object)
+
+    @staticmethod
+    async def insert(db: AsyncSession, new_chapter: ChapterBase) -> Chapter:
         try:
-            stories = db.query(StoryTable).filter(StoryTable.id == new_chapter.story_id).first()
+            stories = await db.get(StoryTable, new_chapter.story_id)
             if not stories:
                 raise Exception(f"[ERROR] Story with id {new_chapter.story_id} does not exist.")
             db_object = ChapterTable(**new_chapter.model_dump())
             db.add(db_object)
-            db.commit()
-            db.refresh(db_object)
-            return Chapter.model_validate(db_object)
-        except Exception as e:  
-            db.rollback()
+            await db.commit()
+            return await ChapterRepository._get_with_story(db, db_object.id)
+        except Exception as e:
+            await db.rollback()
             raise Exception(f"[ERROR] Error inserting chapter: {e}")
-    
+
+    @staticmethod
+    async def insert_with_extraction_job(db: AsyncSession, new_chapter: ChapterBase) -> Chapter:
+        """
+        Inserts the chapter and its graph extraction job in one transaction (transactional outbox),
+        so a saved chapter is always eventually indexed, and a failed save leaves no job behind.
+        """
+        try:
+            stories = await db.get(StoryTable, new_chapter.story_id)
+            if not stories:
+                raise Exception(f"[ERROR] Story with id {new_chapter.story_id} does not exist.")
+            db_object = ChapterTable(**new_chapter.model_dump())
+            db.add(db_object)
+            await db.flush() # Assigns the chapter's id
+            GraphExtractionJobRepository.add(db, db_object.id)
+            await db.commit()
+            return await ChapterRepository._get_with_story(db, db_object.id)
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error inserting chapter: {e}")
+
     @staticmethod
-    async def get_by_id(db: Session, chapter_id: int) -> Chapter | None:
-        db_object = db.query(ChapterTable).filter(ChapterTable.id == chapter_id).first()
+    async def get_by_id(db: AsyncSession, chapter_id: int) -> Chapter | None:
+        db_object = (await db.execute(_select_chapters().where(ChapterTable.id == chapter_id))).scalars().first()
         if db_object:
             return Chapter.model_validate(db_object)
         return None
-    
+
     @staticmethod
-    async def get_all(db: Session) -> list[Chapter]:
-        db_objects = db.query(ChapterTable).all()
+    async def get_all(db: AsyncSession) -> list[Chapter]:
+        db_objects = (await db.execute(_select_chapters())).scalars().all()
         return [Chapter.model_validate(obj) for obj in db_objects]
-    
+
     @staticmethod
-    async def get_all_by_story_id(db: Session, story_id: int) -> list[Chapter]:
+    async def get_all_by_story_id(db: AsyncSession, story_id: int) -> list[Chapter]:
         # SELECT * FROM chapters WHERE story_id = :story_id ORDER BY sort_order ASC
-        db_objects = db.query(ChapterTable).filter(ChapterTable.story_id == story_id).order_by(ChapterTable.sort_order.asc()).all()
+        db_objects = (await db.execute(
+            _select_chapters().where(ChapterTable.story_id == story_id).order_by(ChapterTable.sort_order.asc())
+        )).scalars().all()
         return [Chapter.model_validate(obj) for obj in db_objects]
-    
+
     @staticmethod
-    async def get_summaries_by_story_id(db: Session, story_id: int) -> list[dict]:
-        db_objects = db.query(
-            ChapterTable.id,
-            ChapterTable.title,
-            ChapterTable.sort_order,
-            ChapterTable.summary
-        ).filter(ChapterTable.story_id == story_id)\
-         .order_by(ChapterTable.sort_order.asc())\
-         .all()
-        
+    async def get_summaries_by_story_id(db: AsyncSession, story_id: int) -> list[dict]:
+        db_objects = (await db.execute(
+            select(
+                ChapterTable.id,
+                ChapterTable.title,
+                ChapterTable.sort_order,
+                ChapterTable.summary
+            ).where(ChapterTable.story_id == story_id)
+             .order_by(ChapterTable.sort_order.asc())
+        )).all()
+
         return [{"id": obj.id, "title": obj.title, "sort_order": obj.sort_order, "summary": obj.summary} for obj in db_objects]
-    
+
+    @staticmethod
+    async def get_by_node_label_and_name(db: AsyncSession, node_label: str, node_name: str,
+                                         story_id: int | None = None, summary_only: bool = False) -> list[Chapter] | list[dict]:
+        """
+        The chapters a graph node was extracted from, ordered by sort order, in one query.\n
+        With `summary_only`, only id, title, summary and sort order are loaded, as dicts.
+        """
+        # SELECT chapters.* FROM chapters JOIN chapter_node_mappings ON ... WHERE label AND name [AND story_id] ORDER BY sort_order
+        if summary_only:
+            query = select(ChapterTable.id, ChapterTable.title, ChapterTable.summary, ChapterTable.sort_order)
+        else:
+            # The story is joined in the same query, instead of lazy loaded per chapter
+            query = _select_chapters()
+        query = query.join(
+            ChapterNodeMappingTable, ChapterNodeMappingTable.chapter_id == ChapterTable.id
+        ).where(
+            ChapterNodeMappingTable.node_label == node_label,
+            ChapterNodeMappingTable.node_name == node_name,
+        )
+        if story_id is not None:
+            query = query.where(ChapterTable.story_id == story_id)
+        query = query.order_by(ChapterTable.sort_order.asc())
+
+        if summary_only:
+            return [{"id": obj.id, "title": obj.title, "summary": obj.summary, "sort_order": obj.sort_order} for obj in (await db.execute(query)).all()]
+        return [Chapter.model_validate(obj) for obj in (await db.execute(query)).scalars().all()]
+
+    @staticmethod
+    async def get_story_id_by_chapter_id(db: AsyncSession, chapter_id: int) -> int | None:
+        return await db.scalar(select(ChapterTable.story_id).where(ChapterTable.id == chapter_id))
+
     @staticmethod
-    async def get_chapter_by_title(db: Session, story_id: int, title: str) -> Chapter | None:
-        db_object = db.query(ChapterTable)\
-                        .filter(ChapterTable.story_id == story_id)\
-                        .filter(ChapterTable.title == title)\
-                        .first()
+    async def get_chapter_by_title(db: AsyncSession, story_id: int, title: str) -> Chapter | None:
+        db_object = (await db.execute(
+            _select_chapters()
+                .where(ChapterTable.story_id == story_id)
+                .where(ChapterTable.title == title)
+        )).scalars().first()
         if db_object:
             return Chapter.model_validate(db_object)
         return None
-    
+
     @staticmethod
-    async def delete_by_id(db: Session, chapter_id: int) -> bool:
+    async def delete_by_id(db: AsyncSession, chapter_id: int) -> bool:
         try:
-            db_object = db.query(ChapterTable).filter(ChapterTable.id == chapter_id).first()
+            db_object = await db.get(ChapterTable, chapter_id)
             if db_object:
-                db.delete(db_object)
-                db.commit()
+                await db.delete(db_object)
+                await db.commit()
                 return True
             return False
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"[ERROR] Error deleting chapter: {e}")
-    
+
     @staticmethod
-    async def get_max_sort_order(db: Session, story_id: int) -> float:
+    async def get_max_sort_order(db: AsyncSession, story_id: int) -> float:
         """Finds the highest sort_order currently in the story."""
-        result = db.query(func.max(ChapterTable.sort_order))\
-                   .filter(ChapterTable.story_id == story_id)\
-                   .scalar()
+        result = await db.scalar(
+            select(func.max(ChapterTable.sort_order)).where(ChapterTable.story_id == story_id)
+        )
         return result if result is not None else 0.0
-    
+
     @staticmethod
-    async def get_min_sort_order(db: Session, story_id: int) -> float | None:
+    async def get_min_sort_order(db: AsyncSession, story_id: int) -> float | None:
         """Finds the lowest sort_order currently in the story."""
-        result = db.query(func.min(ChapterTable.sort_order))\
-                   .filter(ChapterTable.story_id == story_id)\
-                   .scalar()
+        result = await db.scalar(
+            select(func.min(ChapterTable.sort_order)).where(ChapterTable.story_id == story_id)
+        )
         return result
 
     @staticmethod
-    async def get_next_chapter_by_sort_order(db: Session, story_id: int, current_sort_order: float) -> Chapter | None:
+    async def get_next_chapter_by_sort_order(db: AsyncSession, story_id: int, current_sort_order: float) -> Chapter | None:
         """Finds the chapter that comes immediately AFTER a specific sort_order."""
-        db_object = db.query(ChapterTable)\
-                      .filter(ChapterTable.story_id == story_id)\
-                      .filter(ChapterTable.sort_order > current_sort_order)\
-                      .order_by(ChapterTable.sort_order.asc())\
-                      .first()
+        db_object = (await db.execute(
+            _select_chapters()
+                .where(ChapterTable.story_id == story_id)
+                .where(ChapterTable.sort_order > current_sort_order)
+                .order_by(ChapterTable.sort_order.asc())
+                .limit(1)
+        )).scalars().first()
         if db_object:
             return Chapter.model_validate(db_object)
-        return None
\ No newline at end of file
+        return None
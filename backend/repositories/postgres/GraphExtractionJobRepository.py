@@ -0,0 +1,159 @@
+from sqlalchemy import and_, func, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from models.postgres.GraphExtractionJob import GraphExtractionJobBase, PENDING, PROCESSING, DONE, FAILED
+from tables.postgres.GraphExtractionJobTable import GraphExtractionJobTable
+from tables.postgres.ChapterTable import ChapterTable
+
+
+class GraphExtractionJobRepository:
+    @staticmethod
+    def add(db: AsyncSession, chapter_id: int):
+        """
+        Adds a pending job to the session WITHOUT committing, so it is committed together with the chapter.
+        """
+        now = int(time.time())
+        db.add(GraphExtractionJobTable(
+            chapter_id=chapter_id, status=PENDING, attempts=0,
+            available_at=now, created_at=now, updated_at=now,
+        ))
+
+    @staticmethod
+    async def claim_next(db: AsyncSession, lease_seconds: int, story_ids: list[int] | None = None) -> GraphExtractionJobBase | None:
+        """
+        Claims the oldest available job: a pending one whose backoff has passed, or a processing one
+        whose worker has not finished within `lease_seconds` (e.g. the process died).
+        With `story_ids`, only jobs of chapters of those stories.\n
+        Uses FOR UPDATE SKIP LOCKED, so workers in several processes never claim the same job.
+        """
+        try:
+            now = int(time.time())
+            query = select(GraphExtractionJobTable).where(or_(
+                and_(GraphExtractionJobTable.status == PENDING, GraphExtractionJobTable.available_at <= now),
+                and_(GraphExtractionJobTable.status == PROCESSING, GraphExtractionJobTable.locked_at < now - lease_seconds),
+            ))
+            if story_ids is not None:
+                query = query.where(GraphExtractionJobTable.chapter_id.in_(
+                    select(ChapterTable.id).where(ChapterTable.story_id.in_(story_ids))
+                ))
+            db_object = (await db.execute(
+                query.order_by(GraphExtractionJobTable.id).limit(1).with_for_update(skip_locked=True)
+            )).scalars().first()
+            if not db_object:
+                await db.rollback()
+                return None
+            db_object.status = PROCESSING
+            db_object.attempts += 1
+            db_object.locked_at = now
+            db_object.updated_at = now
+            await db.commit()
+            await db.refresh(db_object)
+            return GraphExtractionJobBase.model_validate(db_object)
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error claiming graph extraction job: {e}")
+
+    @staticmethod
+    def _claimed_by(job: GraphExtractionJobBase):
+        """
+        The job's row, if it is still in the claim `job` was returned for: not requeued, finished,
+        or claimed again after the lease expired (each claim increments attempts).
+        """
+        return and_(
+            GraphExtractionJobTable.id == job.id,
+            GraphExtractionJobTable.status == PROCESSING,
+            GraphExtractionJobTable.attempts == job.attempts,
+            GraphExtractionJobTable.locked_at == job.locked_at,
+        )
+
+    @staticmethod
+    async def mark_done(db: AsyncSession, job: GraphExtractionJobBase) -> bool:
+        """Marks the claimed job done. False if the claim was lost in the meantime, then nothing is changed."""
+        try:
+            result = await db.execute(update(GraphExtractionJobTable).where(GraphExtractionJobRepository._claimed_by(job)).values({
+                GraphExtractionJobTable.status: DONE,
+                GraphExtractionJobTable.last_error: None,
+                GraphExtractionJobTable.locked_at: None,
+                GraphExtractionJobTable.updated_at: int(time.time()),
+            }))
+            await db.commit()
+            return result.rowcount > 0
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error completing graph extraction job: {e}")
+
+    @staticmethod
+    async def mark_failed(db: AsyncSession, job: GraphExtractionJobBase, error: str, retry_at: int | None) -> bool:
+        """
+        Puts the claimed job back as pending until `retry_at`, or marks it failed for good if `retry_at` is None.
+        False if the claim was lost in the meantime, then nothing is changed.
+        """
+        try:
+            result = await db.execute(update(GraphExtractionJobTable).where(GraphExtractionJobRepository._claimed_by(job)).values({
+                GraphExtractionJobTable.status: PENDING if retry_at is not None else FAILED,
+                GraphExtractionJobTable.last_error: error,
+                GraphExtractionJobTable.available_at: retry_at if retry_at is not None else GraphExtractionJobTable.available_at,
+                GraphExtractionJobTable.locked_at: None,
+                GraphExtractionJobTable.updated_at: int(time.time()),
+            }))
+            await db.commit()
+            return result.rowcount > 0
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error failing graph extraction job: {e}")
+
+    @staticmethod
+    async def requeue_by_story_id(db: AsyncSession, story_id: int, commit: bool = True) -> None:
+        """
+        Puts every chapter of the story (back) in the outbox as a fresh pending job, in one statement.
+        Chapters saved before the outbox existed get their first job. Workers still processing one of the jobs
+        lose their claim (see mark_done). With `commit=False` the requeue joins the caller's transaction.
+        """
+        try:
+            now = int(time.time())
+            fresh_job = {
+                "status": PENDING, "attempts": 0, "last_error": None,
+                "available_at": now, "locked_at": None, "updated_at": now,
+            }
+            chapters = select(
+                ChapterTable.id, literal(PENDING), literal(0), literal(now), literal(now), literal(now)
+            ).where(ChapterTable.story_id == story_id)
+            statement = insert(GraphExtractionJobTable).from_select(
+                ["chapter_id", "status", "attempts", "available_at", "created_at", "updated_at"], chapters
+            )
+            await db.execute(statement.on_conflict_do_update(index_elements=[GraphExtractionJobTable.chapter_id], set_=fresh_job))
+            if commit:
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error requeueing graph extraction jobs: {e}")
+
+    @staticmethod
+    async def count_by_status_for_story(db: AsyncSession, story_id: int) -> dict[str, int]:
+        rows = (await db.execute(select(GraphExtractionJobTable.status, func.count()).join(
+            ChapterTable, ChapterTable.id == GraphExtractionJobTable.chapter_id
+        ).where(ChapterTable.story_id == story_id).group_by(GraphExtractionJobTable.status))).all()
+        counts = {PENDING: 0, PROCESSING: 0, DONE: 0, FAILED: 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    @staticmethod
+    async def get_by_chapter_id(db: AsyncSession, chapter_id: int) -> GraphExtractionJobBase | None:
+        db_object = (await db.execute(
+            select(GraphExtractionJobTable).where(GraphExtractionJobTable.chapter_id == chapter_id)
+        )).scalars().first()
+        if db_object:
+            return GraphExtractionJobBase.model_validate(db_object)
+        return None
+
+    @staticmethod
+    async def get_by_story_id(db: AsyncSession, story_id: int) -> list[GraphExtractionJobBase]:
+        db_objects = (await db.execute(select(GraphExtractionJobTable).join(
+            ChapterTable, ChapterTable.id == GraphExtractionJobTable.chapter_id
+        ).where(ChapterTable.story_id == story_id).order_by(ChapterTable.sort_order))).scalars().all()
+        return [GraphExtractionJobBase.model_validate(obj) for obj in db_objects]
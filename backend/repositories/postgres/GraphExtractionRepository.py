@@ -0,0 +1,32 @@
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from models.postgres.GraphExtraction import GraphExtractionBase
+from tables.postgres.GraphExtractionTable import GraphExtractionTable
+
+
+class GraphExtractionRepository:
+    @staticmethod
+    async def insert(db: AsyncSession, new_extraction: GraphExtractionBase) -> None:
+        """Inserts a cached extraction. A concurrent insert of the same key wins, both have the same content."""
+        try:
+            await db.execute(
+                insert(GraphExtractionTable)
+                .values(**new_extraction.model_dump())
+                .on_conflict_do_nothing(index_elements=[GraphExtractionTable.cache_key])
+            )
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error inserting graph extraction: {e}")
+
+    @staticmethod
+    async def get_by_cache_key(db: AsyncSession, cache_key: str) -> GraphExtractionBase | None:
+        db_object = await db.get(GraphExtractionTable, cache_key)
+        if db_object:
+            return GraphExtractionBase.model_validate(db_object)
+        return None
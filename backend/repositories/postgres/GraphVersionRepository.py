@@ -0,0 +1,35 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from tables.postgres.GraphVersionTable import GraphVersionTable
+
+
+class GraphVersionRepository:
+    @staticmethod
+    async def bump(db: AsyncSession, database_name: str, commit: bool = True) -> None:
+        """
+        Increments the graph's version in one atomic upsert, so concurrent bumps (from any process) are never lost.
+        With `commit=False` the bump joins the caller's transaction.
+        """
+        now = int(time.time())
+        statement = insert(GraphVersionTable).values(database_name=database_name, version=1, updated_at=now)
+        try:
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[GraphVersionTable.database_name],
+                set_={"version": GraphVersionTable.version + 1, "updated_at": now},
+            ))
+            if commit:
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error bumping the graph version of '{database_name}': {e}")
+
+    @staticmethod
+    async def get(db: AsyncSession, database_name: str) -> int:
+        version = await db.scalar(select(GraphVersionTable.version).where(GraphVersionTable.database_name == database_name))
+        return version or 0
@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import sys
 import os
 
@@ -9,32 +10,47 @@ from tables.postgres.ImageTable import ImageTable
 
 class ImageRepository:
     @staticmethod
-    async def insert(db: Session, new_image: ImageBase) -> ImageBase:
+    async def insert(db: AsyncSession, new_image: ImageBase) -> ImageBase:
         try:
             db_object = ImageTable(**new_image.model_dump())
             db.add(db_object)
-            db.commit()
-            db.refresh(db_object)
+            await db.commit()
+            await db.refresh(db_object)
             return ImageBase.model_validate(db_object)
         except Exception as e:  
-            db.rollback()
+            await db.rollback()
             raise Exception(f"[ERROR] Error inserting image: {e}")
     
     @staticmethod
-    async def get_by_story_id(db: Session, story_id: int) -> list[ImageBase]:
-        db_objects = db.query(ImageTable).filter(ImageTable.story_id == story_id).all()
+    async def get_by_story_id(db: AsyncSession, story_id: int) -> list[ImageBase]:
+        db_objects = (await db.execute(select(ImageTable).where(ImageTable.story_id == story_id))).scalars().all()
         return [ImageBase.model_validate(obj) for obj in db_objects]
     
     @staticmethod
-    async def delete_by_id(db: Session, image_id: int) -> bool:
+    async def get_page_by_story_id(db: AsyncSession, story_id: int, limit: int, before_id: int | None = None) -> list[ImageBase]:
+        """
+        Keyset pagination, newest first: the images of a story with an id below `before_id`.
+        """
+        query = select(ImageTable).where(ImageTable.story_id == story_id)
+        if before_id is not None:
+            query = query.where(ImageTable.id < before_id)
+        db_objects = (await db.execute(query.order_by(ImageTable.id.desc()).limit(limit))).scalars().all()
+        return [ImageBase.model_validate(obj) for obj in db_objects]
+
+    @staticmethod
+    async def get_all_paths(db: AsyncSession) -> set[str]:
+        return set((await db.execute(select(ImageTable.image_path))).scalars().all())
+
+    @staticmethod
+    async def delete_by_id(db: AsyncSession, image_id: int) -> bool:
         try:
-            db_object = db.query(ImageTable).filter(ImageTable.id == image_id).first()
+            db_object = await db.get(ImageTable, image_id)
             if not db_object:
                 return False
-            db.delete(db_object)
-            db.commit()
+            await db.delete(db_object)
+            await db.commit()
             return True
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"[ERROR] Error deleting image: {e}")
     
\ No newline at end of file
@@ -0,0 +1,50 @@
+from sqlalchemy import func, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from tables.postgres.RateLimitTable import RateLimitTable
+
+# The database's clock, so processes on different hosts agree on the slots
+_NOW = func.extract("epoch", func.statement_timestamp())
+
+
+class RateLimitRepository:
+    @staticmethod
+    async def set_limit(db: AsyncSession, name: str, per_minute: float | None, expires_at: int | None = None) -> None:
+        """Sets (or with `per_minute=None` lifts) the limit. Slots already handed out stay reserved."""
+        statement = insert(RateLimitTable).values(name=name, per_minute=per_minute, next_at=0.0, expires_at=expires_at)
+        try:
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[RateLimitTable.name],
+                set_={"per_minute": per_minute, "expires_at": expires_at},
+            ))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error setting rate limit '{name}': {e}")
+
+    @staticmethod
+    async def reserve(db: AsyncSession, name: str) -> float:
+        """
+        Reserves the next slot of the limit in one atomic UPDATE, and returns the seconds until it starts.
+        0 if there is no limit, or it expired.
+        """
+        interval = 60.0 / RateLimitTable.per_minute
+        try:
+            delay = await db.scalar(
+                update(RateLimitTable).where(
+                    RateLimitTable.name == name,
+                    RateLimitTable.per_minute.is_not(None),
+                    or_(RateLimitTable.expires_at.is_(None), RateLimitTable.expires_at > _NOW),
+                ).values(
+                    next_at=func.greatest(RateLimitTable.next_at, _NOW) + interval
+                ).returning(RateLimitTable.next_at - interval - _NOW) # RETURNING sees the new next_at
+            )
+            await db.commit()
+            return max(0.0, delay or 0.0)
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[ERROR] Error reserving a slot of rate limit '{name}': {e}")
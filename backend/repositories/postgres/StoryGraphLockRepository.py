@@ -0,0 +1,18 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# First key of the advisory locks, so they don't collide with other advisory locks on the database
+_STORY_GRAPH_LOCK_NAMESPACE = 1
+
+
+class StoryGraphLockRepository:
+    @staticmethod
+    async def lock(db: AsyncSession, story_id: int) -> None:
+        """
+        Takes the story's graph lock, a Postgres advisory lock held until the session's transaction ends
+        (commit or rollback), in every process.\n
+        Writers that decide from the mappings what the graph should contain hold it through their Neo4j write:
+        indexing a chapter, cleaning up after a deleted one, and resetting the story's index.
+        Blocks until the lock is free, at most for the statement timeout.
+        """
+        await db.execute(select(func.pg_advisory_xact_lock(_STORY_GRAPH_LOCK_NAMESPACE, story_id)))
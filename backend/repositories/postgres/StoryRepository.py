@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import sys
 import os
 
@@ -8,50 +9,50 @@ from models.postgres.Story import Story
 
 class StoryRepository:
     @staticmethod
-    async def insert(db: Session, new_story: Story) -> Story:
+    async def insert(db: AsyncSession, new_story: Story) -> Story:
         try:
             db_object = StoryTable(**new_story.model_dump())
             db.add(db_object)
-            db.commit()
-            db.refresh(db_object)
+            await db.commit()
+            await db.refresh(db_object)
             return Story.model_validate(db_object)
         except Exception as e:  
-            db.rollback()
+            await db.rollback()
             raise Exception(f"[ERROR] Error inserting story: {e}")
     
     @staticmethod
-    async def get_by_id(db: Session, story_id: int) -> Story | None:
-        db_object = db.query(StoryTable).filter(StoryTable.id == story_id).first()
+    async def get_by_id(db: AsyncSession, story_id: int) -> Story | None:
+        db_object = await db.get(StoryTable, story_id)
         if db_object:
             return Story.model_validate(db_object)
         return None
     
     @staticmethod
-    async def get_all(db: Session) -> list[Story]:
-        db_objects = db.query(StoryTable).all()
+    async def get_all(db: AsyncSession) -> list[Story]:
+        db_objects = (await db.execute(select(StoryTable))).scalars().all()
         return [Story.model_validate(obj) for obj in db_objects]
     
     @staticmethod
-    async def delete_by_id(db: Session, story_id: int) -> bool:
+    async def delete_by_id(db: AsyncSession, story_id: int) -> bool:
         try:
-            db_object = db.query(StoryTable).filter(StoryTable.id == story_id).first()
+            db_object = await db.get(StoryTable, story_id)
             if db_object:
-                db.delete(db_object)
-                db.commit()
+                await db.delete(db_object)
+                await db.commit()
                 return True
             return False
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"[ERROR] Error deleting story: {e}")
         
     @staticmethod
-    async def update_story(db: Session, story_id: int, new_title: str| None = None,
+    async def update_story(db: AsyncSession, story_id: int, new_title: str| None = None,
                            new_story_length: str| None = None, new_chapter_length: str| None = None, 
                            new_genre: str| None = None, new_additional_notes: str| None = None, 
                            new_main_characters: str| None = None, 
                            new_plot_ideas: str| None = None) -> Story | None:
         try:
-            db_object = db.query(StoryTable).filter(StoryTable.id == story_id).first()
+            db_object = await db.get(StoryTable, story_id)
             if db_object:
                 if new_title is not None:
                     db_object.title = new_title # type: ignore
@@ -68,10 +69,9 @@ class StoryRepository:
                 if new_plot_ideas is not None:
                     db_object.plot_ideas = new_plot_ideas # type: ignore
                 
-                db.commit()
-                db.refresh(db_object)
+                await db.commit()
+                await db.refresh(db_object)
                 return Story.model_validate(db_object)
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"[ERROR] Error updating story title: {e}")
-    
\ No newline at end of file
@@ -13,4 +13,24 @@ async def get_all_chapters_by_story_id(story_id: int, request: Request):
         chapters = await request.app.state.db.get_all_chapters_by_story_id(story_id)
         return [chapter.model_dump() for chapter in chapters]
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@chapter_router.get("/indexing/{chapter_id}")
+async def get_indexing_status_by_chapter_id(chapter_id: int, request: Request):
+    """Get the graph extraction status of a chapter: pending, processing, done or failed"""
+    try:
+        job = await request.app.state.db.get_indexing_status_by_chapter_id(chapter_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No indexing job found for chapter {chapter_id}")
+    return job.model_dump()
+
+@chapter_router.get("/indexing/story/{story_id}")
+async def get_indexing_status_by_story_id(story_id: int, request: Request):
+    """Get the graph extraction status of every chapter of a story, in story order"""
+    try:
+        jobs = await request.app.state.db.get_indexing_status_by_story_id(story_id)
+        return [job.model_dump() for job in jobs]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
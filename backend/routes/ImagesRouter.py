@@ -1,10 +1,27 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.agent_service import TaleMachineAgentService
+from services.image_store import ContentAddressedImageStore, THUMBNAIL_WIDTH, MEDIUM_WIDTH
 
 images_router = APIRouter(prefix="/images", tags=["images"])
+image_store = ContentAddressedImageStore()
+
+def _gallery_items(images) -> list[dict]:
+    """The images with their thumbnail and medium paths. Checks the derivatives' files, run it in the threadpool."""
+    items = []
+    for image in images:
+        thumbnail_path = image_store.derivative_path(image.image_path, THUMBNAIL_WIDTH)
+        medium_path = image_store.derivative_path(image.image_path, MEDIUM_WIDTH)
+        items.append({
+            **image.model_dump(),
+            "thumbnail_path": thumbnail_path if thumbnail_path and os.path.exists(thumbnail_path) else image.image_path,
+            "medium_path": medium_path if medium_path and os.path.exists(medium_path) else image.image_path,
+        })
+    return items
 
 @images_router.get("/all/{story_id}")
 async def get_all_images_by_story_id(story_id: int, request: Request):
@@ -15,6 +32,23 @@ async def get_all_images_by_story_id(story_id: int, request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+@images_router.get("/gallery/{story_id}")
+async def get_gallery_page(story_id: int, request: Request, limit: int = Query(24, ge=1, le=100), cursor: int | None = None):
+    """
+    Get one page of a story's gallery, newest first.
+    Pass the returned `next_cursor` as `cursor` to get the next page; it is null on the last page.
+    Thumbnail and medium paths fall back to the original for images without derivatives.
+    """
+    try:
+        images = await request.app.state.db.get_image_page_by_story_id(story_id, limit + 1, cursor)
+        has_more = len(images) > limit
+        images = images[:limit]
+        # One trip to the threadpool for the page's file checks, instead of blocking the event loop per item
+        items = await run_in_threadpool(_gallery_items, images)
+        return {"items": items, "next_cursor": images[-1].id if has_more else None}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @images_router.delete("/delete/{image_id}")
 async def delete_image_by_id(image_id: int, request: Request):
     """Delete image by its ID"""
@@ -24,4 +58,17 @@ async def delete_image_by_id(image_id: int, request: Request):
             raise HTTPException(status_code=404, detail="Image not found")
         return {"success": True}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@images_router.get("/jobs/{job_id}")
+async def get_image_job(job_id: str):
+    """Get the status (queued, rendering, saving, done, failed) of an image generation job"""
+    job = TaleMachineAgentService.get_image_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Image job not found")
+    return job.model_dump()
+
+@images_router.get("/jobs/story/{story_id}")
+async def get_image_jobs_by_story_id(story_id: int):
+    """Get all recent image generation jobs for a given story ID"""
+    return [job.model_dump() for job in TaleMachineAgentService.get_image_jobs_by_story_id(story_id)]
\ No newline at end of file
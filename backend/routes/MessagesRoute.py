@@ -5,53 +5,47 @@ import os
 import sys
 
 from fastapi.responses import StreamingResponse
-from httpcore import request
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from services.agent_service import TaleMachineAgentService
+from services.sse_stream import coalesced_sse, SSE_HEADERS
 from models.MessageRequest import MessageRequest, ResumeMessageRequest
 
 messages_router = APIRouter(prefix="/messages", tags=["messages"])
 
 @messages_router.post("/send")
 async def send_message(message_request: MessageRequest, request: Request):
-    """Send a message"""
-    async def generate():
-        try:
-            async for response in TaleMachineAgentService.run(message_request.messages, 
-                                                              message_request.story_name, 
-                                                              message_request.thread_id, 
-                                                              message_request.story_id, 
-                                                              request.app.state.db,
-                                                              message_request.story_length,
-                                                              message_request.chapter_length,
-                                                              message_request.genre,
-                                                              message_request.additional_notes,
-                                                              message_request.main_characters,
-                                                              message_request.plot_ideas):
-                yield response
-        except Exception as e:
-            yield f"Error: {str(e)}"
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    """
+    Send a message. Responds with server-sent events: token, tool_status, interrupt, error and done.
+    """
+    events = TaleMachineAgentService.run(message_request.messages, 
+                                         message_request.story_name, 
+                                         message_request.thread_id, 
+                                         message_request.story_id, 
+                                         request.app.state.db,
+                                         message_request.story_length,
+                                         message_request.chapter_length,
+                                         message_request.genre,
+                                         message_request.additional_notes,
+                                         message_request.main_characters,
+                                         message_request.plot_ideas)
+    return StreamingResponse(coalesced_sse(events, request), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @messages_router.post("/resume_after_interrupt")
 async def resume_after_interrupt(resume_request: ResumeMessageRequest, request: Request):
-    """Resume after an interrupt with user approval or denial"""
-    async def generate():
-        try:
-            async for response in TaleMachineAgentService.resume_after_interrupt(resume_request.thread_id, 
-                                                                                 resume_request.approval, 
-                                                                                 resume_request.story_name, 
-                                                                                 resume_request.story_id, 
-                                                                                 request.app.state.db,
-                                                                                 resume_request.story_length, 
-                                                                                 resume_request.chapter_length,
-                                                                                 resume_request.genre,
-                                                                                 resume_request.additional_notes,
-                                                                                 resume_request.main_characters,
-                                                                                 resume_request.plot_ideas,
-                                                                                 resume_request.chapter_id
-                                                                                 ):
-                yield response
-        except Exception as e:
-            yield f"Error: {str(e)}"
-    return StreamingResponse(generate(), media_type="text/event-stream")
\ No newline at end of file
+    """
+    Resume after an interrupt with user approval or denial. Responds with the same events as /send.
+    """
+    events = TaleMachineAgentService.resume_after_interrupt(resume_request.thread_id, 
+                                                            resume_request.approval, 
+                                                            resume_request.story_name, 
+                                                            resume_request.story_id, 
+                                                            request.app.state.db,
+                                                            resume_request.story_length, 
+                                                            resume_request.chapter_length,
+                                                            resume_request.genre,
+                                                            resume_request.additional_notes,
+                                                            resume_request.main_characters,
+                                                            resume_request.plot_ideas,
+                                                            resume_request.chapter_id
+                                                            )
+    return StreamingResponse(coalesced_sse(events, request), media_type="text/event-stream", headers=SSE_HEADERS)
\ No newline at end of file
@@ -1,29 +1,132 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
 
+import json
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from models.Neo4jNaturalLanguageQuery import MessageRequest
 from models.Neo4jGetNodeChapter import Neo4jGetChapterNodeMapping
+from services.graph_response_cache import etag_matches
+from services.neo4j_service import MAX_NEIGHBORHOOD_HOPS, MAX_NEIGHBORHOOD_NEIGHBORS, MAX_NEIGHBORHOOD_NODES
 
 neo4j_router = APIRouter(prefix="/neo4j", tags=["neo4j"])
 
+# Browsers revalidate (send If-None-Match) on every request, and get a 304 while the graph's version is unchanged
+_GRAPH_CACHE_CONTROL = "no-cache"
+
+def _graph_variant(endpoint: str, *params) -> str:
+    return json.dumps([endpoint, *params])
+
+async def _graph_response(request: Request, database_name: str, variant: str, load):
+    """
+    Answers a graph request with an ETag (see PostgresService.get_graph_etag): a 304 if the client's copy is current,
+    otherwise the cached response, or `load()`'s result serialized and cached.
+    """
+    db = request.app.state.db
+    etag = await db.get_graph_etag(database_name, variant)
+    headers = {"ETag": etag, "Cache-Control": _GRAPH_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        db.graph_response_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    async def render() -> bytes:
+        return json.dumps(jsonable_encoder(await load()), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    body = await db.get_graph_response(etag, render)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @neo4j_router.get("/get_all_nodes_relationships/{database_name}")
 async def get_all_nodes_and_relationships(database_name: str, request: Request):
     """Get all nodes and relationships from a Neo4j database"""
     try:
-        data = await request.app.state.db.get_all_nodes_and_relationships(database_name)
-        return data
+        return await _graph_response(
+            request, database_name, _graph_variant("all"),
+            lambda: request.app.state.db.get_all_nodes_and_relationships(database_name),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@neo4j_router.get("/graph/{database_name}")
+async def export_graph(database_name: str, request: Request, limit: int = Query(2000, ge=1, le=10000),
+                       cursor: str | None = None, label: list[str] | None = Query(None),
+                       relationship_type: list[str] | None = Query(None)):
+    """
+    Get one page of a story's graph: every node once, and edges that reference their nodes by id.
+    Pass the returned `next_cursor` as `cursor` to get the next page; it is null on the last page.
+    Every page scans the whole graph, to load all of a large graph use /graph/{database_name}/ndjson.
+    Repeat `label` / `relationship_type` to only get nodes with those labels / edges of those types.
+    Responses carry an ETag that changes with the graph; send it as If-None-Match to get a 304 while it is unchanged.
+    """
+    label = sorted(set(label)) if label else None
+    relationship_type = sorted(set(relationship_type)) if relationship_type else None
+    try:
+        return await _graph_response(
+            request, database_name, _graph_variant("graph", limit, cursor, label, relationship_type),
+            lambda: request.app.state.db.export_graph_page(database_name, limit, cursor, label, relationship_type),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@neo4j_router.get("/graph/{database_name}/ndjson")
+async def stream_graph(database_name: str, request: Request, label: list[str] | None = Query(None),
+                       relationship_type: list[str] | None = Query(None)):
+    """The same rows as /graph/{database_name}, streamed as NDJSON: {"node": ...} lines, then {"edge": ...} lines"""
+    # Not cached (it is meant for graphs too big to hold), but answered with a 304 while the graph is unchanged
+    try:
+        etag = await request.app.state.db.get_graph_etag(
+            database_name, _graph_variant("ndjson", sorted(set(label or [])), sorted(set(relationship_type or [])))
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    headers = {"ETag": etag, "Cache-Control": _GRAPH_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        request.app.state.db.graph_response_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    async def lines():
+        try:
+            async for row in request.app.state.db.stream_graph(database_name, label, relationship_type):
+                yield json.dumps(row) + "\n"
+        except Exception as e:
+            # The response has started, the error can only be reported in the stream
+            print(f"[ERROR] Streaming the graph of '{database_name}' failed: {e}", file=sys.stderr)
+            yield json.dumps({"error": str(e)}) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+
+@neo4j_router.get("/neighborhood/{database_name}")
+async def get_neighborhood(database_name: str, request: Request, label: str, name: str,
+                           hops: int = Query(1, ge=1, le=MAX_NEIGHBORHOOD_HOPS),
+                           max_neighbors: int = Query(25, ge=1, le=MAX_NEIGHBORHOOD_NEIGHBORS),
+                           max_nodes: int = Query(100, ge=1, le=MAX_NEIGHBORHOOD_NODES)):
+    """
+    Get the subgraph within `hops` of a node, in the format of /graph/{database_name} plus the `center` node's id.
+    At most `max_neighbors` relationships are followed per node (the best connected first), and at most `max_nodes` are returned.
+    """
+    async def load():
+        data = await request.app.state.db.get_neighborhood(database_name, label, name, hops, max_neighbors, max_nodes)
+        if data is None:
+            raise HTTPException(status_code=404, detail=f"No {label} node named '{name}' found")
+        return data
+    try:
+        return await _graph_response(
+            request, database_name, _graph_variant("neighborhood", label, name, hops, max_neighbors, max_nodes), load
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @neo4j_router.post("/natural_language_query")
 async def natural_language_query(request: Request, message: MessageRequest):
     """Perform a natural language query on the Neo4j database"""
     try:
-        data = await request.app.state.db.natural_language_query(message.query)
+        data = await request.app.state.db.natural_language_query(message.database_name, message.query)
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -32,7 +135,9 @@ async def natural_language_query(request: Request, message: MessageRequest):
 async def get_chapter_node_mapping(request: Request, node: Neo4jGetChapterNodeMapping):
     """Get the chapter node mapping for a given Neo4j node"""
     try:
-        data = await request.app.state.db.get_mapping_by_node_label_and_name(node.node_label, node.node_name)
+        data = await request.app.state.db.get_mapping_by_node_label_and_name(
+            node.node_label, node.node_name, story_id=node.story_id, summary_only=node.summary_only
+        )
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
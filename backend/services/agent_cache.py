@@ -0,0 +1,45 @@
+import os
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class AgentCache:
+    """
+    LRU cache of compiled agents.\n
+    Compiling an agent builds the LangGraph graph and binds the tools, which only needs to happen
+    once per tool set. Everything story-specific is passed in at invocation time instead.
+    """
+    def __init__(self, max_size: int | None = None):
+        self.max_size = max_size or int(os.getenv("AGENT_CACHE_SIZE", "32"))
+        self._agents: OrderedDict[Hashable, object] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], object]):
+        """Returns the cached agent for `key`, compiling it with `factory` on a miss."""
+        agent = self._agents.get(key)
+        if agent is not None:
+            self._agents.move_to_end(key)
+            self._hits += 1
+            return agent
+
+        self._misses += 1
+        agent = factory()
+        self._agents[key] = agent
+        if len(self._agents) > self.max_size:
+            self._agents.popitem(last=False)
+            self._evictions += 1
+        return agent
+
+    def clear(self):
+        self._agents.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "size": len(self._agents),
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+        }
@@ -2,18 +2,18 @@ import asyncio
 import base64
 import os
 import sys
+import tempfile
 from langgraph.types import interrupt, Command
-from langgraph.checkpoint.memory import MemorySaver
 import json
+import threading
+from dataclasses import dataclass
 # import streamlit as st
-from mcp import ClientSession
-from mcp.client.streamable_http import streamablehttp_client
 from langchain.agents import create_agent
+from langchain.agents.middleware import dynamic_prompt, ModelRequest
 from langchain.messages import AIMessage, ToolMessage
 from langchain_core.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_mcp_adapters.tools import load_mcp_tools
-from langchain.tools import tool
+from langchain.tools import tool, ToolRuntime
 from google.oauth2 import service_account
 from google import genai
 from google.genai import types
@@ -28,12 +28,29 @@ from langchain_mcp_adapters.interceptors import (
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models.postgres.Image import ImageBase
-from vertexai.preview.vision_models import ImageGenerationModel
-import vertexai
+from services.mcp_session_pool import McpSessionPool
+from services.agent_cache import AgentCache
+from services.checkpointer import CheckpointerProvider
+from services.story_context_builder import StoryContextBuilder
+from services.postgres_service import PostgresService
+from services.image_job_queue import ImageJobQueue
+from services.image_store import ContentAddressedImageStore
+from services import sse_stream
 
 from dotenv import load_dotenv
 load_dotenv()
 
+@dataclass
+class StoryContext:
+    """Story-specific state injected into a cached agent on every invocation."""
+    story_id: int
+    system_prompt: str
+    db_instance: object
+
+@dynamic_prompt
+def story_system_prompt(request: ModelRequest) -> str:
+    return request.runtime.context.system_prompt
+
 class TaleMachineAgentService:
     _llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite", google_api_key=os.getenv("GEMINI_API_KEY"))
     _prompt = PromptTemplate.from_template(
@@ -81,22 +98,17 @@ class TaleMachineAgentService:
         - Maintain the requested narrative tone and style strictly.
 
         Chapter overview and planning should be done in your mind only and not shared with the user unless explicitly requested.
-        Saved chapters and their summary (if available): {chapter_summaries}
+        Saved chapters and their summary (if available), formatted as [chapter id] title: summary:
+        {chapter_summaries}
         """
     )
     _mcp_server_url = os.getenv("MCP_SERVER_URL")
-    _checkpointer = MemorySaver()
+    # Bounded in-memory or durable (postgres/sqlite) checkpointer, see CHECKPOINTER_BACKEND
+    _checkpointer_provider = CheckpointerProvider()
     _service_account_path = os.getenv("VERTEX_SERVICE_ACCOUNT_LOCATION")
-    if _service_account_path and os.path.exists(_service_account_path):
-        # print("[DEBUG] Path to service account exists")
-        credentials = service_account.Credentials.from_service_account_file(
-            _service_account_path,
-            scopes=['https://www.googleapis.com/auth/cloud-platform']
-        )
-        # print("[DEBUG] Loaded credentials from service account file")
-    vertexai.init(project=os.getenv("VERTEX_PROJECT_ID"), location=os.getenv("VERTEX_PROJECT_LOCATION"), credentials=credentials)
-    
-    _image_generation_model = ImageGenerationModel.from_pretrained("imagen-3.0-generate-001")
+    # Vertex AI is initialized and the image model loaded on first use, see _get_image_generation_model
+    _image_generation_model = None
+    _image_generation_model_lock = threading.Lock()
 
     # Tool interceptor to ask for user approval before saving a story
     async def ask_approval_interceptor(
@@ -120,64 +132,229 @@ class TaleMachineAgentService:
                     isError=False,
                 )
 
+        # The chapter's story can only be looked up before it is deleted
+        deleted_story_id, looked_up = None, False
+        if request.name == "delete_chapter_by_id" and "chapter_id" in request.args:
+            runtime = getattr(request, "runtime", None)
+            db_instance = getattr(getattr(runtime, "context", None), "db_instance", None)
+            if db_instance is not None:
+                deleted_story_id = await db_instance.get_story_id_by_chapter_id(request.args["chapter_id"])
+                looked_up = True # None then means there is no such chapter, nothing to invalidate
+
         # Execute the tool
         result = await handler(request)
+
+        # The MCP server saves/deletes chapters in its own process, so drop this process' cached summaries
+        if request.name == "save_chapter" and "story_id" in request.args:
+            PostgresService.chapter_summary_cache.invalidate(request.args["story_id"])
+        elif request.name == "delete_chapter_by_id":
+            if deleted_story_id is not None:
+                PostgresService.chapter_summary_cache.invalidate(deleted_story_id)
+            elif not looked_up:
+                PostgresService.chapter_summary_cache.clear() # No database in the tool's runtime to look the chapter up
         return result
+
+    # Long-lived, initialized MCP sessions with their tool lists, shared across chat turns
+    _mcp_session_pool = McpSessionPool(_mcp_server_url, tool_interceptors=[ask_approval_interceptor])
+
+    # Compiled agents, keyed by the MCP connection whose tools they are bound to
+    _agent_cache = AgentCache()
+
+    # Renders chapter summaries into the prompt within STORY_CONTEXT_TOKEN_BUDGET
+    _context_builder = StoryContextBuilder(_llm)
+
+    # Generated images are stored under the digest of their bytes
+    _image_store = ContentAddressedImageStore()
+
+    # Image generation runs in a bounded worker pool instead of on the event loop
+    _image_job_queue = ImageJobQueue(
+        generate=lambda description: TaleMachineAgentService._render_image(description),
+        save=lambda img: TaleMachineAgentService._save_image(img),
+        derive=lambda image_path: TaleMachineAgentService._image_store.put_derivatives(image_path),
+    )
+
+    @staticmethod
+    def get_image_job(job_id: str):
+        return TaleMachineAgentService._image_job_queue.get(job_id)
+
+    @staticmethod
+    def get_image_jobs_by_story_id(story_id: int):
+        return TaleMachineAgentService._image_job_queue.get_by_story_id(story_id)
+
+    @staticmethod
+    def get_metrics() -> dict:
+        return {
+            "mcp_session_pool": TaleMachineAgentService._mcp_session_pool.metrics(),
+            "agent_cache": TaleMachineAgentService._agent_cache.metrics(),
+            "checkpointer": TaleMachineAgentService._checkpointer_provider.metrics(),
+            "story_context": TaleMachineAgentService._context_builder.metrics(),
+            "image_jobs": TaleMachineAgentService._image_job_queue.metrics(),
+        }
+
+    @staticmethod
+    async def close():
+        await TaleMachineAgentService._mcp_session_pool.close()
+        TaleMachineAgentService._agent_cache.clear()
+        await TaleMachineAgentService._checkpointer_provider.close()
+        await TaleMachineAgentService._image_job_queue.close()
     
     @staticmethod
-    def _initialize_agent(tools: list, prompt: str):
+    def _initialize_agent(tools: list, checkpointer):
+        """
+        Compiles an agent for a tool set. The system prompt and the story the tools act on
+        are read from the StoryContext passed to each invocation, so the agent can be reused across stories.
+        """
         agent = create_agent(
             model=TaleMachineAgentService._llm, 
             tools=tools, 
-            system_prompt=prompt, 
-            checkpointer=TaleMachineAgentService._checkpointer,
+            middleware=[story_system_prompt],
+            context_schema=StoryContext,
+            checkpointer=checkpointer,
         )
 
         return agent
+
+    @staticmethod
+    async def _get_agent(pooled_session):
+        checkpointer = await TaleMachineAgentService._checkpointer_provider.get()
+        tool_names = tuple(sorted(mcp_tool.name for mcp_tool in pooled_session.tools))
+        return TaleMachineAgentService._agent_cache.get_or_create(
+            (pooled_session.key, tool_names),
+            lambda: TaleMachineAgentService._initialize_agent(
+                list(pooled_session.tools) + [TaleMachineAgentService.create_generate_image_tool()],
+                checkpointer,
+            ),
+        )
     
     # Separate tool for image generation that returns a direct answer to the user
     # This is a tricky one
     @staticmethod
-    def create_generate_image_tool(story_id: int, db_instance):
+    def create_generate_image_tool():
         @tool(return_direct=True)
-        async def generate_image(description: str) -> str:
+        async def generate_image(description: str, runtime: ToolRuntime[StoryContext]) -> str:
             """
-            Generate an image based on the provided description. A url to the generated image will be returned.
+            Generate an image based on the provided description. The image is rendered in the background and shows up in the gallery when done.
             The description should be detailed enough to create a vivid image. Use user prompt and chapter context to create the description.
             Try to add keywords like "high quality", "8k", "cinematic lighting", "intricate details", "realistic", "artistic", "artstation" to the description to improve image quality.
             """
+            story_id = runtime.context.story_id
+            db_instance = runtime.context.db_instance
             # ask the user to link the image to a chapter or just save it to the story
             value = interrupt(json.dumps({"tool_name": "generate_image", "messsage": "Please provide the chapter ID to link the image to. If you don't want to link it to a chapter, please select \"Save to story\""}))    
                
+            # save image to the database (if the user doesn't want to save it to a chapter, the value passed should be -1)
+            chapter_id = None if value == -1 else value
             try:
-                images = TaleMachineAgentService._image_generation_model.generate_images(
-                    prompt=description,
-                    number_of_images=1,
-                    aspect_ratio="16:9",
-                    safety_filter_level="block_some",
-                    person_generation="allow_adult"
-                )
+                job = await TaleMachineAgentService._image_job_queue.submit(description, story_id, chapter_id, db_instance)
             except Exception as e:
                 return f"Error generating image: {str(e)}"
-            
-            try:
-                img = images[0]
-                os.makedirs("generated_images", exist_ok=True)
-                filename = f"generated_images/image_{hash(description) % 10**8}.png"
-                img.save(filename)
-
-                # save image to the database (if the user doesn't want to save it to a chapter, the value passed should be -1)
-                if value == -1:
-                    new_image = ImageBase(image_path=filename, story_id=story_id, chapter_id=None)
-                else:
-                    new_image = ImageBase(image_path=filename, story_id=story_id, chapter_id=value) 
-                new_image = await db_instance.insert_image(new_image)
-                return f"Image generated! You can view it in the gallery now."
-            except Exception as e:
-                return f"Error saving image: {str(e)}"
+            # Streamed to the client (stream mode "custom"), so it can follow the job and refresh the gallery when done
+            runtime.stream_writer({"image_job": {"id": job.id, "status": job.status, "story_id": story_id, "chapter_id": chapter_id}})
+            return f"Image queued! It will appear in the gallery as soon as it is rendered. (job {job.id})"
         
         return generate_image
+
+    @staticmethod
+    def _get_image_generation_model():
+        """Initializes Vertex AI and loads the image model once. Blocking, called from worker threads."""
+        if TaleMachineAgentService._image_generation_model is None:
+            with TaleMachineAgentService._image_generation_model_lock:
+                if TaleMachineAgentService._image_generation_model is None:
+                    from vertexai.preview.vision_models import ImageGenerationModel
+                    import vertexai
+
+                    credentials = None
+                    service_account_path = TaleMachineAgentService._service_account_path
+                    if service_account_path and os.path.exists(service_account_path):
+                        credentials = service_account.Credentials.from_service_account_file(
+                            service_account_path,
+                            scopes=['https://www.googleapis.com/auth/cloud-platform']
+                        )
+                    vertexai.init(project=os.getenv("VERTEX_PROJECT_ID"), location=os.getenv("VERTEX_PROJECT_LOCATION"), credentials=credentials)
+                    TaleMachineAgentService._image_generation_model = ImageGenerationModel.from_pretrained("imagen-3.0-generate-001")
+        return TaleMachineAgentService._image_generation_model
+
+    @staticmethod
+    def prewarm():
+        """Loads the lazily initialized clients ahead of the first request. Blocking, run it in a thread."""
+        try:
+            TaleMachineAgentService._get_image_generation_model()
+            print("[INFO] Image generation model prewarmed", file=sys.stderr)
+        except Exception as e:
+            # Not fatal, the first image job retries
+            print(f"[ERROR] Failed to prewarm the image generation model: {e}", file=sys.stderr)
+
+    # Blocking image model calls, run by the image job queue's thread pool
+    @staticmethod
+    def _render_image(description: str):
+        images = TaleMachineAgentService._get_image_generation_model().generate_images(
+            prompt=description,
+            number_of_images=1,
+            aspect_ratio="16:9",
+            safety_filter_level="block_some",
+            person_generation="allow_adult"
+        )
+        return images[0]
+
+    @staticmethod
+    def _save_image(img) -> str:
+        # save() is the SDK's public way to get at the bytes. Without the generation parameters it writes them
+        # unchanged, so identical images still get the same digest
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "image.png")
+            img.save(path, include_generation_parameters=False)
+            with open(path, "rb") as file:
+                data = file.read()
+        return TaleMachineAgentService._image_store.put(data)
     
+    @staticmethod
+    async def _stream_events(stream):
+        """
+        Translates the agent's stream into (event, data) tuples:
+        - ("token", text) for AI message content and for generate_image's direct answer
+        - ("tool_status", {"tool": name, "status": "started" | "done" | "error"})
+        - ("interrupt", {...}) when a tool waits for the user's approval
+        - ("image_job", {"id", "status", "story_id", "chapter_id"}) when generate_image queued a job
+        """
+        async for chunk in stream:
+            try:
+                if isinstance(chunk, tuple):
+                    stream_mode, values = chunk
+                    if stream_mode == "messages":
+                        if isinstance(values, tuple):
+                            message, metadata = values
+                            if isinstance(message, AIMessage):
+                                for tool_call_chunk in getattr(message, "tool_call_chunks", None) or []:
+                                    if tool_call_chunk.get("name"):
+                                        yield sse_stream.TOOL_STATUS, {"tool": tool_call_chunk["name"], "status": "started"}
+                                if message.content:
+                                    yield sse_stream.TOKEN, message.content
+                            elif isinstance(message, ToolMessage):
+                                status = "error" if message.status == "error" else "done"
+                                yield sse_stream.TOOL_STATUS, {"tool": message.name, "status": status}
+                                if message.name == "generate_image" and message.content:
+                                    yield sse_stream.TOKEN, message.content
+                    elif stream_mode == "custom":
+                        if isinstance(values, dict) and "image_job" in values:
+                            yield sse_stream.IMAGE_JOB, values["image_job"]
+                    elif stream_mode == "values":
+                        if "__interrupt__" in values:
+                            print("\nDetected interrupt in agent stream", file=sys.stderr)
+                            # Extract interrupt message
+                            interrupt_info = values.get("__interrupt__", "")
+                            if interrupt_info:
+                                interrupt_msg = interrupt_info[0].value
+                                try:
+                                    interrupt_data = json.loads(interrupt_msg)
+                                except (TypeError, ValueError):
+                                    interrupt_data = {"tool_name": "unknown", "message": str(interrupt_msg)}
+                                yield sse_stream.INTERRUPT, interrupt_data
+            except Exception as chunk_error:
+                print(f"Error processing chunk: {chunk_error}", file=sys.stderr)
+                import traceback
+                traceback.print_exc()
+                continue
+
     @staticmethod
     async def run(messages: list, story_name: str, thread_id: str, story_id: int, db_instance,
                   story_length: str | None = None, chapter_length: str | None = None, 
@@ -185,68 +362,43 @@ class TaleMachineAgentService:
                   main_characters: str | None = None, plot_ideas: str | None = None):
         """Run the agent with a specific thread ID for checkpoint management."""
         try:
-            async with streamablehttp_client(TaleMachineAgentService._mcp_server_url) as connection:
-                if isinstance(connection, tuple) and len(connection) >= 2:
-                    read_stream, write_stream = connection[0], connection[1]
-                else:
-                    read_stream = connection.read
-                    write_stream = connection.write
-
-                async with ClientSession(read_stream, write_stream) as session:
-                    await session.initialize()
-                    tools = await load_mcp_tools(session, tool_interceptors=[TaleMachineAgentService.ask_approval_interceptor])
-                    tools.append(TaleMachineAgentService.create_generate_image_tool(story_id, db_instance))
-
-                    chapter_summaries = await db_instance.get_all_summaries_by_story_id(story_id)
-                    
-                    agent = TaleMachineAgentService._initialize_agent(
-                        tools=tools,
-                        prompt=TaleMachineAgentService._prompt.format(story_name=story_name, 
-                                                                      story_id=story_id,
-                                                                      story_length=story_length,
-                                                                      chapter_length=chapter_length,
-                                                                      genre=genre,
-                                                                      additional_notes=additional_notes,
-                                                                      main_characters=main_characters,
-                                                                      plot_ideas=plot_ideas,
-                                                                      chapter_summaries=chapter_summaries)
-                    )
-
-                    # Create thread config with thread_id
-                    config = {
-                        "configurable": {
-                            "thread_id": thread_id
-                        }
+            async with TaleMachineAgentService._mcp_session_pool.acquire() as pooled_session:
+                agent = await TaleMachineAgentService._get_agent(pooled_session)
+
+                chapter_summaries = await db_instance.get_chapter_summary_block(
+                    story_id, TaleMachineAgentService._context_builder.build
+                )
+                
+                context = StoryContext(
+                    story_id=story_id,
+                    db_instance=db_instance,
+                    system_prompt=TaleMachineAgentService._prompt.format(story_name=story_name, 
+                                                                         story_id=story_id,
+                                                                         story_length=story_length,
+                                                                         chapter_length=chapter_length,
+                                                                         genre=genre,
+                                                                         additional_notes=additional_notes,
+                                                                         main_characters=main_characters,
+                                                                         plot_ideas=plot_ideas,
+                                                                         chapter_summaries=chapter_summaries)
+                )
+
+                # Create thread config with thread_id
+                config = {
+                    "configurable": {
+                        "thread_id": thread_id
                     }
+                }
 
-                    stream = agent.astream(
-                        input={"messages": messages},
-                        config=config,
-                        stream_mode=["messages", "values"],
-                    )
-                    
-                    async for chunk in stream:
-                        try:
-                            if isinstance(chunk, tuple):
-                                stream_mode, values = chunk
-                                if stream_mode == "messages":
-                                    if isinstance(values, tuple):
-                                        message, metadata = values
-                                        if isinstance(message, AIMessage) and message.content:
-                                            yield message.content
-                                elif stream_mode == "values":
-                                    if "__interrupt__" in values:
-                                        print("\nDetected interrupt in agent stream", file=sys.stderr)
-                                        # Extract interrupt message
-                                        interrupt_info = values.get("__interrupt__", "")
-                                        if interrupt_info:
-                                            interrupt_msg = interrupt_info[0].value if interrupt_info else "Approval required"
-                                            yield f"__interrupt__:{interrupt_msg}"
-                        except Exception as chunk_error:
-                            print(f"Error processing chunk: {chunk_error}", file=sys.stderr)
-                            import traceback
-                            traceback.print_exc()
-                            continue
+                stream = agent.astream(
+                    input={"messages": messages},
+                    config=config,
+                    context=context,
+                    stream_mode=["messages", "values", "custom"],
+                )
+                
+                async for event in TaleMachineAgentService._stream_events(stream):
+                    yield event
 
         except Exception as e:
             print(f"Error in TaleMachineAgentService run: {e}", file=sys.stderr)
@@ -262,73 +414,52 @@ class TaleMachineAgentService:
                                      chapter_id: int | None = None) :
         """Resume agent execution after an interrupt with approval/rejection."""
         try:
-            async with streamablehttp_client(TaleMachineAgentService._mcp_server_url) as connection:
-                if isinstance(connection, tuple) and len(connection) >= 2:
-                    read_stream, write_stream = connection[0], connection[1]
-                else:
-                    read_stream = connection.read
-                    write_stream = connection.write
-
-                async with ClientSession(read_stream, write_stream) as session:
-                    await session.initialize()
-                    tools = await load_mcp_tools(session, tool_interceptors=[TaleMachineAgentService.ask_approval_interceptor])
-                    tools.append(TaleMachineAgentService.create_generate_image_tool(story_id, db_instance))
-
-                    chapter_summaries = await db_instance.get_all_summaries_by_story_id(story_id)
-
-                    agent = TaleMachineAgentService._initialize_agent(
-                        tools=tools,
-                        prompt=TaleMachineAgentService._prompt.format(story_name=story_name, 
-                                                                      story_id=story_id,
-                                                                      story_length=story_length,
-                                                                      chapter_length=chapter_length,
-                                                                      genre=genre,
-                                                                      additional_notes=additional_notes,
-                                                                      main_characters=main_characters,
-                                                                      plot_ideas=plot_ideas,
-                                                                      chapter_summaries=chapter_summaries)
-                    )
-
-                    config = {
-                        "configurable": {
-                            "thread_id": thread_id
-                        }
+            async with TaleMachineAgentService._mcp_session_pool.acquire() as pooled_session:
+                agent = await TaleMachineAgentService._get_agent(pooled_session)
+
+                chapter_summaries = await db_instance.get_chapter_summary_block(
+                    story_id, TaleMachineAgentService._context_builder.build
+                )
+
+                context = StoryContext(
+                    story_id=story_id,
+                    db_instance=db_instance,
+                    system_prompt=TaleMachineAgentService._prompt.format(story_name=story_name, 
+                                                                         story_id=story_id,
+                                                                         story_length=story_length,
+                                                                         chapter_length=chapter_length,
+                                                                         genre=genre,
+                                                                         additional_notes=additional_notes,
+                                                                         main_characters=main_characters,
+                                                                         plot_ideas=plot_ideas,
+                                                                         chapter_summaries=chapter_summaries)
+                )
+
+                config = {
+                    "configurable": {
+                        "thread_id": thread_id
                     }
+                }
 
-                    if approved:
-                        if chapter_id is not None:
-                            command = Command(resume=chapter_id)
-                        # Resume with None to continue execution
-                        else:
-                            command = Command(resume=True)
+                if approved:
+                    if chapter_id is not None:
+                        command = Command(resume=chapter_id)
+                    # Resume with None to continue execution
                     else:
-                        # Send a Command to cancel the current operation
-                        command = Command(resume="Action cancelled by user")
-                    
-                    stream = agent.astream(
-                        input=command,
-                        config=config,
-                        stream_mode=["messages", "values"]
-                    )
-                    
-                    async for chunk in stream:
-                        try:
-                            # print(f"\nResume chunk: {chunk}", file=sys.stderr)
-                            if isinstance(chunk, tuple):
-                                stream_mode, values = chunk
-                                if stream_mode == "messages":
-                                    if isinstance(values, tuple):
-                                        message, metadata = values
-                                        if isinstance(message, AIMessage) and message.content:
-                                            yield message.content
-                                        elif isinstance(message, ToolMessage):
-                                            if message.name == "generate_image" and message.content:
-                                                yield message.content
-                        except Exception as chunk_error:
-                            print(f"Error processing chunk: {chunk_error}", file=sys.stderr)
-                            import traceback
-                            traceback.print_exc()
-                            continue
+                        command = Command(resume=True)
+                else:
+                    # Send a Command to cancel the current operation
+                    command = Command(resume="Action cancelled by user")
+                
+                stream = agent.astream(
+                    input=command,
+                    config=config,
+                    context=context,
+                    stream_mode=["messages", "values", "custom"]
+                )
+                
+                async for event in TaleMachineAgentService._stream_events(stream):
+                    yield event
 
         except Exception as e:
             print(f"Error in resume_after_interrupt: {e}", file=sys.stderr)
@@ -344,15 +475,17 @@ def test_interrupt():
     thread_id = "test_thread_123"
     session_name = "Knights and Dragons"
     async def run_agent():
-        async for response in TaleMachineAgentService.run(messages, session_name, thread_id, story_id=14577):
-            print(response, end="", flush=True)
-        if response.startswith("__interrupt__:"):
-            interrupt_msg = response[len("__interrupt__:"):].strip()
-            print(f"\nInterrupt received: {interrupt_msg}")
+        event, data = None, None
+        async for event, data in TaleMachineAgentService.run(messages, session_name, thread_id, story_id=14577):
+            if event == sse_stream.TOKEN:
+                print(data, end="", flush=True)
+        if event == sse_stream.INTERRUPT:
+            print(f"\nInterrupt received: {data}")
             # Simulate user approval
             user_approval = True  # Change to False to simulate rejection
-            async for resume_response in TaleMachineAgentService.resume_after_interrupt(thread_id, user_approval, session_name, story_id=14577):
-                print(resume_response, end="", flush=True)
+            async for event, data in TaleMachineAgentService.resume_after_interrupt(thread_id, user_approval, session_name, story_id=14577):
+                if event == sse_stream.TOKEN:
+                    print(data, end="", flush=True)
     
     asyncio.run(run_agent())
 
@@ -362,6 +495,7 @@ def test_in_terminal():
         sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
         from models.postgres.Story import Story
         pg_database_service = PostgresService()
+        await pg_database_service.start()
 
         all_stories = await pg_database_service.get_all_stories()
         if all_stories:
@@ -387,17 +521,19 @@ def test_in_terminal():
                 break
             messages.append({"role": "user", "content": user_input})
             full_response = ""
-            async for response in TaleMachineAgentService.run(messages, story_name, thread_id, story_id):
-                full_response += response
-                print(response, end="", flush=True)
-            if response.startswith("__interrupt__:"):
-                interrupt_msg = response[len("__interrupt__:"):].strip()
-                print(f"\nInterrupt received: {interrupt_msg}")
+            event, data = None, None
+            async for event, data in TaleMachineAgentService.run(messages, story_name, thread_id, story_id):
+                if event == sse_stream.TOKEN:
+                    full_response += data
+                    print(data, end="", flush=True)
+            if event == sse_stream.INTERRUPT:
+                print(f"\nInterrupt received: {data}")
                 approval = input("Do you want to approve this action? (yes/no): ").strip().lower()
                 user_approval = approval == "yes"
-                async for resume_response in TaleMachineAgentService.resume_after_interrupt(thread_id, user_approval, story_name, story_id):
-                    print(resume_response, end="", flush=True)
-                    full_response += resume_response
+                async for event, data in TaleMachineAgentService.resume_after_interrupt(thread_id, user_approval, story_name, story_id):
+                    if event == sse_stream.TOKEN:
+                        print(data, end="", flush=True)
+                        full_response += data
             messages.append({"role": "assistant", "content": full_response})
     
     asyncio.run(run_terminal_agent())
@@ -0,0 +1,284 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from langgraph.checkpoint.memory import MemorySaver
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+CHECKPOINTER_BACKEND = os.getenv("CHECKPOINTER_BACKEND", "memory") # memory | postgres | sqlite
+CHECKPOINTER_MAX_THREADS = int(os.getenv("CHECKPOINTER_MAX_THREADS", "500"))
+CHECKPOINTER_THREAD_TTL_SECONDS = float(os.getenv("CHECKPOINTER_THREAD_TTL_SECONDS", str(24 * 60 * 60)))
+CHECKPOINTER_KEEP_PER_THREAD = int(os.getenv("CHECKPOINTER_KEEP_PER_THREAD", "5"))
+CHECKPOINTER_COMPACT_EVERY = int(os.getenv("CHECKPOINTER_COMPACT_EVERY", "20"))
+CHECKPOINTER_SQLITE_PATH = os.getenv("CHECKPOINTER_SQLITE_PATH", "checkpoints.sqlite")
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer that does not grow forever.\n
+    - Threads are evicted least-recently-used once there are more than `max_threads`,
+      and threads that have not been touched for `ttl_seconds` are dropped.
+    - After every checkpoint, only the latest `keep_per_thread` checkpoints of the thread are kept
+      (together with their pending writes and the channel blobs they still reference),
+      so a long conversation costs roughly the size of its latest state.
+    """
+    def __init__(self, max_threads: int = CHECKPOINTER_MAX_THREADS,
+                 ttl_seconds: float = CHECKPOINTER_THREAD_TTL_SECONDS,
+                 keep_per_thread: int = CHECKPOINTER_KEEP_PER_THREAD, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.keep_per_thread = max(1, keep_per_thread)
+        self._last_access: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.RLock()
+        self._evictions = 0
+        self._compacted_checkpoints = 0
+
+    def _touch(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._last_access[thread_id] = time.monotonic()
+            self._last_access.move_to_end(thread_id)
+
+    def _evict(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [thread_id for thread_id, last in self._last_access.items() if now - last > self.ttl_seconds]
+            overflow = max(0, len(self._last_access) - len(expired) - self.max_threads)
+            lru = [thread_id for thread_id in self._last_access if thread_id not in expired][:overflow]
+            for thread_id in expired + lru:
+                self._last_access.pop(thread_id, None)
+                self.delete_thread(thread_id)
+                self._evictions += 1
+
+    def _compact(self, thread_id: str, checkpoint_ns: str):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_per_thread:
+            return
+
+        # Checkpoint ids are time-ordered, so the newest ones sort last
+        checkpoint_ids = sorted(checkpoints)
+        stale_ids = checkpoint_ids[:-self.keep_per_thread]
+        for checkpoint_id in stale_ids:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        self._compacted_checkpoints += len(stale_ids)
+
+        referenced = defaultdict(set)
+        for saved_checkpoint, _, _ in checkpoints.values():
+            for channel, version in self.serde.loads_typed(saved_checkpoint)["channel_versions"].items():
+                referenced[channel].add(version)
+        for key in [key for key in self.blobs if key[0] == thread_id and key[1] == checkpoint_ns]:
+            _, _, channel, version = key
+            if version not in referenced[channel]:
+                del self.blobs[key]
+
+    def get_tuple(self, config):
+        self._touch(config)
+        return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            self._compact(config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", ""))
+        self._touch(config)
+        self._evict()
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+        self._touch(config)
+
+    def metrics(self) -> dict:
+        return {
+            "backend": "memory",
+            "threads": len(self._last_access),
+            "max_threads": self.max_threads,
+            "evictions": self._evictions,
+            "compacted_checkpoints": self._compacted_checkpoints,
+        }
+
+
+class CompactionSchedule:
+    """
+    Counts the checkpoints of each thread, so the durable savers compact a thread every `every` checkpoints.\n
+    Bounded like BoundedMemorySaver: a thread's count is dropped when it is compacted, and beyond `max_threads`
+    the least recently used counts are forgotten (that thread just starts counting again).
+    """
+    def __init__(self, every: int = CHECKPOINTER_COMPACT_EVERY, max_threads: int = CHECKPOINTER_MAX_THREADS):
+        self.every = max(1, every)
+        self.max_threads = max_threads
+        self._counts: OrderedDict[str, int] = OrderedDict()
+
+    def due(self, thread_id: str) -> bool:
+        """Counts a checkpoint of the thread, True when the thread should be compacted."""
+        count = self._counts.pop(thread_id, 0) + 1
+        if count >= self.every:
+            return True
+        self._counts[thread_id] = count
+        if len(self._counts) > self.max_threads:
+            self._counts.popitem(last=False)
+        return False
+
+
+class CheckpointerProvider:
+    """
+    Creates the configured checkpointer lazily, on the running event loop.\n
+    `CHECKPOINTER_BACKEND` selects the backend:
+    - `memory`: BoundedMemorySaver (default). Pending interrupts are lost on restart.
+    - `postgres`: durable, stored in the application's Postgres database (langgraph-checkpoint-postgres).
+    - `sqlite`: durable, stored in a local file (langgraph-checkpoint-sqlite).\n
+    The durable backends are compacted to the latest `CHECKPOINTER_KEEP_PER_THREAD` checkpoints
+    of a thread every `CHECKPOINTER_COMPACT_EVERY` checkpoints.
+    """
+    def __init__(self, backend: str = CHECKPOINTER_BACKEND):
+        self.backend = backend
+        self._checkpointer = None
+        self._resource = None # Connection pool/connection to close on shutdown
+        self._lock: asyncio.Lock | None = None
+
+    async def get(self):
+        if self._checkpointer is not None:
+            return self._checkpointer
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._checkpointer is None:
+                self._checkpointer = await self._create()
+                print(f"[INFO] Using '{self.backend}' checkpointer", file=sys.stderr)
+        return self._checkpointer
+
+    async def _create(self):
+        if self.backend == "memory":
+            return BoundedMemorySaver()
+        if self.backend == "postgres":
+            return await self._create_postgres()
+        if self.backend == "sqlite":
+            return await self._create_sqlite()
+        raise Exception(f"[ERROR] Unknown checkpointer backend '{self.backend}'. Use memory, postgres or sqlite.")
+
+    async def _create_postgres(self):
+        try:
+            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+            from psycopg.rows import dict_row
+            from psycopg_pool import AsyncConnectionPool
+        except ImportError as e:
+            raise Exception(f"[ERROR] The postgres checkpointer requires langgraph-checkpoint-postgres: {e}")
+        from postgres_database import DATABASE_URL
+
+        class CompactingPostgresSaver(AsyncPostgresSaver):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.compaction_schedule = CompactionSchedule()
+
+            async def aput(self, config, checkpoint, metadata, new_versions):
+                next_config = await super().aput(config, checkpoint, metadata, new_versions)
+                thread_id = config["configurable"]["thread_id"]
+                if self.compaction_schedule.due(thread_id):
+                    await self.acompact(thread_id, config["configurable"].get("checkpoint_ns", ""))
+                return next_config
+
+            async def acompact(self, thread_id: str, checkpoint_ns: str = ""):
+                """Drops all but the latest checkpoints of a thread, their writes, and unreferenced blobs."""
+                async with self._cursor() as cur:
+                    await cur.execute(
+                        """
+                        DELETE FROM checkpoints WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id NOT IN (
+                            SELECT checkpoint_id FROM checkpoints WHERE thread_id = %s AND checkpoint_ns = %s
+                            ORDER BY checkpoint_id DESC LIMIT %s)
+                        """,
+                        (thread_id, checkpoint_ns, thread_id, checkpoint_ns, CHECKPOINTER_KEEP_PER_THREAD),
+                    )
+                    await cur.execute(
+                        """
+                        DELETE FROM checkpoint_writes w WHERE w.thread_id = %s AND w.checkpoint_ns = %s AND NOT EXISTS (
+                            SELECT 1 FROM checkpoints c WHERE c.thread_id = w.thread_id
+                            AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id)
+                        """,
+                        (thread_id, checkpoint_ns),
+                    )
+                    await cur.execute(
+                        """
+                        DELETE FROM checkpoint_blobs b WHERE b.thread_id = %s AND b.checkpoint_ns = %s AND NOT EXISTS (
+                            SELECT 1 FROM checkpoints c WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+                            AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version)
+                        """,
+                        (thread_id, checkpoint_ns),
+                    )
+
+        conninfo = DATABASE_URL.replace("postgresql+psycopg://", "postgresql://")
+        pool = AsyncConnectionPool(
+            conninfo,
+            max_size=int(os.getenv("CHECKPOINTER_POOL_SIZE", "5")),
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            open=False,
+        )
+        await pool.open()
+        checkpointer = CompactingPostgresSaver(pool)
+        await checkpointer.setup()
+        self._resource = pool
+        return checkpointer
+
+    async def _create_sqlite(self):
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            raise Exception(f"[ERROR] The sqlite checkpointer requires langgraph-checkpoint-sqlite: {e}")
+
+        class CompactingSqliteSaver(AsyncSqliteSaver):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.compaction_schedule = CompactionSchedule()
+
+            async def aput(self, config, checkpoint, metadata, new_versions):
+                next_config = await super().aput(config, checkpoint, metadata, new_versions)
+                thread_id = config["configurable"]["thread_id"]
+                if self.compaction_schedule.due(thread_id):
+                    await self.acompact(thread_id, config["configurable"].get("checkpoint_ns", ""))
+                return next_config
+
+            async def acompact(self, thread_id: str, checkpoint_ns: str = ""):
+                """Drops all but the latest checkpoints of a thread and their writes."""
+                async with self.lock:
+                    await self.conn.execute(
+                        """
+                        DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                            SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                            ORDER BY checkpoint_id DESC LIMIT ?)
+                        """,
+                        (thread_id, checkpoint_ns, thread_id, checkpoint_ns, CHECKPOINTER_KEEP_PER_THREAD),
+                    )
+                    await self.conn.execute(
+                        """
+                        DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                            SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)
+                        """,
+                        (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+                    )
+                    await self.conn.commit()
+
+        conn = await aiosqlite.connect(CHECKPOINTER_SQLITE_PATH)
+        checkpointer = CompactingSqliteSaver(conn)
+        await checkpointer.setup()
+        self._resource = conn
+        return checkpointer
+
+    def metrics(self) -> dict:
+        if self._checkpointer is None:
+            return {"backend": self.backend, "initialized": False}
+        if isinstance(self._checkpointer, BoundedMemorySaver):
+            return self._checkpointer.metrics()
+        return {"backend": self.backend, "initialized": True}
+
+    async def close(self):
+        if self._resource is not None:
+            await self._resource.close()
+        self._resource = None
+        self._checkpointer = None
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+from langchain_core.documents import Document
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from postgres_database import SessionLocal
+from models.postgres.GraphExtraction import GraphExtractionBase
+from repositories.postgres.GraphExtractionRepository import GraphExtractionRepository
+
+# Bump when the serialized format or the extraction prompt changes, so old entries are not reused
+EXTRACTION_CACHE_VERSION = 1
+
+
+def _node_to_dict(node: Node) -> dict:
+    return {"id": node.id, "type": node.type, "properties": node.properties}
+
+
+def _node_from_dict(data: dict) -> Node:
+    return Node(id=data["id"], type=data["type"], properties=data.get("properties") or {})
+
+
+def serialize_graph_documents(graph_documents: list[GraphDocument]) -> str:
+    return json.dumps([
+        {
+            "nodes": [_node_to_dict(node) for node in doc.nodes],
+            "relationships": [
+                {
+                    "source": _node_to_dict(rel.source),
+                    "target": _node_to_dict(rel.target),
+                    "type": rel.type,
+                    "properties": rel.properties,
+                }
+                for rel in doc.relationships
+            ],
+            "source": {"page_content": doc.source.page_content, "metadata": doc.source.metadata} if doc.source else None,
+        }
+        for doc in graph_documents
+    ])
+
+
+def deserialize_graph_documents(payload: str) -> list[GraphDocument]:
+    graph_documents = []
+    for doc in json.loads(payload):
+        source = doc.get("source")
+        graph_documents.append(GraphDocument(
+            nodes=[_node_from_dict(node) for node in doc["nodes"]],
+            relationships=[
+                Relationship(
+                    source=_node_from_dict(rel["source"]),
+                    target=_node_from_dict(rel["target"]),
+                    type=rel["type"],
+                    properties=rel.get("properties") or {},
+                )
+                for rel in doc["relationships"]
+            ],
+            source=Document(page_content=source["page_content"], metadata=source.get("metadata") or {}) if source else None,
+        ))
+    return graph_documents
+
+
+class GraphExtractionCache:
+    """
+    Persistent cache of LLMGraphTransformer results, stored in Postgres (`graph_extractions`).\n
+    The extraction LLM runs at temperature 0, so the same chapter text under the same extraction schema
+    yields the same graph. The key is a digest of both, so changing the allowed nodes, relationships or
+    properties (or the model) misses the cache instead of returning a graph extracted under other rules.\n
+    Uses its own short-lived sessions, so a cache lookup never touches the caller's transaction.
+    Cache errors are logged and treated as misses: the cache can only save a Gemini call, never fail an extraction.
+    """
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def cache_key(content: str, schema: dict) -> str:
+        payload = json.dumps({"version": EXTRACTION_CACHE_VERSION, "schema": schema, "content": content}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, cache_key: str) -> list[GraphDocument] | None:
+        db = self._session_factory()
+        try:
+            cached = await GraphExtractionRepository.get_by_cache_key(db, cache_key)
+            if cached is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return deserialize_graph_documents(cached.graph_documents)
+        except Exception as e:
+            print(f"[ERROR] Failed to read the graph extraction cache: {e}", file=sys.stderr)
+            self._misses += 1
+            return None
+        finally:
+            await db.close()
+
+    async def set(self, cache_key: str, graph_documents: list[GraphDocument]):
+        db = self._session_factory()
+        try:
+            await GraphExtractionRepository.insert(db, GraphExtractionBase(
+                cache_key=cache_key,
+                graph_documents=serialize_graph_documents(graph_documents),
+                created_at=int(time.time()),
+            ))
+        except Exception as e:
+            print(f"[ERROR] Failed to write the graph extraction cache: {e}", file=sys.stderr)
+        finally:
+            await db.close()
+
+    def metrics(self) -> dict:
+        return {"hits": self._hits, "misses": self._misses}
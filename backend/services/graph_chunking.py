@@ -0,0 +1,139 @@
+import os
+import re
+
+from langchain_core.documents import Document
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+CHUNK_WORDS = int(os.getenv("GRAPH_EXTRACTION_CHUNK_WORDS", "800"))
+CHUNK_OVERLAP_WORDS = int(os.getenv("GRAPH_EXTRACTION_CHUNK_OVERLAP_WORDS", "100"))
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?…\"”’])\s+")
+
+
+def _word_count(text: str) -> int:
+    return len(text.split())
+
+
+def _split_sentences(text: str, max_words: int) -> list[str]:
+    """Sentences of the text. Sentences longer than `max_words` (e.g. text without punctuation) are cut every `max_words` words."""
+    sentences = []
+    for sentence in _SENTENCE_END.split(text):
+        words = sentence.split()
+        if len(words) <= max_words:
+            sentences.append(sentence)
+        else:
+            sentences.extend(" ".join(words[start:start + max_words]) for start in range(0, len(words), max_words))
+    return sentences
+
+
+def _split_paragraphs(text: str, max_words: int) -> list[str]:
+    """Paragraphs of the text. Paragraphs longer than `max_words` are split at sentence ends, or by word count."""
+    paragraphs = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if _word_count(paragraph) <= max_words:
+            paragraphs.append(paragraph)
+            continue
+        # Chapters are often saved as one long paragraph, pack its sentences into paragraph-sized pieces
+        piece: list[str] = []
+        for sentence in _split_sentences(paragraph, max_words):
+            if piece and _word_count(" ".join(piece + [sentence])) > max_words:
+                paragraphs.append(" ".join(piece))
+                piece = []
+            piece.append(sentence)
+        if piece:
+            paragraphs.append(" ".join(piece))
+    return paragraphs
+
+
+def split_into_chunks(text: str, max_words: int = CHUNK_WORDS, overlap_words: int = CHUNK_OVERLAP_WORDS) -> list[str]:
+    """
+    Splits chapter text into chunks of whole paragraphs, of at most about `max_words` words.\n
+    Each chunk starts with the trailing paragraphs (or sentences) of the previous one, up to `overlap_words` words, so
+    entities and relationships that span a chunk boundary are seen together at least once.
+    Text that fits in one chunk is returned as is.
+    """
+    if _word_count(text) <= max_words:
+        return [text]
+
+    # Leave room for the overlap carried into every chunk after the first
+    paragraphs = _split_paragraphs(text, max(1, max_words - overlap_words))
+    chunks: list[str] = []
+    current: list[str] = []
+    current_words = 0
+    new_in_current = 0 # Paragraphs not carried over from the previous chunk
+    for paragraph in paragraphs:
+        words = _word_count(paragraph)
+        if new_in_current and current_words + words > max_words:
+            chunks.append("\n\n".join(current))
+            overlap: list[str] = []
+            overlap_count = 0
+            for previous in reversed(current):
+                if overlap_count + _word_count(previous) > overlap_words:
+                    # Carry the paragraph's trailing sentences that still fit
+                    tail: list[str] = []
+                    for sentence in reversed(_split_sentences(previous, overlap_words)):
+                        overlap_count += _word_count(sentence)
+                        if overlap_count > overlap_words:
+                            break
+                        tail.insert(0, sentence)
+                    if tail:
+                        overlap.insert(0, " ".join(tail))
+                    break
+                overlap_count += _word_count(previous)
+                overlap.insert(0, previous)
+            current, current_words, new_in_current = overlap, sum(_word_count(p) for p in overlap), 0
+        current.append(paragraph)
+        current_words += words
+        new_in_current += 1
+    if new_in_current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _merge_properties(merged: dict, properties: dict):
+    for key, value in (properties or {}).items():
+        if value in (None, "", []):
+            continue
+        existing = merged.get(key)
+        if existing in (None, "", []):
+            merged[key] = value
+        elif isinstance(existing, str) and isinstance(value, str) and len(value) > len(existing):
+            # E.g. descriptions: a later chunk often knows more about an entity
+            merged[key] = value
+
+
+def merge_graph_documents(graph_documents: list[GraphDocument], source_text: str) -> GraphDocument:
+    """
+    Merges the graph documents extracted from a chapter's chunks into one document.\n
+    Nodes are deduplicated by (id, type) and relationships by (source, type, target), as that is what
+    Neo4j MERGEs on. Properties are combined, keeping the longer text when chunks disagree.
+    """
+    nodes: dict[tuple, Node] = {}
+    relationships: dict[tuple, Relationship] = {}
+
+    def merged_node(node: Node) -> Node:
+        key = (node.id, node.type)
+        if key not in nodes:
+            nodes[key] = Node(id=node.id, type=node.type, properties={})
+        _merge_properties(nodes[key].properties, node.properties)
+        return nodes[key]
+
+    for doc in graph_documents:
+        for node in doc.nodes:
+            merged_node(node)
+        for rel in doc.relationships:
+            source, target = merged_node(rel.source), merged_node(rel.target)
+            key = (source.id, source.type, rel.type, target.id, target.type)
+            if key not in relationships:
+                relationships[key] = Relationship(source=source, target=target, type=rel.type, properties={})
+            _merge_properties(relationships[key].properties, rel.properties)
+
+    return GraphDocument(
+        nodes=list(nodes.values()),
+        relationships=list(relationships.values()),
+        source=Document(page_content=source_text),
+    )
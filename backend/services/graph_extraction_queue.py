@@ -0,0 +1,117 @@
+import asyncio
+import contextvars
+import os
+import sys
+import time
+from typing import Awaitable, Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from postgres_database import SessionLocal
+from models.postgres.GraphExtractionJob import GraphExtractionJobBase
+from repositories.postgres.GraphExtractionJobRepository import GraphExtractionJobRepository
+
+
+class GraphExtractionWorkerPool:
+    """
+    Workers draining the `graph_extraction_jobs` outbox.\n
+    Saving a chapter only commits the chapter and its job. The workers then extract its nodes and relationships
+    and write them to Neo4j and the chapter-node mappings, so the save (and the chat) doesn't wait on the LLM.\n
+    - Jobs are claimed with FOR UPDATE SKIP LOCKED, so the backend and the MCP server can both run a pool.
+    - A failed job is retried with exponential backoff, up to `max_attempts`, then marked failed.
+    - A job claimed by a worker that died is picked up again after `lease_seconds`.
+    - `process` must be idempotent: a job can run more than once (a retry after a partial write, an expired lease).
+    - A worker only records the outcome while it still holds the claim. After its lease expired, or the job was
+      requeued (reset_story_index), the outcome is dropped and the job's current state stays as it is.
+    """
+    def __init__(self, process: Callable[[object, int], Awaitable[None]], session_factory=SessionLocal,
+                 concurrency: int | None = None, max_attempts: int | None = None,
+                 poll_interval: float | None = None, lease_seconds: int | None = None,
+                 retry_base_seconds: float | None = None, story_ids: list[int] | None = None):
+        self._process = process # (db session, chapter id) -> None
+        self._session_factory = session_factory
+        self.concurrency = concurrency or int(os.getenv("GRAPH_EXTRACTION_CONCURRENCY", "2"))
+        self.max_attempts = max_attempts or int(os.getenv("GRAPH_EXTRACTION_MAX_ATTEMPTS", "5"))
+        self.poll_interval = poll_interval or float(os.getenv("GRAPH_EXTRACTION_POLL_SECONDS", "5"))
+        self.lease_seconds = lease_seconds or int(os.getenv("GRAPH_EXTRACTION_LEASE_SECONDS", "600"))
+        self.retry_base_seconds = retry_base_seconds or float(os.getenv("GRAPH_EXTRACTION_RETRY_BASE_SECONDS", "10"))
+        self.story_ids = story_ids # Only claim the jobs of these stories (maintenance.py reindex), None for all
+
+        self._workers: list[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+        self._processed = 0
+        self._failed_attempts = 0
+
+    def start(self):
+        # Started on first use, so the pool can be created outside of a running event loop
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        # A fresh context, so the workers don't inherit the unit of work of the request that started them
+        self._workers = [asyncio.create_task(self._worker(), context=contextvars.Context()) for _ in range(self.concurrency)]
+
+    def notify(self):
+        """Wakes the workers up after a job was committed, instead of waiting for the next poll."""
+        self.start()
+        self._wakeup.set()
+
+    async def _wait(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self):
+        while True:
+            db = self._session_factory()
+            try:
+                job = await GraphExtractionJobRepository.claim_next(db, self.lease_seconds, self.story_ids)
+                if job is None:
+                    await self._wait()
+                    continue
+                await self._run(db, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # E.g. the database is unreachable, back off instead of spinning
+                print(f"[ERROR] Graph extraction worker error: {e}", file=sys.stderr)
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                await db.close()
+
+    async def _run(self, db, job: GraphExtractionJobBase):
+        try:
+            await self._process(db, job.chapter_id)
+        except Exception as e:
+            await db.rollback()
+            self._failed_attempts += 1
+            retry_at = None
+            if job.attempts < self.max_attempts:
+                retry_at = int(time.time() + self.retry_base_seconds * 2 ** (job.attempts - 1))
+            print(f"[ERROR] Graph extraction of chapter {job.chapter_id} failed (attempt {job.attempts}/{self.max_attempts}): {e}", file=sys.stderr)
+            if not await GraphExtractionJobRepository.mark_failed(db, job, str(e), retry_at):
+                self._lost_claim(job)
+            return
+        if not await GraphExtractionJobRepository.mark_done(db, job):
+            self._lost_claim(job)
+            return
+        self._processed += 1
+
+    @staticmethod
+    def _lost_claim(job: GraphExtractionJobBase):
+        print(f"[INFO] Graph extraction job of chapter {job.chapter_id} was requeued or claimed again in the meantime, "
+              f"keeping its current state", file=sys.stderr)
+
+    def metrics(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": bool(self._workers),
+            "processed": self._processed,
+            "failed_attempts": self._failed_attempts,
+        }
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
+
+def graph_etag(database_name: str, version: int, variant: str) -> str:
+    """The ETag of a graph response: which graph, at which version, rendered how (endpoint and parameters)."""
+    digest = hashlib.sha256(f"{database_name}\x00{version}\x00{variant}".encode()).hexdigest()[:32]
+    return f'"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag (weak comparison, as RFC 9110 requires for If-None-Match)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class GraphResponseCache:
+    """
+    LRU cache of serialized graph responses (JSON bytes), keyed by ETag.\n
+    The ETag includes the story's graph version, which is bumped in Postgres whenever the graph changes
+    (see GraphVersionRepository), so entries are never invalidated: a new version simply misses,
+    and the old entries age out.
+    """
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._bodies: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+
+    def get(self, etag: str) -> bytes | None:
+        with self._lock:
+            body = self._bodies.get(etag)
+            if body is None:
+                self._misses += 1
+                return None
+            self._bodies.move_to_end(etag)
+            self._hits += 1
+            return body
+
+    def set(self, etag: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._bodies.pop(etag, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._bodies[etag] = body
+            self._size += len(body)
+            while len(self._bodies) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._bodies.popitem(last=False)
+                self._size -= len(evicted)
+
+    def record_not_modified(self):
+        with self._lock:
+            self._not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+            self._size = 0
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self._bodies),
+            "bytes": self._size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "not_modified": self._not_modified,
+        }
@@ -0,0 +1,138 @@
+import asyncio
+import contextvars
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.postgres.Image import ImageBase
+
+# Job statuses, in the order a job goes through them
+QUEUED = "queued"
+RENDERING = "rendering"
+SAVING = "saving"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class ImageJob:
+    description: str
+    story_id: int
+    chapter_id: int | None = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    image_path: str | None = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def set_status(self, status: str):
+        self.status = status
+        self.updated_at = time.time()
+
+    def model_dump(self) -> dict:
+        return asdict(self)
+
+
+class ImageJobQueue:
+    """
+    Bounded queue of image generation jobs.\n
+    The image model's SDK is synchronous, so rendering, writing the file and generating its
+    thumbnails run in a thread pool with `concurrency` workers. The event loop only awaits the result, so other streams keep flowing.
+    At most `max_queued` jobs can wait; submitting beyond that raises instead of piling up.
+    """
+    def __init__(self, generate: Callable, save: Callable, derive: Callable | None = None,
+                 concurrency: int | None = None, max_queued: int | None = None, max_finished_jobs: int = 500):
+        self._generate = generate # (description) -> image
+        self._save = save # (image) -> image path
+        self._derive = derive # (image path) -> derivative paths, e.g. thumbnails
+        self.concurrency = concurrency or int(os.getenv("IMAGE_GENERATION_CONCURRENCY", "2"))
+        self.max_queued = max_queued or int(os.getenv("IMAGE_GENERATION_QUEUE_SIZE", "20"))
+        self.max_finished_jobs = max_finished_jobs
+
+        self._jobs: OrderedDict[str, ImageJob] = OrderedDict()
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _start(self):
+        # Started on first use, so the queue can be created outside of a running event loop
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="image-generation")
+        # A fresh context, so the workers don't inherit the unit of work of the request that started them
+        self._workers = [asyncio.create_task(self._worker(), context=contextvars.Context()) for _ in range(self.concurrency)]
+
+    async def submit(self, description: str, story_id: int, chapter_id: int | None, db_instance) -> ImageJob:
+        """Queues a job and returns it immediately, with status `queued`."""
+        self._start()
+        job = ImageJob(description=description, story_id=story_id, chapter_id=chapter_id)
+        try:
+            self._queue.put_nowait((job, db_instance))
+        except asyncio.QueueFull:
+            raise Exception(f"[ERROR] The image queue is full ({self.max_queued} jobs waiting). Try again later.")
+        self._jobs[job.id] = job
+        self._forget_finished_jobs()
+        return job
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, db_instance = await self._queue.get()
+            try:
+                job.set_status(RENDERING)
+                image = await loop.run_in_executor(self._executor, self._generate, job.description)
+                job.set_status(SAVING)
+                job.image_path = await loop.run_in_executor(self._executor, self._save, image)
+                if self._derive is not None:
+                    try:
+                        await loop.run_in_executor(self._executor, self._derive, job.image_path)
+                    except Exception as e:
+                        # The gallery falls back to the original, don't lose the image over a thumbnail
+                        print(f"[ERROR] Failed to generate derivatives for {job.image_path}: {e}", file=sys.stderr)
+                await db_instance.insert_image(
+                    ImageBase(image_path=job.image_path, story_id=job.story_id, chapter_id=job.chapter_id)
+                )
+                job.set_status(DONE)
+            except Exception as e:
+                print(f"[ERROR] Image job {job.id} failed: {e}", file=sys.stderr)
+                job.error = str(e)
+                job.set_status(FAILED)
+            finally:
+                self._queue.task_done()
+
+    def _forget_finished_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> ImageJob | None:
+        return self._jobs.get(job_id)
+
+    def get_by_story_id(self, story_id: int) -> list[ImageJob]:
+        return [job for job in self._jobs.values() if job.story_id == story_id]
+
+    def metrics(self) -> dict:
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "concurrency": self.concurrency,
+            "max_queued": self.max_queued,
+            **{status: statuses.count(status) for status in (QUEUED, RENDERING, SAVING, DONE, FAILED)},
+        }
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._queue = None
+        self._executor = None
@@ -0,0 +1,110 @@
+import hashlib
+import io
+import os
+import re
+import tempfile
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+
+
+IMAGE_DIR = "generated_images"
+
+# Widths of the WebP derivatives generated next to every original
+THUMBNAIL_WIDTH = int(os.getenv("IMAGE_THUMBNAIL_WIDTH", "320"))
+MEDIUM_WIDTH = int(os.getenv("IMAGE_MEDIUM_WIDTH", "960"))
+
+# Content-addressed file names are the hex SHA-256 of the original's bytes, derivatives add their width
+_DIGEST_NAME = re.compile(r"^[0-9a-f]{64}(_w\d+)?$")
+
+
+class ContentAddressedImageStore:
+    """
+    Stores image files under the SHA-256 digest of their bytes, e.g. generated_images/<digest>.png.\n
+    The same bytes always map to the same path, across restarts and processes, so identical
+    outputs are stored once and a path never changes content.\n
+    Downscaled WebP derivatives live next to the original as <digest>_w<width>.webp.
+    """
+    def __init__(self, directory: str = IMAGE_DIR):
+        self.directory = directory
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def path_for(self, digest: str, extension: str = "png") -> str:
+        return f"{self.directory}/{digest}.{extension}"
+
+    def derivative_path(self, image_path: str, width: int) -> str | None:
+        """Path of an original's derivative, or None for images that are not content-addressed."""
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        if not _DIGEST_NAME.match(stem) or "_w" in stem:
+            return None
+        return f"{self.directory}/{stem}_w{width}.webp"
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first, so a reader never sees a half-written image
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put(self, data: bytes, extension: str = "png") -> str:
+        """Writes the bytes if they are not stored yet, and returns their path."""
+        path = self.path_for(self.digest(data), extension)
+        if not os.path.exists(path):
+            self._write_atomic(path, data)
+        return path
+
+    def put_derivatives(self, image_path: str, widths: tuple[int, ...] = (THUMBNAIL_WIDTH, MEDIUM_WIDTH)) -> dict[int, str]:
+        """
+        Generates the WebP derivatives of a stored original that don't exist yet.
+        Returns {width: path}. This is CPU-bound, run it off the event loop.
+        """
+        from PIL import Image
+
+        paths = {}
+        with Image.open(image_path) as original:
+            original.load()
+            for width in widths:
+                path = self.derivative_path(image_path, width)
+                if path is None:
+                    continue
+                paths[width] = path
+                if os.path.exists(path):
+                    continue
+                derivative = original.copy()
+                # Only ever downscale, and keep the aspect ratio
+                derivative.thumbnail((width, width * original.height // max(1, original.width)), Image.LANCZOS)
+                buffer = io.BytesIO()
+                derivative.save(buffer, format="WEBP", quality=80, method=4)
+                self._write_atomic(path, buffer.getvalue())
+        return paths
+
+
+class ImmutableImageFiles(StaticFiles):
+    """
+    Static files for the image directory.\n
+    Content-addressed files never change, so they get their digest as a strong ETag and are cached
+    by browsers forever. Any other (legacy) file keeps Starlette's default validators.
+    """
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+
+        stem = os.path.splitext(os.path.basename(full_path))[0]
+        if _DIGEST_NAME.match(stem):
+            response.headers["etag"] = f'"{stem}"'
+            response.headers["cache-control"] = "public, max-age=31536000, immutable"
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
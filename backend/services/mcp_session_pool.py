@@ -0,0 +1,237 @@
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+
+class PooledMcpSession:
+    """
+    An initialized MCP ClientSession together with the tools loaded from it.\n
+    The transport is owned by a background task, because the streamable HTTP client
+    has to be entered and exited by the same task. Setting the closer event shuts it down.\n
+    `key` is unique per connection, so anything built from `tools` can be cached against it.
+    The session is shared by concurrent chat turns, `streams` counts them.
+    """
+    def __init__(self, key: int, session: ClientSession, tools: list, closer: asyncio.Event, owner_task: asyncio.Task):
+        self.key = key
+        self.session = session
+        self.tools = tools
+        self.last_checked = time.monotonic()
+        self.streams = 0 # Chat turns currently using the session
+        self.check_lock = asyncio.Lock() # One health check at a time, the turns sharing the session wait for it
+        self._closer = closer
+        self._owner_task = owner_task
+
+    @property
+    def is_alive(self) -> bool:
+        return not self._owner_task.done()
+
+    async def close(self):
+        self._closer.set()
+        try:
+            await self._owner_task
+        except BaseException as e:
+            print(f"[DEBUG] MCP session closed with error: {e}", file=sys.stderr)
+
+
+class McpSessionPool:
+    """
+    A pool of long-lived, initialized MCP client sessions, shared by concurrent chat turns.\n
+    A ClientSession multiplexes concurrent requests, so a turn doesn't hold a session of its own: it uses
+    the least loaded one. Another session is only connected when every session already serves
+    `streams_per_session` turns, up to `max_size` sessions; beyond that, turns share the least loaded one,
+    so there is no cap on concurrent turns and nothing to wait for.\n
+    Sessions are health-checked with a ping when they haven't been checked for `health_check_interval` seconds,
+    and replaced when they turn out to be broken. The tool list is loaded once per session.
+    """
+    def __init__(self, server_url: str | None, tool_interceptors: list | None = None,
+                 max_size: int | None = None, streams_per_session: int | None = None,
+                 connect_timeout: float | None = None, health_check_interval: float | None = None):
+        self.server_url = server_url
+        self.tool_interceptors = tool_interceptors or []
+        self.max_size = max_size or int(os.getenv("MCP_POOL_SIZE", "4"))
+        self.streams_per_session = streams_per_session or int(os.getenv("MCP_POOL_STREAMS_PER_SESSION", "16"))
+        self.connect_timeout = connect_timeout or float(os.getenv("MCP_POOL_CONNECT_TIMEOUT", "30"))
+        self.health_check_interval = health_check_interval or float(os.getenv("MCP_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+        self._sessions: list[PooledMcpSession] = []
+        # Slots reserved by turns connecting a session, resolved once the connect finished (or failed)
+        self._connecting: set[asyncio.Future] = set()
+        self._lock: asyncio.Lock | None = None
+        self._closed = False
+
+        # Metrics
+        self._acquisitions = 0
+        self._total_wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._connects = 0
+        self._reconnects = 0
+        self._health_check_failures = 0
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Created lazily so the pool can be constructed outside of a running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _connect(self) -> PooledMcpSession:
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        closer = asyncio.Event()
+
+        async def own_session():
+            try:
+                async with streamablehttp_client(self.server_url) as connection:
+                    if isinstance(connection, tuple) and len(connection) >= 2:
+                        read_stream, write_stream = connection[0], connection[1]
+                    else:
+                        read_stream = connection.read
+                        write_stream = connection.write
+
+                    async with ClientSession(read_stream, write_stream) as session:
+                        await session.initialize()
+                        tools = await load_mcp_tools(session, tool_interceptors=self.tool_interceptors)
+                        ready.set_result((session, tools))
+                        await closer.wait()
+            except Exception as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                else:
+                    print(f"[ERROR] MCP session transport failed: {e}", file=sys.stderr)
+            finally:
+                if not ready.done():
+                    ready.cancel()
+
+        owner_task = asyncio.create_task(own_session())
+        try:
+            session, tools = await asyncio.wait_for(asyncio.shield(ready), timeout=self.connect_timeout)
+        except asyncio.TimeoutError:
+            closer.set()
+            owner_task.cancel()
+            raise Exception(f"[ERROR] Timed out after {self.connect_timeout}s connecting to the MCP server.")
+        self._connects += 1
+        return PooledMcpSession(self._connects, session, tools, closer, owner_task)
+
+    async def _is_healthy(self, pooled: PooledMcpSession) -> bool:
+        if not pooled.is_alive:
+            return False
+        async with pooled.check_lock:
+            if time.monotonic() - pooled.last_checked < self.health_check_interval:
+                return True # Checked recently, possibly by a turn we waited for
+            try:
+                await asyncio.wait_for(pooled.session.send_ping(), timeout=5)
+                pooled.last_checked = time.monotonic()
+                return True
+            except Exception as e:
+                print(f"[DEBUG] MCP session failed health check: {e}", file=sys.stderr)
+                self._health_check_failures += 1
+                return False
+
+    async def _pick(self) -> PooledMcpSession:
+        """
+        The least loaded session, or a new one if all are at `streams_per_session` and the pool can grow.\n
+        The lock is only held to choose: a turn that connects reserves a slot and connects outside of it,
+        so other turns keep using the existing sessions meanwhile. With no session at all and every slot
+        being connected, a turn waits for one of those connects instead of starting another.
+        """
+        while True:
+            async with self._get_lock():
+                self._sessions = [pooled for pooled in self._sessions if pooled.is_alive]
+                pooled = min(self._sessions, key=lambda pooled: pooled.streams, default=None)
+                can_grow = len(self._sessions) + len(self._connecting) < self.max_size
+                if pooled is not None and (pooled.streams < self.streams_per_session or not can_grow):
+                    # Counted under the lock, so concurrent turns spread over the sessions
+                    pooled.streams += 1
+                    return pooled
+                pending = None if can_grow else next(iter(self._connecting))
+                if pending is None:
+                    connecting = asyncio.get_running_loop().create_future()
+                    self._connecting.add(connecting)
+            if pending is None:
+                break
+            await asyncio.wait([pending])
+
+        try:
+            pooled = await self._connect()
+            async with self._get_lock():
+                self._sessions.append(pooled)
+                self._connecting.discard(connecting)
+                pooled.streams += 1
+            return pooled
+        finally:
+            # Also after a failed connect, the turns waiting for it try again
+            self._connecting.discard(connecting)
+            connecting.set_result(None)
+
+    async def _retire(self, pooled: PooledMcpSession):
+        """Drops a broken session from the pool. Turns still using it fail, its transport is gone anyway."""
+        async with self._get_lock():
+            if pooled in self._sessions:
+                self._sessions.remove(pooled)
+                self._reconnects += 1
+        await pooled.close()
+
+    async def _checkout(self) -> PooledMcpSession:
+        while True:
+            pooled = await self._pick()
+            if await self._is_healthy(pooled):
+                return pooled
+            pooled.streams -= 1
+            await self._retire(pooled)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        A session for one chat turn, shared with other turns. Yields a PooledMcpSession with `.session` and `.tools`.
+        Only waits for connecting or health-checking a session, never for other turns to finish.
+        """
+        if self._closed:
+            raise Exception("[ERROR] MCP session pool is closed.")
+
+        started = time.monotonic()
+        pooled = await self._checkout()
+        waited = time.monotonic() - started
+        self._acquisitions += 1
+        self._total_wait_seconds += waited
+        self._max_wait_seconds = max(self._max_wait_seconds, waited)
+
+        try:
+            yield pooled
+        except BaseException:
+            # Force a ping before the next checkout, the failure may have been the transport
+            pooled.last_checked = 0.0
+            raise
+        finally:
+            pooled.streams -= 1
+            if (self._closed and pooled.streams == 0) or not pooled.is_alive:
+                await self._retire(pooled)
+
+    def metrics(self) -> dict:
+        """Pool size, load and wait time statistics."""
+        return {
+            "max_size": self.max_size,
+            "streams_per_session": self.streams_per_session,
+            "size": len(self._sessions),
+            "connecting": len(self._connecting),
+            "active_streams": sum(pooled.streams for pooled in self._sessions),
+            "max_streams_on_a_session": max((pooled.streams for pooled in self._sessions), default=0),
+            "acquisitions": self._acquisitions,
+            "avg_wait_seconds": self._total_wait_seconds / self._acquisitions if self._acquisitions else 0.0,
+            "max_wait_seconds": self._max_wait_seconds,
+            "connects": self._connects,
+            "reconnects": self._reconnects,
+            "health_check_failures": self._health_check_failures,
+        }
+
+    async def close(self):
+        """Closes every unused session. Sessions that turns are still using are closed when the last one releases it."""
+        self._closed = True
+        for pooled in [pooled for pooled in self._sessions if pooled.streams == 0]:
+            self._sessions.remove(pooled)
+            await pooled.close()
@@ -1,18 +1,141 @@
+import asyncio
+import base64
 import uuid
+from dataclasses import dataclass, field
 from langchain_neo4j import GraphCypherQAChain, Neo4jGraph
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_experimental.graph_transformers import LLMGraphTransformer
 from dotenv import load_dotenv
 from langchain_core.documents import Document
 from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+from neo4j import AsyncDriver
 import os
 import re
+import sys
 from datetime import datetime
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.graph_chunking import split_into_chunks, merge_graph_documents
+from services.rate_limiter import RateLimiter
+
+
+class StoryGraph(Neo4jGraph):
+    """
+    A story's view of the shared Neo4jGraph: it uses the same driver, but every query, write and schema refresh
+    runs in a session on the story's own database. Handles of different stories can be used at the same time,
+    nothing switches a shared "current" database.
+    """
+    def __init__(self, graph: Neo4jGraph, database_name: str):
+        # Not Neo4jGraph.__init__, that would open another driver and introspect the database
+        self.__dict__.update(graph.__dict__)
+        self._database = database_name
+        self.schema = ""
+        self.structured_schema = {}
+
+    def close(self):
+        pass # The driver belongs to the shared Neo4jGraph
+
+    def __del__(self):
+        pass
+
+# Labels and relationship types in use, to tell whether a schema snapshot is stale. Token lookups, nothing is scanned
+_SCHEMA_TOKENS_QUERY = """
+CALL db.labels() YIELD label RETURN 'label' AS kind, label AS name
+UNION ALL
+CALL db.relationshipTypes() YIELD relationshipType RETURN 'type' AS kind, relationshipType AS name
+"""
+
+@dataclass
+class SchemaSnapshot:
+    """A story database's introspected schema (on a handle of its own) and the QA chains built on it."""
+    graph: StoryGraph
+    labels: frozenset[str]
+    relationship_types: frozenset[str]
+    graph_version: int | None # See GraphVersionRepository, None if the caller didn't pass one
+    qa_chains: dict[int, GraphCypherQAChain] = field(default_factory=dict) # By top_k
+
+# Graph export: one row per node and per relationship, relationships reference their nodes by element id.
+# Pages append ORDER BY id and LIMIT. There is no index on element ids, so every page scans and sorts the graph:
+# the Graph tab streams it once instead (stream_graph, unsorted)
+_EXPORT_NODES_QUERY = """
+MATCH (n)
+WHERE ($labels IS NULL OR any(label IN labels(n) WHERE label IN $labels))
+  AND ($after IS NULL OR elementId(n) > $after)
+RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS properties
+"""
+_EXPORT_RELATIONSHIPS_QUERY = """
+MATCH (s)-[r]->(t)
+WHERE ($types IS NULL OR type(r) IN $types)
+  AND ($labels IS NULL OR (any(label IN labels(s) WHERE label IN $labels) AND any(label IN labels(t) WHERE label IN $labels)))
+  AND ($after IS NULL OR elementId(r) > $after)
+RETURN elementId(r) AS id, type(r) AS type, elementId(s) AS source, elementId(t) AS target, properties(r) AS properties
+"""
+_EXPORT_PAGE = " ORDER BY id LIMIT $limit"
+
+# Neighborhood: the start node, then per hop the frontier's neighbors, at most $max_neighbors per node (the best
+# connected first) and at most $max_nodes in total. The hop is repeated `hops` times, see get_neighborhood
+_NEIGHBORHOOD_START = """
+MATCH (start:$($label) {id: $name})
+WITH start LIMIT 1
+WITH start, [start] AS frontier, [start] AS seen, [] AS edges
+"""
+_NEIGHBORHOOD_HOP = """
+CALL {
+  WITH frontier
+  UNWIND frontier AS n
+  CALL {
+    WITH n
+    MATCH (n)-[r]-(m)
+    RETURN r, m ORDER BY COUNT { (m)--() } DESC LIMIT $max_neighbors
+  }
+  RETURN collect(DISTINCT r) AS hop_edges, collect(DISTINCT m) AS hop_nodes
+}
+WITH start, seen, edges + hop_edges AS edges, [m IN hop_nodes WHERE NOT m IN seen] AS found
+WITH start, seen, edges,
+     found[..CASE WHEN $max_nodes > size(seen) THEN $max_nodes - size(seen) ELSE 0 END] AS frontier
+WITH start, seen + frontier AS seen, edges, frontier
+"""
+_NEIGHBORHOOD_RETURN = """
+RETURN elementId(start) AS center,
+       [n IN seen | {id: elementId(n), labels: labels(n), properties: properties(n)}] AS nodes,
+       [e IN edges WHERE startNode(e) IN seen AND endNode(e) IN seen |
+        {id: elementId(e), type: type(e), source: elementId(startNode(e)), target: elementId(endNode(e)), properties: properties(e)}] AS edges
+"""
+MAX_NEIGHBORHOOD_HOPS = 3
+MAX_NEIGHBORHOOD_NEIGHBORS = 100
+MAX_NEIGHBORHOOD_NODES = 500
+
+def _encode_export_cursor(section: str, after: str | None) -> str:
+    return base64.urlsafe_b64encode(f"{section}:{after or ''}".encode()).decode()
+
+def _decode_export_cursor(cursor: str | None) -> tuple[str, str | None]:
+    """(section, last element id) of a cursor returned by export_graph_page. No cursor is the start of the nodes."""
+    if not cursor:
+        return "nodes", None
+    try:
+        section, after = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    if section not in ("nodes", "edges"):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return section, after or None
+
 class Neo4jService:
-    def __init__(self, db_graph: Neo4jGraph):
+    def __init__(self, db_graph: Neo4jGraph, async_driver: AsyncDriver, extraction_cache=None,
+                 shared_extraction_rate_limiter=None):
         load_dotenv()
-        self.db_graph = db_graph
+        self.db_graph = db_graph # Only its driver is used, queries go through story_graph handles
+        self.async_driver = async_driver # Database lifecycle and maintenance, see neo4j_database.py
+        self._story_graphs: dict[str, StoryGraph] = {}
+        self._schema_snapshots: dict[str, SchemaSnapshot] = {} # For natural language queries, see _schema_snapshot
+        self.extraction_cache = extraction_cache # Optional GraphExtractionCache, see services/extraction_cache.py
+        # Limits concurrent extraction LLM calls, chunks of all chapters being indexed share it
+        self._extraction_semaphore = asyncio.Semaphore(int(os.getenv("GRAPH_EXTRACTION_CHUNK_CONCURRENCY", "4")))
+        # Optional throttle of extraction LLM calls, e.g. for re-indexing against the Gemini quota
+        requests_per_minute = float(os.getenv("GRAPH_EXTRACTION_REQUESTS_PER_MINUTE", "0"))
+        self.extraction_rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute > 0 else None
+        # Optional SharedRateLimiter, a limit every process honours, set by maintenance.py reindex
+        self.shared_extraction_rate_limiter = shared_extraction_rate_limiter
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-2.5-flash",
             temperature=0,
@@ -56,12 +179,14 @@ class Neo4jService:
             "since (string): When this started.",
             "status (string): E.g., Active, Broken, Secret."
         ]
+        self.extraction_node_properties = ["name", "description", "status", "role", "age", "traits"]
+        self.extraction_relationship_properties = ["context", "strength", "since", "status"]
         self.llm_transformer = LLMGraphTransformer(
             llm=self.llm,
             allowed_nodes=self.nodes_list,
             allowed_relationships=self.rels_list,
-            node_properties=["name", "description", "status", "role", "age", "traits"],
-            relationship_properties=["context", "strength", "since", "status"],
+            node_properties=self.extraction_node_properties,
+            relationship_properties=self.extraction_relationship_properties,
         )
 
     async def create_new_database(self, database_name):
@@ -77,40 +202,33 @@ class Neo4jService:
         
         print(f"[INFO] Sanitized '{database_name}' -> '{final_db_name}'")
 
-        # 2. Create the physical database
-        # We must access the driver directly to hit the 'system' database
-        driver = self.db_graph._driver
-        
+        # 2. Create the physical database, on the 'system' database
         try:
-            # Note: The standard Neo4j Python driver is synchronous. 
-            # Unless you are explicitly using AsyncGraphDatabase, this block is blocking.
-            with driver.session(database="system") as session:
-                session.run(f"CREATE DATABASE {final_db_name} IF NOT EXISTS WAIT")
+            async with self.async_driver.session(database="system") as session:
+                result = await session.run(f"CREATE DATABASE {final_db_name} IF NOT EXISTS WAIT")
+                await result.consume()
         except Exception as e:
             raise Exception(f"[ERROR] Failed to create database '{final_db_name}': {e}")
 
-        # 3. Point the wrapper to this new database
-        # (Assuming connect_to_existing_database is async based on your snippet)
-        await self.connect_to_existing_database(final_db_name)
+        print(f"[SUCCESS] Created '{final_db_name}'")
         
-        print(f"[SUCCESS] Created and connected to '{final_db_name}'")
-        
-        # 4. Return the final name so your app knows what it ended up being
+        # 3. Return the final name so your app knows what it ended up being
         return final_db_name
 
-    async def connect_to_existing_database(self, database_name):
+    def story_graph(self, database_name: str) -> StoryGraph:
         """
-        Switches the active database and injects the custom schema 
-        so the LLM knows the rules.
+        The handle of a story's database, with the custom schema injected so the LLM knows the rules.
+        Created on first use and reused afterwards.
         """
-
-        # Switch the target database for future queries
-        self.db_graph._database = database_name
-        # Inject our custom schema definition
-        self._inject_custom_schema()
+        graph = self._story_graphs.get(database_name)
+        if graph is None:
+            graph = StoryGraph(self.db_graph, database_name)
+            self._inject_custom_schema(graph)
+            self._story_graphs[database_name] = graph
+        return graph
 
     # We don't need to refresh the schema from the DB, we have our own definition
-    def _inject_custom_schema(self):
+    def _inject_custom_schema(self, graph: Neo4jGraph):
         
         # --- 1. Universal NODE Properties ---
         node_props = self.node_props_list
@@ -142,7 +260,7 @@ class Neo4jService:
         {rels_formatted}
         """
 
-        self.db_graph.schema = custom_schema_string
+        graph.schema = custom_schema_string
     
     def _sanitize_db_name(self, name):
         """
@@ -201,57 +319,188 @@ class Neo4jService:
         """
         Deletes an existing Neo4j database.
         """
-        driver = self.db_graph._driver
-        
         try:
-            with driver.session(database="system") as session:
-                session.run(f"DROP DATABASE {database_name} IF EXISTS WAIT")
+            async with self.async_driver.session(database="system") as session:
+                result = await session.run(f"DROP DATABASE {database_name} IF EXISTS WAIT")
+                await result.consume()
+            self._story_graphs.pop(database_name, None)
+            self._schema_snapshots.pop(database_name, None)
             print(f"[SUCCESS] Deleted database '{database_name}'")
         except Exception as e:
             raise Exception(f"[ERROR] Failed to delete database '{database_name}': {e}")
     
+    async def get_database_names(self) -> list[str]:
+        """
+        Names of all user databases, without the `system` database and the default `neo4j` database.
+        """
+        try:
+            async with self.async_driver.session(database="system") as session:
+                result = await session.run("SHOW DATABASES YIELD name RETURN DISTINCT name")
+                return [record["name"] async for record in result if record["name"] not in ("system", "neo4j")]
+        except Exception as e:
+            raise Exception(f"[ERROR] Failed to list databases: {e}")
+
+    async def clear_database(self, database_name):
+        """
+        Deletes every node and relationship of a database, in batches, so large graphs don't exhaust the transaction memory.
+        """
+        try:
+            async with self.async_driver.session(database=database_name) as session:
+                result = await session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS")
+                await result.consume()
+            self._schema_snapshots.pop(database_name, None)
+            print(f"[INFO] Cleared database '{database_name}'")
+        except Exception as e:
+            raise Exception(f"[ERROR] Failed to clear database '{database_name}': {e}")
+
     async def check_database_exists(self, database_name) -> bool:
         """
         Checks if a Neo4j database with the given name exists.
+        Filtered on the server, at most one row comes back instead of the whole listing.
         """
-        driver = self.db_graph._driver
-        
         try:
-            with driver.session(database="system") as session:
-                result = session.run("SHOW DATABASES")
-                databases = [record["name"] for record in result]
-                return database_name in databases
+            async with self.async_driver.session(database="system") as session:
+                result = await session.run(
+                    "SHOW DATABASES YIELD name WHERE name = $name RETURN name LIMIT 1", name=database_name.lower()
+                )
+                return await result.single() is not None
         except Exception as e:
             raise Exception(f"[ERROR] Failed to check existence of database '{database_name}': {e}")
 
-    async def insert_story(self, story: str):
+    async def insert_story(self, database_name: str, story: str):
         """
         Extracts entities and relationships from the story (in Postgres, chapter) text and inserts them into the database.
 
         Returns a list of tuples containing (node_label, node_name) for all nodes inserted. This should be uploaded to Postgres.
         """
-        graph_documents = await self.llm_transformer.aconvert_to_graph_documents([Document(page_content=story)])
-        self.db_graph.add_graph_documents(graph_documents)
+        graph_documents = await self.extract_graph_documents(story)
+        await self.add_graph_documents(database_name, graph_documents)
         return self.parse_uploaded_graph_documents(graph_documents)
     
-    async def query_with_natural_language(self, query: str, top_k: int = 10):
+    async def add_graph_documents(self, database_name: str, graph_documents: list[GraphDocument]):
+        """
+        Writes extracted graph documents to the given database. Nodes and relationships are MERGEd,
+        so writing the same documents twice doesn't duplicate them.
+        """
+        # Neo4jGraph's driver is synchronous, a large write would block every other stream of the event loop
+        await asyncio.to_thread(self.story_graph(database_name).add_graph_documents, graph_documents)
+
+        # New labels or relationship types make the schema of natural language queries stale
+        snapshot = self._schema_snapshots.get(database_name)
+        if snapshot is not None:
+            labels = {node.type for graph_doc in graph_documents for node in graph_doc.nodes}
+            labels.update(
+                node.type for graph_doc in graph_documents for rel in graph_doc.relationships for node in (rel.source, rel.target)
+            )
+            relationship_types = {rel.type for graph_doc in graph_documents for rel in graph_doc.relationships}
+            if not labels <= snapshot.labels or not relationship_types <= snapshot.relationship_types:
+                self._schema_snapshots.pop(database_name, None)
+
+    def _extraction_schema(self) -> dict:
+        """Everything besides the text that determines what the extraction returns."""
+        return {
+            "model": self.llm.model,
+            "nodes": self.nodes_list,
+            "relationships": self.rels_list,
+            "node_properties": self.extraction_node_properties,
+            "relationship_properties": self.extraction_relationship_properties,
+        }
+
+    async def _extract_chunk(self, chunk: str) -> list[GraphDocument]:
+        """
+        Extracts the graph documents from one chunk with the LLM, or returns the cached result
+        of a previous extraction of the same text under the same schema.
+        """
+        cache_key = None
+        if self.extraction_cache is not None:
+            cache_key = self.extraction_cache.cache_key(chunk, self._extraction_schema())
+            graph_documents = await self.extraction_cache.get(cache_key)
+            if graph_documents is not None:
+                print(f"[DEBUG] Graph extraction cache hit for {cache_key[:12]}", file=sys.stderr)
+                return graph_documents
+
+        async with self._extraction_semaphore:
+            if self.extraction_rate_limiter is not None:
+                await self.extraction_rate_limiter.wait()
+            if self.shared_extraction_rate_limiter is not None:
+                await self.shared_extraction_rate_limiter.wait()
+            graph_documents = await self.llm_transformer.aconvert_to_graph_documents([Document(page_content=chunk)])
+        if cache_key is not None:
+            await self.extraction_cache.set(cache_key, graph_documents)
+        return graph_documents
+
+    async def extract_graph_documents(self, story: str) -> list[GraphDocument]:
+        """
+        Extracts the graph documents from a chapter's text.\n
+        Long chapters are split into overlapping chunks of paragraphs (see services/graph_chunking.py), which are
+        extracted concurrently, at most GRAPH_EXTRACTION_CHUNK_CONCURRENCY at a time across all chapters.
+        The results are merged into one document with deduplicated nodes and relationships.
+        Chunks are cached individually. Chunks are packed from the start of the chapter, so after an edit the chunks
+        before it are unchanged and hit the cache; the chunk with the edit and the ones after it may be packed differently
+        and are then extracted again.
+        """
+        chunks = split_into_chunks(story)
+        if len(chunks) == 1:
+            return await self._extract_chunk(story)
+
+        print(f"[DEBUG] Extracting graph from {len(chunks)} chunks", file=sys.stderr)
+        chunk_documents = await asyncio.gather(*(self._extract_chunk(chunk) for chunk in chunks))
+        return [merge_graph_documents([doc for docs in chunk_documents for doc in docs], story)]
+
+    async def _schema_tokens(self, database_name: str) -> tuple[frozenset[str], frozenset[str]]:
+        """The labels and relationship types in use in the database."""
+        async with self.async_driver.session(database=database_name) as session:
+            result = await session.run(_SCHEMA_TOKENS_QUERY)
+            rows = [(record["kind"], record["name"]) async for record in result]
+        return (frozenset(name for kind, name in rows if kind == "label"),
+                frozenset(name for kind, name in rows if kind == "type"))
+
+    async def _schema_snapshot(self, database_name: str, graph_version: int | None = None) -> SchemaSnapshot:
+        """
+        The database's introspected schema, refreshed only when its labels or relationship types changed.
+
+        Writes of this process drop the snapshot right away (add_graph_documents, clear_database).
+        Writes of other processes (the MCP server also indexes chapters) are noticed through `graph_version`:
+        when it moved, the labels and types are compared, which is far cheaper than the APOC introspection.
+        """
+        snapshot = self._schema_snapshots.get(database_name)
+        if snapshot is not None and graph_version is not None and snapshot.graph_version != graph_version:
+            if await self._schema_tokens(database_name) == (snapshot.labels, snapshot.relationship_types):
+                snapshot.graph_version = graph_version
+            else:
+                snapshot = None
+        if snapshot is None:
+            # Read before the introspection, so a write in between makes the snapshot look stale, not current
+            labels, relationship_types = await self._schema_tokens(database_name)
+            # A handle of its own, so the story's shared handle keeps our custom schema
+            graph = StoryGraph(self.db_graph, database_name)
+            print(f"[DEBUG] Refreshing the schema of '{database_name}'", file=sys.stderr)
+            await asyncio.to_thread(graph.refresh_schema)
+            snapshot = SchemaSnapshot(graph, labels, relationship_types, graph_version)
+            self._schema_snapshots[database_name] = snapshot
+        return snapshot
+
+    async def query_with_natural_language(self, database_name: str, query: str, top_k: int = 10,
+                                          graph_version: int | None = None):
         # So the issue is that we have spent all this time creating a custom schema, but the schema contains
         # only the list of ALLOWED nodes and relationships. The LLM still needs to see which nodes and relationships actually ARE in the database
         # and which properties they have.
-        # So, we refresh the schema from the database first. Then perform the query, then set the schema back to our custom one.
-        self.db_graph.refresh_schema()  
-        print("[DEBUG] Instantiating QA chain...")
-        qa_chain = GraphCypherQAChain.from_llm(
-            llm=self.llm,
-            graph=self.db_graph,
-            top_k = top_k,
-            allow_dangerous_requests=True, # This NEEDS to be True to run
-            return_intermediate_steps=True,
-            verbose=True
-        )
-        print("[DEBUG] QA chain instatniated!")
+        # So, the chain uses the schema introspected from the database, cached until new labels or relationship types appear.
+        snapshot = await self._schema_snapshot(database_name, graph_version)
+        qa_chain = snapshot.qa_chains.get(top_k)
+        if qa_chain is None:
+            print("[DEBUG] Instantiating QA chain...")
+            qa_chain = GraphCypherQAChain.from_llm(
+                llm=self.llm,
+                graph=snapshot.graph,
+                top_k = top_k,
+                allow_dangerous_requests=True, # This NEEDS to be True to run
+                return_intermediate_steps=True,
+                verbose=True
+            )
+            # Holds no per-query state, so concurrent queries can share it
+            snapshot.qa_chains[top_k] = qa_chain
         result = await qa_chain.ainvoke({"query": query})
-        self._inject_custom_schema()  # Restore our custom schema
         return result['result']
     
     def parse_uploaded_graph_documents(self, uploaded_graph_documents: list[GraphDocument]) -> list[tuple[str, str]]:
@@ -264,37 +513,153 @@ class Neo4jService:
             for node in graph_doc.nodes:
                 node_label_node_name_pairs.append((node.type, node.id))
         return node_label_node_name_pairs
+
+    def parse_relationships(self, graph_documents: list[GraphDocument]) -> list[tuple[str, str, str, str, str]]:
+        """
+        Parses graph documents to extract the relationships' keys.
+        E.g. [("Person", "Alice", "LOVES", "Person", "Bob"), ...]
+        """
+        return [
+            (rel.source.type, rel.source.id, rel.type, rel.target.type, rel.target.id)
+            for graph_doc in graph_documents
+            for rel in graph_doc.relationships
+        ]
+
+    async def delete_graph_elements(self, database_name: str, nodes: list[tuple[str, str]],
+                              relationships: list[tuple[str, str, str, str, str]]):
+        """
+        Deletes the given relationships, then the given nodes (with any relationships left on them),
+        in one write transaction, with one batched statement each.
+        """
+        if not nodes and not relationships:
+            return
+
+        async def delete(tx):
+            result = await tx.run(
+                """
+                UNWIND $relationships AS r
+                MATCH (s:$(r.source_label) {id: r.source_name})-[rel:$(r.type)]->(t:$(r.target_label) {id: r.target_name})
+                DELETE rel
+                """,
+                relationships=[
+                    {"source_label": s_label, "source_name": s_name, "type": rel_type, "target_label": t_label, "target_name": t_name}
+                    for s_label, s_name, rel_type, t_label, t_name in relationships
+                ],
+            )
+            await result.consume()
+            result = await tx.run(
+                """
+                UNWIND $nodes AS n
+                MATCH (x:$(n.label) {id: n.name})
+                DETACH DELETE x
+                """,
+                nodes=[{"label": label, "name": name} for label, name in nodes],
+            )
+            await result.consume()
+
+        try:
+            async with self.async_driver.session(database=database_name) as session:
+                await session.execute_write(delete)
+        except Exception as e:
+            raise Exception(f"[ERROR] Failed to delete graph elements from '{database_name}': {e}")
     
+    async def export_graph_page(self, database_name: str, limit: int, cursor: str | None = None,
+                                labels: list[str] | None = None, relationship_types: list[str] | None = None) -> dict:
+        """
+        One page of a story's graph: {"nodes": [...], "edges": [...], "next_cursor": ...}.\n
+        Every node and relationship is listed once. Pages go through all nodes first, then all relationships,
+        `limit` rows in total, ordered by element id. Pass `next_cursor` back for the next page; it is None on the last one.
+        Each page scans and sorts the whole graph, to get all of a large graph use stream_graph.
+        `labels` keeps only nodes with one of the labels (and relationships between them),
+        `relationship_types` only relationships of one of the types.
+        """
+        section, after = _decode_export_cursor(cursor)
+        parameters = {"labels": labels or None, "types": relationship_types or None}
+        page = {"nodes": [], "edges": [], "next_cursor": None}
+
+        async with self.async_driver.session(database=database_name) as session:
+            if section == "nodes":
+                result = await session.run(_EXPORT_NODES_QUERY + _EXPORT_PAGE, after=after, limit=limit, **parameters)
+                page["nodes"] = [record.data() async for record in result]
+                if len(page["nodes"]) == limit:
+                    page["next_cursor"] = _encode_export_cursor("nodes", page["nodes"][-1]["id"])
+                    return page
+                section, after = "edges", None
+
+            remaining = limit - len(page["nodes"])
+            if remaining == 0:
+                page["next_cursor"] = _encode_export_cursor("edges", None)
+                return page
+            result = await session.run(_EXPORT_RELATIONSHIPS_QUERY + _EXPORT_PAGE, after=after, limit=remaining, **parameters)
+            page["edges"] = [record.data() async for record in result]
+            if len(page["edges"]) == remaining:
+                page["next_cursor"] = _encode_export_cursor("edges", page["edges"][-1]["id"])
+        return page
+
+    async def stream_graph(self, database_name: str, labels: list[str] | None = None,
+                           relationship_types: list[str] | None = None):
+        """
+        The whole graph as {"node": ...} and then {"edge": ...} rows, same rows and filters as export_graph_page.
+        Rows are yielded as the driver receives them, the graph is never held in memory at once.
+        One scan per section and unsorted, unlike paging through export_graph_page.
+        """
+        parameters = {"after": None, "labels": labels or None, "types": relationship_types or None}
+        async with self.async_driver.session(database=database_name) as session:
+            result = await session.run(_EXPORT_NODES_QUERY, **parameters)
+            async for record in result:
+                yield {"node": record.data()}
+            result = await session.run(_EXPORT_RELATIONSHIPS_QUERY, **parameters)
+            async for record in result:
+                yield {"edge": record.data()}
+
+    async def get_neighborhood(self, database_name: str, label: str, name: str, hops: int = 1,
+                               max_neighbors: int = 25, max_nodes: int = 100) -> dict | None:
+        """
+        The subgraph around a node, in one query: {"center": id, "nodes": [...], "edges": [...]} in the format of
+        export_graph_page, or None if there is no such node.\n
+        Expands `hops` times (1 to MAX_NEIGHBORHOOD_HOPS), following at most `max_neighbors` relationships per node,
+        the best connected neighbors first, and stops adding nodes at `max_nodes`. Both are clamped to
+        MAX_NEIGHBORHOOD_NEIGHBORS and MAX_NEIGHBORHOOD_NODES, whichever caller asks.
+        Edges are only returned between nodes that made it into the result.
+        """
+        if not 1 <= hops <= MAX_NEIGHBORHOOD_HOPS:
+            raise ValueError(f"hops must be between 1 and {MAX_NEIGHBORHOOD_HOPS}")
+        max_neighbors = min(max(max_neighbors, 1), MAX_NEIGHBORHOOD_NEIGHBORS)
+        max_nodes = min(max(max_nodes, 1), MAX_NEIGHBORHOOD_NODES)
+        query = _NEIGHBORHOOD_START + _NEIGHBORHOOD_HOP * hops + _NEIGHBORHOOD_RETURN
+
+        async with self.async_driver.session(database=database_name) as session:
+            result = await session.run(query, label=label, name=name, max_neighbors=max_neighbors, max_nodes=max_nodes)
+            record = await result.single()
+        if record is None:
+            return None
+        # A relationship between two frontier nodes is found from both of its ends
+        edges = list({edge["id"]: edge for edge in record["edges"]}.values())
+        return {"center": record["center"], "nodes": record["nodes"], "edges": edges}
+
     async def get_all_nodes_and_relationships(self, database_name: str) -> list[dict]:
         """
         Retrieves all nodes and relationships from the specified database.
         Returns a list of dictionaries representing nodes and relationships.
         """
-        await self.connect_to_existing_database(database_name)
-
         query = "MATCH (n)-[r]->(m) RETURN n, labels(n), r, m, labels(m)"
 
-        return self.db_graph.query(query)
+        return await asyncio.to_thread(self.story_graph(database_name).query, query)
     
-    def close_connection(self):
+    async def close_connection(self):
         """
-        Closes the Neo4j database connection.
+        Closes the Neo4j database connections.
         """
         self.db_graph.close()
-        
+        await self.async_driver.close()
+
 if __name__ == "__main__":
-    from langchain_neo4j import Neo4jGraph
+    from neo4j_database import create_graph, create_async_driver
     import asyncio
-    db_graph = Neo4jGraph(
-        url="bolt://localhost:7687",
-        username="neo4j",
-        password="qwertyui",
-        enhanced_schema=True
-    )
-    neo4j_service = Neo4jService(db_graph)
-    asyncio.run(neo4j_service.create_new_database("testdb2"))
+    neo4j_service = Neo4jService(create_graph(), create_async_driver())
+    database_name = asyncio.run(neo4j_service.create_new_database("testdb2"))
     some_story = """The late afternoon sun, a benevolent golden orb, spilled over Elmwood Park, painting the ancient oaks in hues of amber and emerald. A gentle breeze, smelling of freshly cut grass and distant honeysuckle, rustled through the leaves, creating a soft, whispering symphony. This was the stage for Lisa and Emily’s perfect escape. Lisa, ever the planner, had arrived first, a wicker basket swinging from her arm, its contents a delightful mystery. She’d chosen their spot with precision: under the sprawling canopy of a particularly majestic oak, where dappled sunlight danced on the ground and a clear view of the duck pond shimmered in the distance. By the time Emily arrived, a wide-brimmed straw hat perched jauntily on her head, Lisa had already unfurled a cheerful red-and-white checkered blanket, anchoring its corners with their bags. "You're a magician, Lise," Emily declared, dropping her tote and sinking onto the soft fabric with a sigh of contentment. "This is exactly what my soul needed." Lisa grinned, already pulling out the treasures. "Only the best for my favourite picnic companion." First came the sandwiches: delicate cucumber and cream cheese on rye, cut into neat triangles, followed by plump, ruby-red strawberries that gleamed like jewels. A thermos of homemade lemonade, condensation beading on its cool surface, promised sweet refreshment. Then, a small container of Lisa's famous lemon drizzle cake, its sugary glaze sparkling. "Oh, you outdid yourself!" Emily exclaimed, plucking a strawberry and popping it into her mouth. "Pure bliss." They ate slowly, savouring each bite, the quiet hum of the park their only soundtrack. A group of children chased a brightly coloured kite across a distant field, their laughter carried on the breeze. A lone dog trotted past, its tail wagging a friendly rhythm. "Remember that time we tried to have a picnic by the river," Emily mused, a smile playing on her lips, "and a rogue gust of wind stole our entire blanket, sandwiches and all?" Lisa chuckled, a warm, melodic sound. "And we ended up chasing it halfway to the bridge, looking like two madwomen!" She shook her head, the memory still vivid. "This is much more civilized." As if on cue, a tiny, audacious squirrel, emboldened by their stillness, crept closer, its beady eyes fixed on the lemon cake. Emily, noticing its approach, tore off a tiny piece of bread and tossed it gently a few feet away. The squirrel, after a moment of cautious assessment, darted forward, snatched its prize, and vanished up the oak tree in a blur of grey fur. "Nature's little tax collector," Emily quipped, leaning back on her elbows, her gaze drifting towards the pond where a family of ducks glided serenely. Lisa watched her friend, a quiet contentment settling over her. Emily’s face, framed by the straw hat, was relaxed, her eyes sparkling with a gentle joy. It wasn't just the perfect weather or the delicious food; it was the shared silence, the easy laughter, the unspoken understanding that flowed between them. As the sun began its slow descent, casting long, dramatic shadows across the grass, they packed up, leaving no trace of their presence save for the faint imprint of their blanket. The air grew cooler, carrying the faint scent of evening dew. "Thank you, Lise," Emily said, giving her a warm hug. "This was exactly what I needed." Lisa smiled, the golden light catching in her hair. "Anytime, Em. Anytime." And as they walked away, the park slowly emptying around them, they carried with them not just the lingering taste of strawberries and lemonade, but the quiet, profound joy of a perfect afternoon spent in the company of a cherished friend."""
-    result = asyncio.run(neo4j_service.insert_story(some_story))
+    result = asyncio.run(neo4j_service.insert_story(database_name, some_story))
     print("Inserted story graph documents:", result)
-    result = asyncio.run(neo4j_service.query_with_natural_language("What did the two girls eat at their picnic?", top_k=5))
+    result = asyncio.run(neo4j_service.query_with_natural_language(database_name, "What did the two girls eat at their picnic?", top_k=5))
     print("Query result:", result)
\ No newline at end of file
@@ -1,87 +1,185 @@
+import asyncio
 import datetime
 import sys
 import os
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from postgres_database import SessionLocal, start_db
+from postgres_database import SessionLocal, start_db, stop_db
+from neo4j_database import create_graph, create_async_driver
 from repositories.postgres.StoryRepository import StoryRepository
 from repositories.postgres.ChapterRepository import ChapterRepository
 from repositories.postgres.ChapterNodeMappingRepository import ChapterNodeMappingRepository
+from repositories.postgres.ChapterRelationshipMappingRepository import ChapterRelationshipMappingRepository
+from repositories.postgres.ChapterIndexVersionRepository import ChapterIndexVersionRepository
 from repositories.postgres.ImageRepository import ImageRepository
+from repositories.postgres.GraphExtractionJobRepository import GraphExtractionJobRepository
+from repositories.postgres.GraphVersionRepository import GraphVersionRepository
+from repositories.postgres.StoryGraphLockRepository import StoryGraphLockRepository
 from services.neo4j_service import Neo4jService
+from services.extraction_cache import GraphExtractionCache
+from services.graph_extraction_queue import GraphExtractionWorkerPool
+from services.rate_limiter import SharedRateLimiter
+from services.summary_cache import ChapterSummaryCache
+from services.graph_response_cache import GraphResponseCache, graph_etag
 from models.postgres.Chapter import ChapterBase
 from models.postgres.ChapterNodeMapping import ChapterNodeMappingBase
 
-from sqlalchemy.orm import Session
-from langchain_neo4j import Neo4jGraph
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Name of the SharedRateLimiter of extraction LLM calls, see maintenance.py reindex --requests-per-minute
+GRAPH_EXTRACTION_RATE_LIMIT = "graph_extraction"
+
+# The session of the unit of work the current request or tool call runs in, see PostgresService.unit_of_work
+_unit_of_work_session: ContextVar[AsyncSession | None] = ContextVar("unit_of_work_session", default=None)
 
 
 class PostgresService:
+    # Shared by every instance in the process, so the agent's tool interceptor can invalidate it too
+    chapter_summary_cache = ChapterSummaryCache()
+    graph_response_cache = GraphResponseCache(
+        max_entries=int(os.getenv("GRAPH_RESPONSE_CACHE_ENTRIES", "64")),
+        max_bytes=int(os.getenv("GRAPH_RESPONSE_CACHE_MB", "64")) * 1024 * 1024,
+    )
+
     def __init__(self):
-        start_db()
-        self.db_session = SessionLocal()
-        
-        neo4j_uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        neo4j_user = os.getenv("NEO4J_USER", "neo4j")
-        neo4j_password = os.getenv("NEO4J_PASSWORD", "qwertyui")
-
-        self.db_graph = Neo4jGraph(
-            url=neo4j_uri,
-            username=neo4j_user,
-            password=neo4j_password,
-            enhanced_schema=True
-        )
-        self.neo4j_service = Neo4jService(self.db_graph)
+        # Sessions are checked out per request or tool call (see unit_of_work), never shared between them
+        self.session_factory = SessionLocal
+
+        # The Neo4j connection (and the LLM clients of Neo4jService) are created on first use, see get_neo4j_service
+        self._neo4j_service: Neo4jService | None = None
+        self._neo4j_lock = threading.Lock() # Held by the thread creating it, the prewarm's or a get_neo4j_service call's
+
+        # Drains the graph extraction outbox, see insert_chapter
+        self.graph_extraction_workers = GraphExtractionWorkerPool(self._index_chapter)
+
+    def _create_neo4j_service(self) -> Neo4jService:
+        """Blocking (Neo4jGraph checks connectivity on construction), call it in a thread."""
+        if self._neo4j_service is None:
+            with self._neo4j_lock:
+                if self._neo4j_service is None:
+                    self._neo4j_service = Neo4jService(
+                        create_graph(), create_async_driver(), extraction_cache=GraphExtractionCache(),
+                        shared_extraction_rate_limiter=SharedRateLimiter(GRAPH_EXTRACTION_RATE_LIMIT),
+                    )
+        return self._neo4j_service
+
+    async def get_neo4j_service(self) -> Neo4jService:
+        """
+        The Neo4jService, created on first use in a worker thread, so neither the connection nor a prewarm
+        holding the lock blocks the event loop.
+        """
+        if self._neo4j_service is not None:
+            return self._neo4j_service
+        return await asyncio.to_thread(self._create_neo4j_service)
+
+    async def start(self):
+        """Creates the tables that don't exist yet. Call once, before the first request."""
+        await start_db()
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        """
+        One session for everything a request or tool call does, closed (and its connection returned to the pool)
+        when it ends. A failed transaction only affects the request it belongs to.\n
+        Service methods called inside it use this session, outside of one each call opens its own.
+        Nested units of work reuse the outer session.
+        """
+        if _unit_of_work_session.get() is not None:
+            yield _unit_of_work_session.get()
+            return
+        async with self.session_factory() as db:
+            token = _unit_of_work_session.set(db)
+            try:
+                yield db
+            finally:
+                _unit_of_work_session.reset(token)
+
+    @asynccontextmanager
+    async def _session(self):
+        db = _unit_of_work_session.get()
+        if db is None:
+            async with self.session_factory() as db:
+                yield db
+            return
+        try:
+            yield db
+        except Exception:
+            # Don't leave the request's session in a failed transaction for its next call
+            await db.rollback()
+            raise
+
+    @staticmethod
+    async def _release_connection(db: AsyncSession | None = None):
+        """
+        Ends the transaction of `db` (by default the unit of work's session), which returns its connection to the pool
+        until the session's next query. Call it before waiting on Neo4j or an LLM, so slow requests don't keep
+        connections idle in a transaction and a burst of them can't exhaust the pool.
+        Repositories commit their own writes, so there is nothing left to commit but reads.
+        """
+        db = db if db is not None else _unit_of_work_session.get()
+        if db is not None and db.in_transaction():
+            await db.commit()
+
+    def prewarm(self):
+        """Creates the lazily initialized clients ahead of the first request. Blocking, run it in a thread."""
+        try:
+            self._create_neo4j_service()
+            print("[INFO] Neo4j connection prewarmed", file=sys.stderr)
+        except Exception as e:
+            # Not fatal, the first request retries
+            print(f"[ERROR] Failed to prewarm the Neo4j connection: {e}", file=sys.stderr)
     
     #region story repository
 
     async def insert_story(self, new_story):
-        assert isinstance(self.db_session, Session)
+        await self._release_connection()
+        neo4j_service = await self.get_neo4j_service()
         #0. Check if there already exists a Neo4j database with the same name
         # The story that this database belongs to can already be renamed to something different
-        sanitized_db_name = self.neo4j_service._sanitize_db_name(new_story.neo_database_name)
-        if await self.neo4j_service.check_database_exists(sanitized_db_name):
+        sanitized_db_name = neo4j_service._sanitize_db_name(new_story.neo_database_name)
+        if await neo4j_service.check_database_exists(sanitized_db_name):
             raise Exception(f"[ERROR] A Neo4j database with the name {new_story.neo_database_name} already exists.")
         #1. Create a new Neo4j database for the story
-        neo_database_name = await self.neo4j_service.create_new_database(sanitized_db_name) 
+        neo_database_name = await neo4j_service.create_new_database(sanitized_db_name) 
         #2. Set the story's neo_database_name to the new database name
         new_story.neo_database_name = neo_database_name # The database name is the sanitized final name
         #3. Insert the story in postgres, and return the created story
-        return await StoryRepository.insert(self.db_session, new_story)
+        async with self._session() as db:
+            return await StoryRepository.insert(db, new_story)
 
     async def get_story_by_id(self, story_id: int):
-        """Get a story by its ID + Connect to its Neo4j database (if the story exists)"""
-        assert isinstance(self.db_session, Session)
-        story = await StoryRepository.get_by_id(self.db_session, story_id)
-        if story:
-            await self.neo4j_service.connect_to_existing_database(story.neo_database_name)
-            print(f"[DEBUG] Connected to Neo4j database: {story.neo_database_name}")
-        return story
+        async with self._session() as db:
+            return await StoryRepository.get_by_id(db, story_id)
     
     async def get_all_stories(self):
-        assert isinstance(self.db_session, Session)
-        return await StoryRepository.get_all(self.db_session)
+        async with self._session() as db:
+            return await StoryRepository.get_all(db)
     
     async def delete_story_by_id(self, story_id: int):
-        assert isinstance(self.db_session, Session)
         story = await self.get_story_by_id(story_id)
+        await self._release_connection()
         #1. Delete the story's Neo4j database
-        await self.neo4j_service.delete_database(story.neo_database_name)
+        await (await self.get_neo4j_service()).delete_database(story.neo_database_name)
         #2. Delete the story from Postgres
-        return await StoryRepository.delete_by_id(self.db_session, story_id)
+        async with self._session() as db:
+            await GraphVersionRepository.bump(db, story.neo_database_name)
+            return await StoryRepository.delete_by_id(db, story_id)
     
     async def update_story(self, story_id: int, new_title: str| None = None,
                            new_story_length: str| None = None, new_chapter_length: str| None = None, 
                            new_genre: str| None = None, new_additional_notes: str| None = None, 
                            new_main_characters: str| None = None, 
                            new_plot_ideas: str| None = None):
-        assert isinstance(self.db_session, Session)
-        return await StoryRepository.update_story(self.db_session, story_id, 
-                                                  new_title, new_story_length, 
-                                                  new_chapter_length, new_genre, 
-                                                  new_additional_notes, new_main_characters, 
-                                                  new_plot_ideas)
+        async with self._session() as db:
+            return await StoryRepository.update_story(db, story_id, 
+                                                      new_title, new_story_length, 
+                                                      new_chapter_length, new_genre, 
+                                                      new_additional_notes, new_main_characters, 
+                                                      new_plot_ideas)
     
     #endregion
 
@@ -89,25 +187,87 @@ class PostgresService:
 
     async def insert_chapter(self, new_chapter: ChapterBase):
         """
-        When inserting a chapter, we also extract the nodes and relationships from it,
-        and add those to the story's neo4j database.\n
-        On top of that, we also create the chapter-node mappings in Postgres.
+        Inserts the chapter together with a graph extraction job, and returns right away.\n
+        The graph extraction workers then extract the nodes and relationships from it, add those to the
+        story's neo4j database and create the chapter-node mappings in Postgres (see _index_chapter).
         """
-        assert isinstance(self.db_session, Session)
-
-        # Ensure we are connected to the correct Neo4j database
-        await self.get_story_by_id(new_chapter.story_id)
-
-        added_chapter = await ChapterRepository.insert(self.db_session, new_chapter)
-        node_tuples = await self.neo4j_service.insert_story(added_chapter.content)
-        for node_label, node_name in node_tuples:
-            new_mapping = ChapterNodeMappingBase(
-                node_label=node_label,
-                node_name=node_name,
-                chapter_id=added_chapter.id
-            )
-            await ChapterNodeMappingRepository.insert(self.db_session, new_mapping)
+        async with self._session() as db:
+            added_chapter = await ChapterRepository.insert_with_extraction_job(db, new_chapter)
+            await GraphVersionRepository.bump(db, added_chapter.story.neo_database_name)
+        self.chapter_summary_cache.invalidate(added_chapter.story_id)
+        self.graph_extraction_workers.notify()
         return added_chapter
+
+    async def _index_chapter(self, db: AsyncSession, chapter_id: int):
+        """
+        Processes a chapter's graph extraction job, with the worker's own session.
+        Idempotent: nodes and relationships are MERGEd, and mappings that already exist are skipped.\n
+        The mappings are written before the graph, under the story's graph lock (see StoryGraphLockRepository),
+        so the cleanup after a deleted chapter never sees the new nodes without the mappings that keep them.
+        """
+        chapter = await ChapterRepository.get_by_id(db, chapter_id)
+        if chapter is None:
+            return # Deleted in the meantime
+        await self._release_connection(db) # Not held through the extraction LLM calls
+        neo4j_service = await self.get_neo4j_service()
+        graph_documents = await neo4j_service.extract_graph_documents(chapter.content)
+
+        await StoryGraphLockRepository.lock(db, chapter.story_id)
+        if await ChapterRepository.get_story_id_by_chapter_id(db, chapter_id) is None:
+            await db.rollback()
+            return # Deleted during the extraction
+        # Both kinds of mappings in one transaction, one statement each
+        node_pairs = neo4j_service.parse_uploaded_graph_documents(graph_documents)
+        relationship_keys = neo4j_service.parse_relationships(graph_documents)
+        await ChapterNodeMappingRepository.insert_many(db, chapter_id, node_pairs, commit=False)
+        await ChapterRelationshipMappingRepository.insert_many(db, chapter_id, relationship_keys, commit=False)
+        # Marks the chapter as indexed with relationship mappings, also when it has none
+        await ChapterIndexVersionRepository.set_current(db, chapter_id, commit=False)
+        try:
+            await neo4j_service.add_graph_documents(chapter.story.neo_database_name, graph_documents)
+        finally:
+            # Commits the mappings and the bump and releases the lock, also after a failed (maybe partial) graph write:
+            # the mappings then cover whatever was written, and the retried job writes the rest
+            await GraphVersionRepository.bump(db, chapter.story.neo_database_name)
+
+    async def get_indexing_status_by_chapter_id(self, chapter_id: int):
+        async with self._session() as db:
+            return await GraphExtractionJobRepository.get_by_chapter_id(db, chapter_id)
+
+    async def get_indexing_status_by_story_id(self, story_id: int):
+        async with self._session() as db:
+            return await GraphExtractionJobRepository.get_by_story_id(db, story_id)
+
+    async def get_indexing_progress_by_story_id(self, story_id: int) -> dict[str, int]:
+        """Number of the story's chapters per graph extraction status."""
+        async with self._session() as db:
+            return await GraphExtractionJobRepository.count_by_status_for_story(db, story_id)
+
+    async def reset_story_index(self, story_id: int):
+        """
+        Empties the story's graph and chapter mappings, and queues every chapter for extraction again.\n
+        Everything happens in one transaction under the story's graph lock (see StoryGraphLockRepository):
+        - Jobs a worker is still processing are requeued too, so that worker's outcome is dropped (see mark_done)
+          and the chapter is extracted again, whatever the worker wrote before the clear.
+        - A worker that reaches its write while the reset runs waits for the lock, and writes after the clear.
+        - The requeued jobs can only be claimed once the transaction commits, after the clear.
+        """
+        async with self._session() as db:
+            story = await StoryRepository.get_by_id(db, story_id)
+            if story is None:
+                raise Exception(f"[ERROR] Story with id {story_id} does not exist.")
+            await StoryGraphLockRepository.lock(db, story_id)
+            await GraphExtractionJobRepository.requeue_by_story_id(db, story_id, commit=False)
+            await ChapterNodeMappingRepository.delete_by_story_id(db, story_id, commit=False)
+            await ChapterRelationshipMappingRepository.delete_by_story_id(db, story_id, commit=False)
+            await ChapterIndexVersionRepository.delete_by_story_id(db, story_id, commit=False)
+            try:
+                await (await self.get_neo4j_service()).clear_database(story.neo_database_name)
+            finally:
+                # Commits and releases the lock, also after a failed (maybe partial) clear: the requeued jobs
+                # write the graph again either way
+                await GraphVersionRepository.bump(db, story.neo_database_name)
+        self.graph_extraction_workers.notify()
     
     async def insert_chapter_with_ordering(
         self, 
@@ -118,40 +278,39 @@ class PostgresService:
         insert_at_start: bool = False,
         summary: str | None = None,
     ):
-        assert isinstance(self.db_session, Session)
-        
         new_sort_order = 0.0
         GAP = 10000.0
 
-        # --- LOGIC BRANCHING ---
-        if insert_at_start:
-            # SCENARIO 0: Insert at the very beginning
-            min_order = await ChapterRepository.get_min_sort_order(self.db_session, story_id)
-            if min_order is None:
-                # Story is empty, just start at GAP
-                new_sort_order = GAP
-            else:
-                # Place before the current first chapter
-                new_sort_order = min_order / 2.0
-
-        elif insert_after_chapter_id is None:
-            # SCENARIO 1: Append to the end
-            max_order = await ChapterRepository.get_max_sort_order(self.db_session, story_id)
-            new_sort_order = max_order + GAP
-            
-        else:
-            # SCENARIO 2: Squeeze between existing chapters
-            prev_chapter = await ChapterRepository.get_by_id(self.db_session, insert_after_chapter_id)
-            if not prev_chapter:
-                raise Exception(f"Cannot insert: Chapter ID {insert_after_chapter_id} not found.")
-            
-            prev_order = prev_chapter.sort_order
-            next_chapter = await ChapterRepository.get_next_chapter_by_sort_order(self.db_session, story_id, prev_order)
-            
-            if next_chapter:
-                new_sort_order = (prev_order + next_chapter.sort_order) / 2.0
+        async with self._session() as db:
+            # --- LOGIC BRANCHING ---
+            if insert_at_start:
+                # SCENARIO 0: Insert at the very beginning
+                min_order = await ChapterRepository.get_min_sort_order(db, story_id)
+                if min_order is None:
+                    # Story is empty, just start at GAP
+                    new_sort_order = GAP
+                else:
+                    # Place before the current first chapter
+                    new_sort_order = min_order / 2.0
+
+            elif insert_after_chapter_id is None:
+                # SCENARIO 1: Append to the end
+                max_order = await ChapterRepository.get_max_sort_order(db, story_id)
+                new_sort_order = max_order + GAP
+                
             else:
-                new_sort_order = prev_order + GAP
+                # SCENARIO 2: Squeeze between existing chapters
+                prev_chapter = await ChapterRepository.get_by_id(db, insert_after_chapter_id)
+                if not prev_chapter:
+                    raise Exception(f"Cannot insert: Chapter ID {insert_after_chapter_id} not found.")
+                
+                prev_order = prev_chapter.sort_order
+                next_chapter = await ChapterRepository.get_next_chapter_by_sort_order(db, story_id, prev_order)
+                
+                if next_chapter:
+                    new_sort_order = (prev_order + next_chapter.sort_order) / 2.0
+                else:
+                    new_sort_order = prev_order + GAP
 
         # Prepare and save...
         timestamp = int(datetime.datetime.now(tz=datetime.timezone.utc).timestamp())
@@ -167,97 +326,222 @@ class PostgresService:
         return await self.insert_chapter(chapter_data)
     
     async def get_chapter_by_id(self, chapter_id: int):
-        assert isinstance(self.db_session, Session)
-        return await ChapterRepository.get_by_id(self.db_session, chapter_id)
+        async with self._session() as db:
+            return await ChapterRepository.get_by_id(db, chapter_id)
     
     async def get_all_chapters(self):
-        assert isinstance(self.db_session, Session)
-        return await ChapterRepository.get_all(self.db_session)
+        async with self._session() as db:
+            return await ChapterRepository.get_all(db)
     
+    async def get_story_id_by_chapter_id(self, chapter_id: int) -> int | None:
+        async with self._session() as db:
+            return await ChapterRepository.get_story_id_by_chapter_id(db, chapter_id)
+
     async def get_chapter_by_title(self, story_id: int, title: str):
-        assert isinstance(self.db_session, Session)
-        return await ChapterRepository.get_chapter_by_title(self.db_session, story_id, title)
+        async with self._session() as db:
+            return await ChapterRepository.get_chapter_by_title(db, story_id, title)
     
     async def delete_chapter_by_id(self, chapter_id: int):
-        assert isinstance(self.db_session, Session)
-        
-        return await ChapterRepository.delete_by_id(self.db_session, chapter_id)
+        """
+        Deletes the chapter (its mappings cascade), then removes the nodes and relationships
+        of the chapter that no other chapter of the story references from the story's graph.
+        """
+        async with self._session() as db:
+            chapter = await ChapterRepository.get_by_id(db, chapter_id)
+            if chapter is None:
+                return False
+            node_mappings = await ChapterNodeMappingRepository.get_by_chapter_id(db, chapter_id)
+            relationship_mappings = await ChapterRelationshipMappingRepository.get_by_chapter_id(db, chapter_id)
+
+            deleted = await ChapterRepository.delete_by_id(db, chapter_id)
+            if not deleted:
+                return False
+            self.chapter_summary_cache.invalidate(chapter.story_id)
+
+            try:
+                await self._delete_unreferenced_graph_elements(
+                    db, chapter.story_id, chapter.story.neo_database_name,
+                    [(mapping.node_label, mapping.node_name) for mapping in node_mappings],
+                    [mapping.key() for mapping in relationship_mappings],
+                )
+            except Exception as e:
+                # The chapter is gone either way, leftovers are removed by the next re-index (maintenance.py reindex)
+                print(f"[ERROR] Failed to clean up the graph of chapter {chapter_id}: {e}", file=sys.stderr)
+                await db.rollback() # Releases the story's graph lock
+            # Also after a failed cleanup, part of it may have been deleted
+            await GraphVersionRepository.bump(db, chapter.story.neo_database_name)
+            return True
+
+    async def _delete_unreferenced_graph_elements(self, db: AsyncSession, story_id: int, database_name: str,
+                                                  nodes: list[tuple[str, str]],
+                                                  relationships: list[tuple[str, str, str, str, str]]):
+        """
+        Reference counting: deletes the graph elements no surviving chapter of the story maps to.\n
+        Relationships are only deleted when every indexed chapter of the story was indexed with relationship mappings
+        (see ChapterIndexVersionTable). A chapter indexed before those existed may still use a relationship without
+        mapping to it, so deleting it could remove a fact that is still in the story. Its leftovers are removed by a
+        re-index (maintenance.py reindex), which also creates the missing mappings and index versions.\n
+        Runs under the story's graph lock, held through the Neo4j delete, so a chapter being indexed can't
+        add mappings to the nodes in between. The connection is held for as long.
+        """
+        await StoryGraphLockRepository.lock(db, story_id)
+        referenced_nodes = await ChapterNodeMappingRepository.get_referenced_in_story(db, story_id, nodes)
+        if relationships and await ChapterIndexVersionRepository.story_has_chapters_without_relationship_mappings(db, story_id):
+            print(f"[INFO] Story {story_id} has chapters without relationship mappings, keeping the deleted chapter's "
+                  f"relationships. Run `python maintenance.py reindex {story_id}` to backfill them.", file=sys.stderr)
+            relationships = []
+        referenced_relationships = await ChapterRelationshipMappingRepository.get_referenced_in_story(db, story_id, relationships)
+        orphaned_nodes = sorted(set(nodes) - referenced_nodes)
+        orphaned_relationships = sorted(set(relationships) - referenced_relationships)
+        await (await self.get_neo4j_service()).delete_graph_elements(database_name, orphaned_nodes, orphaned_relationships)
+        await db.commit() # Releases the lock
+        print(f"[DEBUG] Deleted {len(orphaned_nodes)} nodes and {len(orphaned_relationships)} relationships from '{database_name}'", file=sys.stderr)
     
     async def get_all_chapters_by_story_id(self, story_id: int):
         """
-        This function is intended to be called for fetching a session's history
-        When the history is fetched, the user intends to write more chapters
-        Therefore, the neo4j database should be switched to the story's database
+        This function is intended to be called for fetching a session's history.
+        Graph operations name the story's database themselves, so no database has to be switched to.
         """
-        story = await self.get_story_by_id(story_id)
-        await self.neo4j_service.connect_to_existing_database(story.neo_database_name)
-
-        return await ChapterRepository.get_all_by_story_id(self.db_session, story_id)
+        async with self._session() as db:
+            return await ChapterRepository.get_all_by_story_id(db, story_id)
     
     async def get_all_summaries_by_story_id(self, story_id: int):
         """
         Get all chapters' ids, titles, summaries, and sort orders for a given story ID.
         This is useful for displaying chapter lists without loading full content.
         """
-        assert isinstance(self.db_session, Session)
-        return await ChapterRepository.get_summaries_by_story_id(self.db_session, story_id)
+        async with self._session() as db:
+            return await ChapterRepository.get_summaries_by_story_id(db, story_id)
+
+    async def get_chapter_summary_block(self, story_id: int, render):
+        """
+        Read-through cache of the chapter summaries rendered for the agent's prompt.\n
+        `render` is an async callable turning the list from get_all_summaries_by_story_id into the block.
+        The cache is invalidated whenever a chapter of the story is saved or deleted.
+        """
+        block = self.chapter_summary_cache.get(story_id)
+        if block is not None:
+            return block
+        version = self.chapter_summary_cache.version(story_id)
+        block = await render(await self.get_all_summaries_by_story_id(story_id))
+        self.chapter_summary_cache.set(story_id, block, version)
+        return block
     
     #endregion
 
     #region Chapter-Node Mapping repository
 
     async def insert_chapter_node_mapping(self, new_mapping):
-        assert isinstance(self.db_session, Session)
-        return await ChapterNodeMappingRepository.insert(self.db_session, new_mapping)
+        async with self._session() as db:
+            return await ChapterNodeMappingRepository.insert(db, new_mapping)
     
     async def get_mappings_by_chapter_id(self, chapter_id: int):
-        assert isinstance(self.db_session, Session)
-        return await ChapterNodeMappingRepository.get_by_chapter_id(self.db_session, chapter_id)
+        async with self._session() as db:
+            return await ChapterNodeMappingRepository.get_by_chapter_id(db, chapter_id)
     
-    async def get_mapping_by_node_label_and_name(self, node_label: str, node_name: str):
-        assert isinstance(self.db_session, Session)
-        node_mappings = await ChapterNodeMappingRepository.get_by_node_label_and_name(self.db_session, node_label, node_name)
-        assert node_mappings is not None, f"[ERROR] No chapter-node mapping found for node ({node_label}, {node_name})"
-        chapters = [await self.get_chapter_by_id(mapping.chapter_id) for mapping in node_mappings]
-        chapters.sort(key=lambda chap: chap.sort_order)
-        return chapters
+    async def get_mapping_by_node_label_and_name(self, node_label: str, node_name: str,
+                                                 story_id: int | None = None, summary_only: bool = False):
+        """
+        The chapters that mention a graph node, ordered by sort order.
+        Pass `story_id` to only look in that story, and `summary_only` to skip the chapters' content.
+        """
+        async with self._session() as db:
+            return await ChapterRepository.get_by_node_label_and_name(
+                db, node_label, node_name, story_id=story_id, summary_only=summary_only
+            )
     
     #endregion
 
     #region Image repository
 
     async def insert_image(self, new_image):
-        assert isinstance(self.db_session, Session)
-        return await ImageRepository.insert(self.db_session, new_image)
+        async with self._session() as db:
+            return await ImageRepository.insert(db, new_image)
     
     async def get_images_by_story_id(self, story_id: int):
-        assert isinstance(self.db_session, Session)
-        return await ImageRepository.get_by_story_id(self.db_session, story_id)
+        async with self._session() as db:
+            return await ImageRepository.get_by_story_id(db, story_id)
     
+    async def get_image_page_by_story_id(self, story_id: int, limit: int, before_id: int | None = None):
+        async with self._session() as db:
+            return await ImageRepository.get_page_by_story_id(db, story_id, limit, before_id)
+
+    async def get_all_image_paths(self):
+        async with self._session() as db:
+            return await ImageRepository.get_all_paths(db)
+
     async def delete_image_by_id(self, image_id: int):
-        assert isinstance(self.db_session, Session)
-        return await ImageRepository.delete_by_id(self.db_session, image_id)
+        async with self._session() as db:
+            return await ImageRepository.delete_by_id(db, image_id)
     
     #endregion
 
     #region Neo4j service
     async def get_all_nodes_and_relationships(self, database_name: str):
-        return await self.neo4j_service.get_all_nodes_and_relationships(database_name)
+        return await (await self.get_neo4j_service()).get_all_nodes_and_relationships(database_name)
+
+    async def export_graph_page(self, database_name: str, limit: int, cursor: str | None = None,
+                                labels: list[str] | None = None, relationship_types: list[str] | None = None):
+        return await (await self.get_neo4j_service()).export_graph_page(database_name, limit, cursor, labels, relationship_types)
+
+    async def stream_graph(self, database_name: str, labels: list[str] | None = None, relationship_types: list[str] | None = None):
+        neo4j_service = await self.get_neo4j_service()
+        async for row in neo4j_service.stream_graph(database_name, labels, relationship_types):
+            yield row
+
+    async def get_neighborhood(self, database_name: str, label: str, name: str, hops: int = 1,
+                               max_neighbors: int = 25, max_nodes: int = 100):
+        return await (await self.get_neo4j_service()).get_neighborhood(database_name, label, name, hops, max_neighbors, max_nodes)
+
+    async def get_story_neighborhood(self, story_id: int, label: str, name: str, hops: int = 1,
+                                     max_neighbors: int = 25, max_nodes: int = 100):
+        """get_neighborhood in the graph of a story, for callers that only know the story id (the agent)."""
+        story = await self.get_story_by_id(story_id)
+        if story is None:
+            raise Exception(f"[ERROR] Story with id {story_id} does not exist.")
+        await self._release_connection()
+        return await self.get_neighborhood(story.neo_database_name, label, name, hops, max_neighbors, max_nodes)
     
-    async def natural_language_query(self, query: str):
-        return await self.neo4j_service.query_with_natural_language(query)
+    async def natural_language_query(self, database_name: str, query: str):
+        # The version tells the cached schema whether the graph changed, also when another process indexed a chapter
+        async with self._session() as db:
+            graph_version = await GraphVersionRepository.get(db, database_name)
+        await self._release_connection() # Not held through the LLM calls of the chain
+        return await (await self.get_neo4j_service()).query_with_natural_language(database_name, query, graph_version=graph_version)
+
+    async def get_graph_etag(self, database_name: str, variant: str) -> str:
+        """
+        The ETag of a graph response at the graph's current version. `variant` names the endpoint and its parameters.
+        Needs one Postgres lookup, not Neo4j, so unchanged graphs are answered with a 304 without querying them.
+        """
+        async with self._session() as db:
+            version = await GraphVersionRepository.get(db, database_name)
+        return graph_etag(database_name, version, variant)
+
+    async def get_graph_response(self, etag: str, render) -> bytes:
+        """
+        The serialized response with this ETag, from the cache or rendered by `render` (an async callable returning bytes).
+        The version is read before rendering, so a response can only include more than its version, never less.
+        """
+        body = self.graph_response_cache.get(etag)
+        if body is None:
+            await self._release_connection()
+            body = await render()
+            self.graph_response_cache.set(etag, body)
+        return body
     
     #endregion
 
     #region Cleanup
-    def close(self):
-        """Closes the database sessions."""
-        self.db_session.close()
-        self.neo4j_service.close_connection()
+    async def close(self):
+        """Stops the graph extraction workers and closes the database connections."""
+        await self.graph_extraction_workers.close()
+        await stop_db()
+        if self._neo4j_service is not None:
+            await self._neo4j_service.close_connection()
     #endregion
 
 if __name__ == "__main__":
-    start_db()
     service = PostgresService()
 
     import asyncio
@@ -268,6 +552,7 @@ if __name__ == "__main__":
 
     #region Tests
     async def run_tests():
+        await service.start()
         print("--- Starting Tests ---")
 
         # 1. Story Tests
@@ -359,6 +644,7 @@ if __name__ == "__main__":
         
 
         print("\n--- Tests Completed ---")
+        await service.close()
 
     asyncio.run(run_tests())
     #endregion
\ No newline at end of file
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from postgres_database import SessionLocal
+from repositories.postgres.RateLimitRepository import RateLimitRepository
+
+
+class RateLimiter:
+    """
+    Spaces calls out evenly, to at most `per_minute` calls per minute (e.g. against the Gemini quota).\n
+    `await wait()` before each call. Shared by all coroutines of the event loop.
+    """
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.interval = 60.0 / per_minute
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class SharedRateLimiter:
+    """
+    A rate limit shared by every process (the backend, the MCP server and maintenance.py), stored in Postgres
+    (`rate_limits`). Without a limit set, `wait()` returns right away.\n
+    maintenance.py sets it for the duration of a re-index, so the worker pools of the running servers,
+    which claim the requeued jobs too, are throttled as well.
+    Uses its own short-lived sessions. Errors are logged and don't throttle: the limit can't fail an extraction.
+    """
+    def __init__(self, name: str, session_factory=SessionLocal):
+        self.name = name
+        self._session_factory = session_factory
+
+    async def wait(self):
+        db = self._session_factory()
+        try:
+            delay = await RateLimitRepository.reserve(db, self.name)
+        except Exception as e:
+            print(f"[ERROR] Failed to read rate limit '{self.name}': {e}", file=sys.stderr)
+            delay = 0.0
+        finally:
+            await db.close()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def set_limit(self, per_minute: float | None, expires_at: int | None = None):
+        db = self._session_factory()
+        try:
+            await RateLimitRepository.set_limit(db, self.name, per_minute, expires_at)
+        finally:
+            await db.close()
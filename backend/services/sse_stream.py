@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import AsyncIterator
+
+# Event names sent to the client
+TOKEN = "token"
+INTERRUPT = "interrupt"
+TOOL_STATUS = "tool_status"
+IMAGE_JOB = "image_job" # An image generation job was queued, the client polls GET /images/jobs/{id} for its status
+ERROR = "error"
+DONE = "done"
+
+SSE_FLUSH_INTERVAL_SECONDS = float(os.getenv("SSE_FLUSH_INTERVAL_MS", "50")) / 1000
+SSE_MAX_BUFFER_CHARS = int(os.getenv("SSE_MAX_BUFFER_CHARS", "1024"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no", # Don't let a reverse proxy buffer the stream
+}
+
+_END = object()
+
+
+def format_sse(event: str, data) -> str:
+    """A single SSE frame. The data is JSON encoded, so it always fits on one `data:` line."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def coalesced_sse(events: AsyncIterator[tuple[str, object]], request,
+                        flush_interval: float = SSE_FLUSH_INTERVAL_SECONDS,
+                        max_buffer_chars: int = SSE_MAX_BUFFER_CHARS,
+                        heartbeat_interval: float = SSE_HEARTBEAT_SECONDS):
+    """
+    Turns a stream of (event, data) tuples into SSE frames.\n
+    - `token` events are coalesced: text is buffered until `flush_interval` has passed since the first
+      buffered token, or the buffer reaches `max_buffer_chars`. Any other event flushes the buffer first.
+    - A comment frame is sent when nothing else was sent for `heartbeat_interval`, to keep proxies from
+      closing an idle connection (e.g. while a tool runs).
+    - When the client disconnects, the source is closed, so an abandoned stream stops consuming LLM tokens.
+    - The stream always ends with a `done` event, preceded by an `error` event if the source raised.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Error in event stream: {e}", file=sys.stderr)
+            await queue.put((ERROR, {"message": str(e)}))
+        await queue.put(_END)
+
+    pump_task = asyncio.create_task(pump())
+    buffer: list[str] = []
+    buffered_chars = 0
+    buffered_since = 0.0
+    last_sent = time.monotonic()
+
+    def flush() -> str:
+        nonlocal buffer, buffered_chars
+        frame = format_sse(TOKEN, {"text": "".join(buffer)})
+        buffer, buffered_chars = [], 0
+        return frame
+
+    try:
+        while True:
+            now = time.monotonic()
+            if buffer:
+                timeout = max(0.0, buffered_since + flush_interval - now)
+            else:
+                timeout = max(0.0, last_sent + heartbeat_interval - now)
+
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    print("[DEBUG] Client disconnected, stopping the stream", file=sys.stderr)
+                    return
+                yield flush() if buffer else ": heartbeat\n\n"
+                last_sent = time.monotonic()
+                continue
+
+            if item is _END:
+                break
+
+            event, data = item
+            if event == TOKEN:
+                if not buffer:
+                    buffered_since = time.monotonic()
+                buffer.append(data)
+                buffered_chars += len(data)
+                if buffered_chars >= max_buffer_chars:
+                    yield flush()
+                    last_sent = time.monotonic()
+                continue
+
+            if buffer:
+                yield flush()
+            yield format_sse(event, data)
+            last_sent = time.monotonic()
+
+        if buffer:
+            yield flush()
+        yield format_sse(DONE, {})
+    finally:
+        # Runs on normal completion, on client disconnect and when the response task is cancelled
+        pump_task.cancel()
+        await asyncio.gather(pump_task, return_exceptions=True)
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+
+from langchain_core.prompts import PromptTemplate
+
+
+class StoryContextBuilder:
+    """
+    Renders the saved chapters of a story into the prompt within a token budget.\n
+    - Every chapter is rendered compactly on one line: `[id] title: summary`.
+    - If the whole story fits in the budget, every chapter is rendered that way.
+    - Otherwise the latest `recent_chapters` keep their own line, and older chapters are folded into
+      "arc" summaries of `arc_size` chapters each. Arc summaries are generated by the LLM and cached
+      by a digest of the chapters they cover, so they are only regenerated when those chapters change.
+    """
+    _arc_prompt = PromptTemplate.from_template(
+        """
+        Condense the following consecutive chapters of a story into one short paragraph (at most {max_words} words).
+        Keep character names, locations, and plot points that later chapters may depend on. Do not add anything new.
+
+        {chapters}
+        """
+    )
+
+    def __init__(self, llm, token_budget: int | None = None, recent_chapters: int | None = None,
+                 arc_size: int | None = None, max_cached_arcs: int = 1024):
+        self.llm = llm
+        self.token_budget = token_budget or int(os.getenv("STORY_CONTEXT_TOKEN_BUDGET", "2000"))
+        self.recent_chapters = recent_chapters or int(os.getenv("STORY_CONTEXT_RECENT_CHAPTERS", "5"))
+        self.arc_size = arc_size or int(os.getenv("STORY_CONTEXT_ARC_SIZE", "5"))
+        self.max_cached_arcs = max_cached_arcs
+        self._arc_cache: OrderedDict[str, str] = OrderedDict()
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        # Roughly 4 characters per token for English prose, good enough for budgeting
+        return len(text) // 4 + 1
+
+    @staticmethod
+    def render_chapter(chapter: dict) -> str:
+        summary = (chapter.get("summary") or "No summary.").strip()
+        return f"[{chapter['id']}] {chapter['title']}: {summary}"
+
+    @staticmethod
+    def _arc_digest(chapters: list[dict]) -> str:
+        payload = json.dumps([[c["id"], c["title"], c.get("summary")] for c in chapters])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _summarize_arc(self, chapters: list[dict]) -> str:
+        digest = self._arc_digest(chapters)
+        if digest in self._arc_cache:
+            self._arc_cache.move_to_end(digest)
+            return self._arc_cache[digest]
+
+        try:
+            response = await self.llm.ainvoke(self._arc_prompt.format(
+                max_words=20 * len(chapters),
+                chapters="\n".join(self.render_chapter(chapter) for chapter in chapters),
+            ))
+            arc_summary = " ".join(str(response.content).split())
+        except Exception as e:
+            # Don't cache the fallback, so the arc is summarized properly next time
+            print(f"[ERROR] Failed to summarize story arc: {e}", file=sys.stderr)
+            return "; ".join(chapter["title"] for chapter in chapters)
+
+        self._arc_cache[digest] = arc_summary
+        if len(self._arc_cache) > self.max_cached_arcs:
+            self._arc_cache.popitem(last=False)
+        return arc_summary
+
+    def _render_arc(self, chapters: list[dict], arc_summary: str) -> str:
+        ids = ", ".join(str(chapter["id"]) for chapter in chapters)
+        return f"[ids {ids}] {arc_summary}"
+
+    async def build(self, chapter_summaries: list[dict]) -> str:
+        """
+        Renders the chapter summaries (ordered by sort order) into a prompt block.
+        """
+        if not chapter_summaries:
+            return "No chapters saved yet."
+
+        lines = [self.render_chapter(chapter) for chapter in chapter_summaries]
+        full = "\n".join(lines)
+        if self.estimate_tokens(full) <= self.token_budget:
+            return full
+
+        split = max(0, len(chapter_summaries) - self.recent_chapters)
+        older, recent = chapter_summaries[:split], chapter_summaries[split:]
+        arcs = [older[i:i + self.arc_size] for i in range(0, len(older), self.arc_size)]
+        arc_summaries = await asyncio.gather(*(self._summarize_arc(arc) for arc in arcs))
+
+        arc_lines = [self._render_arc(arc, arc_summary) for arc, arc_summary in zip(arcs, arc_summaries)]
+        recent_lines = [self.render_chapter(chapter) for chapter in recent]
+
+        # Still over budget: drop the oldest arcs, the agent can fetch those chapters with its tools
+        omitted = 0
+        while arc_lines and self.estimate_tokens("\n".join(arc_lines + recent_lines)) > self.token_budget:
+            arc_lines.pop(0)
+            omitted += 1
+
+        sections = []
+        if omitted:
+            sections.append(f"({omitted} earliest arcs omitted, fetch those chapters with your tools if needed)")
+        if arc_lines:
+            sections.append("Earlier chapters, condensed by arc:\n" + "\n".join(arc_lines))
+        sections.append("Most recent chapters:\n" + "\n".join(recent_lines))
+        return "\n".join(sections)
+
+    def metrics(self) -> dict:
+        return {"cached_arcs": len(self._arc_cache), "token_budget": self.token_budget}
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import threading
+
+
+class ChapterSummaryCache:
+    """
+    Per-story cache of the rendered chapter summary block that goes into the agent's prompt.\n
+    Chapter summaries only change when a chapter is saved or deleted, so those paths invalidate the story's entry.
+    `version()` is taken before rendering, and a block is not stored if its story was invalidated since then.
+    Only the latest `max_stories` invalidations are remembered: forgetting one raises a floor that applies
+    to every story without an entry, so a forgotten invalidation still blocks the renders that started before it.
+    """
+    def __init__(self, max_stories: int = 1024):
+        self.max_stories = max_stories
+        self._blocks: OrderedDict[int, str] = OrderedDict()
+        self._invalidated_at: OrderedDict[int, int] = OrderedDict() # Story id -> generation of its last invalidation
+        self._generation = 0 # Bumped by every invalidation
+        self._floor = 0 # The latest forgotten invalidation
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get(self, story_id: int) -> str | None:
+        with self._lock:
+            block = self._blocks.get(story_id)
+            if block is None:
+                self._misses += 1
+                return None
+            self._blocks.move_to_end(story_id)
+            self._hits += 1
+            return block
+
+    def version(self, story_id: int) -> int:
+        return self._generation
+
+    def set(self, story_id: int, block: str, version: int):
+        with self._lock:
+            if self._invalidated_at.get(story_id, self._floor) > version:
+                return
+            self._blocks[story_id] = block
+            self._blocks.move_to_end(story_id)
+            if len(self._blocks) > self.max_stories:
+                evicted_id, _ = self._blocks.popitem(last=False)
+                self._forget(evicted_id)
+
+    def _forget(self, story_id: int):
+        generation = self._invalidated_at.pop(story_id, None)
+        if generation is not None:
+            self._floor = max(self._floor, generation)
+
+    def invalidate(self, story_id: int):
+        with self._lock:
+            self._blocks.pop(story_id, None)
+            self._generation += 1
+            self._invalidated_at[story_id] = self._generation
+            self._invalidated_at.move_to_end(story_id)
+            if len(self._invalidated_at) > self.max_stories:
+                self._forget(next(iter(self._invalidated_at)))
+            self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self._invalidated_at.clear()
+            self._generation += 1
+            self._floor = self._generation
+            self._invalidations += 1
+
+    def metrics(self) -> dict:
+        return {
+            "stories": len(self._blocks),
+            "hits": self._hits,
+            "misses": self._misses,
+            "invalidations": self._invalidations,
+        }
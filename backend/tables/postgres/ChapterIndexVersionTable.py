@@ -0,0 +1,16 @@
+import os
+import sys
+from sqlalchemy import Column, Integer, ForeignKey
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from postgres_database import Base
+
+# Version of the indexing that wrote a chapter's graph and mappings. 1: node and relationship mappings.
+# Chapters without a row were indexed before relationship mappings existed (or not at all).
+CHAPTER_INDEX_VERSION = 1
+
+class ChapterIndexVersionTable(Base): # Written with a chapter's mappings, see _index_chapter in services/postgres_service.py
+    __tablename__ = 'chapter_index_versions'
+    chapter_id = Column(Integer, ForeignKey('chapters.id', ondelete="CASCADE"), primary_key=True)  # Foreign key to chapters table
+    version = Column(Integer, nullable=False)  # CHAPTER_INDEX_VERSION at the time of indexing
+    indexed_at = Column(Integer, nullable=False)  # Unix timestamp
@@ -0,0 +1,23 @@
+import os
+import sys
+from sqlalchemy import Column, Index, Integer, String, ForeignKey
+from sqlalchemy.orm import relationship
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from postgres_database import Base
+
+class ChapterRelationshipMappingTable(Base): # Which chapters a Neo4j relationship was extracted from
+    __tablename__ = 'chapter_relationship_mappings'
+    chapter_id = Column(Integer, ForeignKey('chapters.id', ondelete="CASCADE"), primary_key=True)  # Foreign key to chapters table
+    source_label = Column(String, primary_key=True)  # Label of the relationship's start node
+    source_name = Column(String, primary_key=True)  # Name (id) of the relationship's start node
+    relationship_type = Column(String, primary_key=True)  # E.g. "LOVES"
+    target_label = Column(String, primary_key=True)  # Label of the relationship's end node
+    target_name = Column(String, primary_key=True)  # Name (id) of the relationship's end node
+
+    chapter = relationship("ChapterTable")
+
+    __table_args__ = (
+        # Deleting a chapter looks up whether other chapters still reference its relationships
+        Index('idx_relationship_lookup', 'source_label', 'source_name', 'relationship_type', 'target_label', 'target_name'),
+    )
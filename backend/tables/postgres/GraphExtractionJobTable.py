@@ -0,0 +1,27 @@
+import os
+import sys
+from sqlalchemy import Column, Index, Integer, String, Text, ForeignKey
+from sqlalchemy.orm import relationship
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from postgres_database import Base
+
+class GraphExtractionJobTable(Base): # Outbox of chapters to extract into the story's Neo4j graph
+    __tablename__ = 'graph_extraction_jobs'
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # One job per chapter, deleting the chapter deletes its job
+    chapter_id = Column(Integer, ForeignKey('chapters.id', ondelete="CASCADE"), nullable=False, unique=True)
+    status = Column(String, nullable=False)  # pending, processing, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    available_at = Column(Integer, nullable=False)  # Unix timestamp
+    locked_at = Column(Integer, nullable=True)  # Unix timestamp
+    created_at = Column(Integer, nullable=False)  # Unix timestamp
+    updated_at = Column(Integer, nullable=False)  # Unix timestamp
+
+    chapter = relationship("ChapterTable")
+
+    __table_args__ = (
+        # Workers look for the oldest available job of a status
+        Index('idx_graph_extraction_job_claim', 'status', 'available_at'),
+    )
@@ -0,0 +1,12 @@
+import os
+import sys
+from sqlalchemy import Column, Integer, String, Text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from postgres_database import Base
+
+class GraphExtractionTable(Base): # Cached LLMGraphTransformer results, see services/extraction_cache.py
+    __tablename__ = 'graph_extractions'
+    cache_key = Column(String(64), primary_key=True)  # SHA-256 of the chapter content + extraction schema
+    graph_documents = Column(Text, nullable=False)  # JSON serialized GraphDocuments
+    created_at = Column(Integer, nullable=False)  # Unix timestamp
@@ -0,0 +1,12 @@
+import os
+import sys
+from sqlalchemy import Column, Integer, String
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from postgres_database import Base
+
+class GraphVersionTable(Base): # Bumped whenever a story's graph changes, see services/graph_response_cache.py
+    __tablename__ = 'graph_versions'
+    database_name = Column(String, primary_key=True)  # The story's Neo4j database
+    version = Column(Integer, nullable=False)  # Starts at 1, a graph that was never changed is version 0
+    updated_at = Column(Integer, nullable=False)  # Unix timestamp
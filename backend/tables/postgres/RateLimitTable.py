@@ -0,0 +1,13 @@
+import os
+import sys
+from sqlalchemy import Column, Float, Integer, String
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from postgres_database import Base
+
+class RateLimitTable(Base): # Rate limits shared by every process, see services/rate_limiter.py SharedRateLimiter
+    __tablename__ = 'rate_limits'
+    name = Column(String, primary_key=True)  # E.g. graph_extraction
+    per_minute = Column(Float, nullable=True)  # Null: no limit
+    next_at = Column(Float, nullable=False)  # Unix timestamp (database clock) of the next free slot
+    expires_at = Column(Integer, nullable=True)  # Unix timestamp, the limit lapses if whoever set it stops renewing it
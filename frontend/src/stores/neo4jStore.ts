@@ -17,14 +17,11 @@ export interface Neo4jMessage {
   content: string
 }
 
-export interface Neo4jRawResult {
-  n: EntityProps
-  "labels(n)": string[]
-  // r is [StartNode, TypeString, EndNode]
-  r: [EntityProps, string, EntityProps]
-  m: EntityProps
-  "labels(m)": string[]
-}
+// One line of GET /neo4j/graph/{database_name}/ndjson: all nodes first, then the edges, which reference them by id
+export type GraphExportRow =
+  | { node: { id: string; labels: string[]; properties: EntityProps } }
+  | { edge: { id: string; type: string; source: string; target: string; properties: Record<string, any> } }
+  | { error: string }
 
 // --- D3 Graph Types ---
 
@@ -44,7 +41,7 @@ export interface GraphLink extends d3.SimulationLinkDatum<GraphNode> {
   source: string | GraphNode // D3 expects string ID initially
   target: string | GraphNode
   type: string
-  properties?: Record<string, any> // The current query doesn't return relationship properties
+  properties?: Record<string, any>
 }
 
 export const useNeo4jStore = defineStore('neo4j', () => {
@@ -60,7 +57,7 @@ export const useNeo4jStore = defineStore('neo4j', () => {
   const selectedLink = ref<GraphLink | null>(null)
   const chaptersForSelectedNode = ref<ChapterNeo4j[]>([])
 
-  async function fetchMentionedChapters(nodeLabel: string, nodeName: string) {
+  async function fetchMentionedChapters(nodeLabel: string, nodeName: string, storyId?: number) {
     chaptersForSelectedNode.value = []
     if (!nodeLabel || !nodeName) return []
     try {
@@ -70,7 +67,7 @@ export const useNeo4jStore = defineStore('neo4j', () => {
         headers: {
           'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ node_label: nodeLabel, node_name: nodeName })
+        body: JSON.stringify({ node_label: nodeLabel, node_name: nodeName, story_id: storyId ?? null })
       })
       if (!response.ok) {
         throw new Error(`Failed to fetch: ${response.statusText}`)
@@ -89,14 +86,14 @@ export const useNeo4jStore = defineStore('neo4j', () => {
     }
   }
 
-  async function naturalLanguageQuery(query: string) {
+  async function naturalLanguageQuery(query: string, databaseName: string) {
     try {
       const response = await fetch(`http://localhost:7890/neo4j/natural_language_query`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ query })
+        body: JSON.stringify({ query, database_name: databaseName })
       })
       if (!response.ok) {
         throw new Error(`Failed to fetch: ${response.statusText}`)
@@ -122,15 +119,46 @@ export const useNeo4jStore = defineStore('neo4j', () => {
     isLoading.value = true
 
     try {
-      // Encode the database name to handle spaces or special chars if necessary
-      const response = await fetch(`http://localhost:7890/neo4j/get_all_nodes_relationships/${databaseName}`)
-      
-      if (!response.ok) {
+      const graphNodes: GraphNode[] = []
+      const graphLinks: GraphLink[] = []
+      // The whole graph in one streamed query, paging would scan it once per page
+      const response = await fetch(`http://localhost:7890/neo4j/graph/${encodeURIComponent(databaseName)}/ndjson`)
+
+      if (!response.ok || !response.body) {
         throw new Error(`Failed to fetch: ${response.statusText}`)
       }
 
-      const rawData: Neo4jRawResult[] = await response.json()
-      processData(rawData)
+      const handleLine = (line: string) => {
+        if (!line.trim()) return
+        const row: GraphExportRow = JSON.parse(line)
+        if ('node' in row) {
+          graphNodes.push(row.node)
+        } else if ('edge' in row) {
+          graphLinks.push(row.edge)
+        } else {
+          throw new Error(row.error) // The stream had already started when the query failed
+        }
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder('utf-8')
+      let buffer = ''
+      while (true) {
+        const { value, done } = await reader.read()
+        if (value) {
+          buffer += decoder.decode(value, { stream: true })
+        }
+        const lines = buffer.split('\n')
+        buffer = lines.pop() ?? ''
+        lines.forEach(handleLine)
+        if (done) break
+      }
+      handleLine(buffer + decoder.decode())
+
+      // A node written while the graph streamed can be missing, D3 can't draw an edge to it
+      const nodeIds = new Set(graphNodes.map(node => node.id))
+      nodes.value = graphNodes
+      links.value = graphLinks.filter(link => nodeIds.has(link.source as string) && nodeIds.has(link.target as string))
     } catch (err: any) {
       console.error(err)
       error.value = err.message || 'Unknown error'
@@ -139,53 +167,6 @@ export const useNeo4jStore = defineStore('neo4j', () => {
     }
   }
 
-  function processData(data: Neo4jRawResult[]) {
-    const nodeMap = new Map<string, GraphNode>()
-    const linkMap = new Map<string, GraphLink>()
-
-    data.forEach(row => {
-      // 1. Process Source Node (n)
-      // The JSON uses "id" inside the n object as the unique identifier
-      const sourceId = row.n.id
-      if (!nodeMap.has(sourceId)) {
-        nodeMap.set(sourceId, {
-          id: sourceId,
-          labels: row["labels(n)"],
-          properties: row.n
-        })
-      }
-
-      // 2. Process Target Node (m)
-      const targetId = row.m.id
-      if (!nodeMap.has(targetId)) {
-        nodeMap.set(targetId, {
-          id: targetId,
-          labels: row["labels(m)"],
-          properties: row.m
-        })
-      }
-
-      // 3. Process Relationship (r)
-      const relType = row.r[1] 
-
-      // Create a unique ID for the link
-      const linkId = `${sourceId}_${relType}_${targetId}`
-
-      if (!linkMap.has(linkId)) {
-        linkMap.set(linkId, {
-          id: linkId,
-          source: sourceId,
-          target: targetId,
-          type: relType,
-          properties: {}
-        })
-      }
-    })
-
-    nodes.value = Array.from(nodeMap.values())
-    links.value = Array.from(linkMap.values())
-  }
-
   return {
     nodes,
     links,
@@ -22,6 +22,7 @@ export interface Image {
   story_id: number
   chapter_id: number | null // Nullable if image is not tied to a specific chapter
   link: string | null // URL to access the image (FASTAPI_URL/)
+  thumbnail_link: string | null // URL of the small WebP thumbnail, used in the gallery grid
 }
 
 export interface Chapter {
@@ -44,6 +45,15 @@ export interface InterruptMessage {
   message?: string;
 }
 
+// An image generation job, see GET /images/jobs/{job_id}
+export interface ImageJob {
+  id: string
+  status: 'queued' | 'rendering' | 'saving' | 'done' | 'failed'
+  story_id: number
+  chapter_id: number | null
+  error?: string | null
+}
+
 export interface CreateStoryPayload {
     title: string;
     story_length: "short" | "medium" | "long";
@@ -61,7 +71,9 @@ interface State {
   stories: Story[]
   currentStory: Story | null
   currentImages: Image[]
+  imagesNextCursor: number | null // Cursor of the next gallery page, null when all images are loaded
   currentChapters: Chapter[]
+  imageJobs: ImageJob[] // Image generation jobs queued from the chat, until shortly after they finish
   
   // Chat / Interaction
   messages: Message[]
@@ -81,13 +93,17 @@ interface State {
 
 // Base API URL
 const API_URL = 'http://localhost:7890' // Adjust to your backend URL
+const IMAGE_JOB_POLL_INTERVAL_MS = 2000
+const FINISHED_IMAGE_JOB_VISIBLE_MS = 5000
 
 export const useStoryStore = defineStore('story', {
   state: (): State => ({
     stories: [],
     currentStory: null,
     currentImages: [],
+    imagesNextCursor: null,
     currentChapters: [],
+    imageJobs: [],
     messages: [],
     threadId: uuidv4(), // Generate a random thread ID on init
     loading: false,
@@ -198,19 +214,63 @@ export const useStoryStore = defineStore('story', {
     // IMAGE & CHAPTER ENDPOINTS
     // =========================================
 
-    // GET /images/all/{story_id}
-    async fetchImages(storyId: number) {
+    // GET /images/gallery/{story_id}
+    async fetchImages(storyId: number, cursor: number | null = null) {
       try {
-        const response = await axios.get(`${API_URL}/images/all/${storyId}`)
-        for (const img of response.data) {
+        const response = await axios.get(`${API_URL}/images/gallery/${storyId}`, {
+          params: cursor !== null ? { cursor } : {}
+        })
+        for (const img of response.data.items) {
           img.link = `http://localhost:7890/${img.image_path}`;
+          img.thumbnail_link = `http://localhost:7890/${img.thumbnail_path}`;
         }
-        this.currentImages = response.data
+        this.currentImages = cursor !== null ? [...this.currentImages, ...response.data.items] : response.data.items
+        this.imagesNextCursor = response.data.next_cursor
       } catch (err: any) {
         this.error = err.message
       }
     },
 
+    // GET /images/jobs/{job_id}, every IMAGE_JOB_POLL_INTERVAL_MS until the job is done or failed
+    async followImageJob(job: ImageJob) {
+      this.imageJobs.push(job)
+      const update = (changes: Partial<ImageJob>) => {
+        const index = this.imageJobs.findIndex(j => j.id === job.id)
+        if (index !== -1) this.imageJobs[index] = { ...this.imageJobs[index]!, ...changes }
+      }
+      const forget = () => {
+        this.imageJobs = this.imageJobs.filter(j => j.id !== job.id)
+      }
+
+      while (true) {
+        await new Promise(resolve => setTimeout(resolve, IMAGE_JOB_POLL_INTERVAL_MS))
+        let current: ImageJob
+        try {
+          current = (await axios.get(`${API_URL}/images/jobs/${job.id}`)).data
+        } catch (err: any) {
+          // 404: the backend restarted and forgot the job
+          forget()
+          return
+        }
+        update({ status: current.status, error: current.error })
+        if (current.status === 'done' || current.status === 'failed') {
+          if (current.status === 'done' && this.currentStory?.id === current.story_id) {
+            await this.fetchImages(current.story_id)
+          } else if (current.status === 'failed') {
+            this.error = `Image generation failed: ${current.error}`
+          }
+          setTimeout(forget, FINISHED_IMAGE_JOB_VISIBLE_MS)
+          return
+        }
+      }
+    },
+
+    async fetchMoreImages(storyId: number) {
+      if (this.imagesNextCursor !== null) {
+        await this.fetchImages(storyId, this.imagesNextCursor)
+      }
+    },
+
     async deleteImage(imageId: number) {
       try {
         const response = await axios.delete(`${API_URL}/images/delete/${imageId}`)
@@ -240,61 +300,82 @@ export const useStoryStore = defineStore('story', {
     // =========================================
 
     /**
-     * Helper to process the text stream from the backend
+     * Helper to process the server-sent events stream from the backend.
+     * Events: token ({ text }), tool_status ({ tool, status }), image_job ({ id, status, story_id, chapter_id }),
+     * interrupt ({ tool_name, ... }), error ({ message }), done ({})
      */
     async _processStreamResponse(response: Response) {
       if (!response.body) return
 
       const reader = response.body.getReader()
       const decoder = new TextDecoder('utf-8')
-      let done = false
+      let buffer = ''
 
       // Create a new assistant message placeholder
       const messageIndex = this.messages.push({ role: 'assistant', content: '' }) - 1
 
-      while (!done) {
-        const { value, done: readerDone } = await reader.read()
-        done = readerDone
-        
-        if (value) {
-          const chunk = decoder.decode(value, { stream: true })
-          
-          // Check for interrupt signal as seen in Python code
-          if (chunk.includes('__interrupt__:')) {
-            // Remove the placeholder message. The content after the interrrupt will be handled in the resumeAfterInterrupt action
+      const handleEvent = (event: string, data: any): boolean => {
+        if (event === 'token') {
+          if (this.messages[messageIndex]) {
+            this.messages[messageIndex].content += data.text
+          }
+        } else if (event === 'interrupt') {
+          // Remove the placeholder message if nothing was streamed into it. The content after the interrupt will be handled in the resumeAfterInterrupt action
+          if (this.messages[messageIndex] && !this.messages[messageIndex].content) {
             this.messages.splice(messageIndex, 1)
-            const [cleanContent, interruptMsg] = chunk.split('__interrupt__:');
-            
-            if (this.messages[messageIndex]) {
-              this.messages[messageIndex].content += cleanContent;
-            }
-            this.interruptTriggered = true;
-
-            if (interruptMsg !== undefined) {
-              try {
-
-                  this.interruptMessage = JSON.parse(interruptMsg.trim());
-                  console.log("Parsed interrupt message:", this.interruptMessage);
-                  if (this.interruptMessage !== undefined && this.interruptMessage !== null && this.interruptMessage.tool_name === "generate_image") {
-                      this.imageGenInterruptTriggered = true;
-                  }
-
-              } catch (e) {
-                  console.error("Failed to parse interrupt message", e);
-                  this.interruptMessage = { tool_name: "unknown", message: `Could not parse interrupt message: ${e}`};
-              }
-            } else {
-              this.interruptMessage = { tool_name: "unknown", message: "Received undefined interrupt message."}
-            }
-            
-            this.streaming = false;
-            return; 
           }
+          this.interruptTriggered = true
+          this.interruptMessage = data
+          console.log("Parsed interrupt message:", this.interruptMessage)
+          if (this.interruptMessage !== null && this.interruptMessage.tool_name === "generate_image") {
+            this.imageGenInterruptTriggered = true
+          }
+          return true
+        } else if (event === 'tool_status') {
+          console.log("Tool status:", data)
+        } else if (event === 'image_job') {
+          // Not awaited, the job outlives the stream
+          this.followImageJob(data)
+        } else if (event === 'error') {
+          this.error = data.message
+        } else if (event === 'done') {
+          return true
+        }
+        return false
+      }
 
-          if (this.messages[messageIndex]) {
-            this.messages[messageIndex].content += chunk
+      while (true) {
+        const { value, done } = await reader.read()
+        if (value) {
+          buffer += decoder.decode(value, { stream: true })
+        }
+
+        // Frames are separated by a blank line. Lines starting with ':' are heartbeats.
+        let separatorIndex
+        while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+          const frame = buffer.slice(0, separatorIndex)
+          buffer = buffer.slice(separatorIndex + 2)
+
+          let event = 'message'
+          let data = ''
+          for (const line of frame.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim()
+            else if (line.startsWith('data:')) data += line.slice(5).trim()
+          }
+          if (!data) continue
+
+          try {
+            if (handleEvent(event, JSON.parse(data))) {
+              await reader.cancel()
+              this.streaming = false
+              return
+            }
+          } catch (e) {
+            console.error("Failed to parse stream event", e)
           }
         }
+
+        if (done) break
       }
       this.streaming = false
     },